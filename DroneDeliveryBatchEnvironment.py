@@ -0,0 +1,527 @@
+import numpy as np
+
+from ActionType import ActionType
+from DroneDeliveryFleet import DroneDeliveryFleet
+from DroneDeliveryPlanner import DroneDeliveryPlanner
+from DroneDeliverySparseQTable import DroneDeliverySparseQTable
+from DroneDeliveryStateEncoder import DroneDeliveryStateEncoder
+from DroneDeliveryWeather import DroneDeliveryWeather
+from DroneState import DroneState
+
+
+class DroneDeliveryBatchEnvironment:
+    def __init__(self, num_envs, grid_size, epsilon=0.5, training_mode=True, seed=None, fleet=None,
+                 state_encoder=None, q_table_storage='dense', q_table_dtype=np.float64):
+        self.num_envs = num_envs
+        self.grid_size = grid_size
+        self.WAREHOUSE_ITEMS = 20
+        self.BATTERY_LEVELS = 40
+        self.LOW_BATTERY_THRESHOLD = 20
+        self.WAREHOUSE = (grid_size[0] // 2, grid_size[1] - 1)
+        self.CHARGING_TIME = 7
+        self.fleet = fleet if fleet is not None else DroneDeliveryFleet.legacy()
+        self.CHARGING_STATIONS = np.array(self.fleet.charging_stations(grid_size, self.WAREHOUSE))
+        self.num_drones = len(self.CHARGING_STATIONS)
+
+        self.actions = [ActionType.UP, ActionType.DOWN, ActionType.LEFT, ActionType.RIGHT,
+                        ActionType.SKIP, ActionType.CIRCUMNAVIGATE]
+        self.num_actions = len(self.actions)
+
+        # la q-table è condivisa da tutti i mondi, con la codifica degli stati e il formato di memorizzazione
+        # (densa oppure sparsa) di DroneDeliveryEnvironment
+        if q_table_storage not in ('dense', 'sparse'):
+            raise ValueError(f"unknown q-table storage '{q_table_storage}', expected 'dense' or 'sparse'")
+        self.state_encoder = state_encoder if state_encoder is not None else DroneDeliveryStateEncoder.legacy()
+        self.q_table_storage = q_table_storage
+        self.q_table_dtype = np.dtype(q_table_dtype)
+        if q_table_storage == 'sparse':
+            self.Q_table = DroneDeliverySparseQTable(self.state_encoder.num_states, self.num_actions,
+                                                     self.q_table_dtype)
+        else:
+            self.Q_table = np.zeros(self.state_encoder.shape + (self.num_actions,), dtype=self.q_table_dtype)
+
+        self.alpha = 0.1
+        self.gamma = 0.9
+        self.epsilon = epsilon
+        self.training_mode = training_mode
+        self.weather_frequency = 20  # frequenza con cui appaiono le zone di maltempo (in numero di step)
+        self.weather_lifetime = 20  # durata delle zone di maltempo (in step)
+        self.rng = np.random.default_rng(seed)
+
+        n, d = num_envs, self.num_drones
+
+        # stato dei droni: una riga per mondo, una colonna per drone
+        self.positions = np.zeros((n, d, 2), dtype=np.int64)
+        self.battery_levels = np.zeros((n, d), dtype=np.int64)
+        self.obstacles = np.zeros((n, d, 4), dtype=np.int64)
+        self.has_package = np.zeros((n, d), dtype=bool)
+        self.charging_timer = np.zeros((n, d))
+        self.relative_target = np.zeros((n, d), dtype=np.int64)
+        self.circumnavigate = np.zeros((n, d), dtype=bool)
+        self.target_distance = np.zeros((n, d), dtype=np.int64)
+        # i percorsi di circumnavigazione sono memorizzati al contrario, così il pop della prossima cella è O(1)
+        self.circumnavigation_paths = [[[] for _ in range(d)] for _ in range(n)]
+        self.has_path = np.zeros((n, d), dtype=bool)
+
+        # stato dei mondi
+        self.num_objects = np.zeros(n, dtype=np.int64)
+        self.deliveries_completed = np.zeros((n, d), dtype=np.int64)
+        self.delivery_points = np.zeros((n, d, 2), dtype=np.int64)
+        self.has_delivery_point = np.zeros((n, d), dtype=bool)
+
+        # zone di maltempo: un DroneDeliveryWeather per mondo, con le zone estratte dal generatore dell'ambiente.
+        # I raster usati ad ogni step (rilevamento e consumo di batteria) sono copiati in array con una riga per
+        # mondo, aggiornata solo quando cambiano le zone del mondo
+        self.weather = [DroneDeliveryWeather(grid_size) for _ in range(n)]
+        side = self.weather[0].detection.shape[0]
+        self.weather_detection = np.zeros((n, side, side), dtype=np.int16)
+        self.weather_drain = np.zeros((n, side, side), dtype=np.int16)
+        self.weather_versions = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        # resetta tutti i mondi oppure solo quelli selezionati dalla maschera; come in DroneDeliveryEnvironment
+        # le zone di maltempo restano attive tra un episodio e l'altro
+        worlds = np.arange(self.num_envs) if mask is None else np.flatnonzero(mask)
+
+        self.positions[worlds] = self.CHARGING_STATIONS
+        self.battery_levels[worlds] = self.BATTERY_LEVELS - 1
+        self.obstacles[worlds] = 0
+        self.has_package[worlds] = False
+        self.charging_timer[worlds] = 0
+        self.relative_target[worlds] = ActionType.SKIP.value
+        self.circumnavigate[worlds] = False
+        self.target_distance[worlds] = 0
+        for n in worlds:
+            self.circumnavigation_paths[n] = [[] for _ in range(self.num_drones)]
+        self.has_path[worlds] = False
+
+        self.num_objects[worlds] = self.WAREHOUSE_ITEMS
+        self.deliveries_completed[worlds] = 0
+        self.has_delivery_point[worlds] = False
+
+        return self.observations()
+
+    def observations(self):
+        # indici piatti della q-table per ogni drone di ogni mondo, secondo la codifica degli stati
+        return self.state_encoder.encode_batch(self.positions[..., 0], self.positions[..., 1], self.battery_levels,
+                                               self.obstacles, self.has_package, self.relative_target,
+                                               self.circumnavigate, self.target_distance)
+
+    def get_drone_states(self, env_index):
+        # ricostruisce gli stati nel formato a tupla di DroneDeliveryEnvironment per un singolo mondo
+        states = []
+        for i in range(self.num_drones):
+            y, x = self.positions[env_index, i].tolist()
+            obstacle_up, obstacle_down, obstacle_left, obstacle_right = self.obstacles[env_index, i].tolist()
+            state = DroneState(y, x, int(self.battery_levels[env_index, i]), obstacle_up, obstacle_down,
+                               obstacle_left, obstacle_right, bool(self.has_package[env_index, i]),
+                               self.charging_timer[env_index, i], int(self.relative_target[env_index, i]),
+                               bool(self.circumnavigate[env_index, i]),
+                               tuple(self.circumnavigation_paths[env_index][i][::-1]),
+                               int(self.target_distance[env_index, i]))
+            states.append(state.as_tuple())
+        return states
+
+    def choose_actions(self, state_indices):
+        # un'azione per ogni stato codificato (array di qualsiasi forma, ad esempio quello di observations())
+        state_indices = np.asarray(state_indices)
+        q_values = self.__q_values(state_indices.reshape(-1))
+
+        # esplorazione casuale con probabilità epsilon o se lo stato non è mai stato aggiornato
+        explore = (self.rng.random(len(q_values)) < self.epsilon) | (np.sum(q_values, axis=1) == 0)
+        random_actions = self.rng.integers(0, self.num_actions, size=len(q_values))
+
+        return np.where(explore, random_actions, np.argmax(q_values, axis=1)).reshape(state_indices.shape)
+
+    def update_q_table(self, state_indices, actions, rewards, next_state_indices):
+        # stesso aggiornamento di DroneDeliveryEnvironment.update_q_table_batch() sulle transizioni di tutti i mondi
+        state_indices = np.asarray(state_indices).reshape(-1)
+        next_state_indices = np.asarray(next_state_indices).reshape(-1)
+        actions = np.asarray(actions).reshape(-1)
+        rewards = np.asarray(rewards).reshape(-1)
+
+        q_table = self.__flat_q_table()
+        if self.q_table_storage == 'sparse':
+            state_indices = q_table.row_indices(state_indices)
+            next_state_indices = q_table.row_indices(next_state_indices)
+            q_table = q_table.values
+
+        # il target del td è calcolato sulla q-table prima degli aggiornamenti del batch
+        td_target = rewards + self.gamma * q_table[next_state_indices].max(axis=1)
+        td_error = td_target - q_table[state_indices, actions]
+
+        # accumula gli aggiornamenti anche quando più mondi visitano la stessa coppia stato-azione
+        np.add.at(q_table, (state_indices, actions), self.alpha * td_error)
+
+    def q_table_array(self):
+        # array da salvare con np.save, caricabile da DroneDeliveryEnvironment.set_q_table()
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.to_records()
+        return self.Q_table
+
+    def __flat_q_table(self):
+        if self.q_table_storage == 'sparse':
+            return self.Q_table
+        return self.Q_table.reshape(-1, self.num_actions)
+
+    def __q_values(self, state_indices):
+        q_table = self.__flat_q_table()
+        if self.q_table_storage == 'sparse':
+            return q_table.values[q_table.row_indices(state_indices)]
+        return q_table[state_indices]
+
+    def step(self, actions):
+        # esegue uno step per ogni drone di ogni mondo, a turno come nella simulazione: actions ha una riga per
+        # mondo e una colonna per drone, con un'azione negativa per i droni da non muovere (ad esempio quelli che
+        # hanno terminato). Ritorna stati codificati, ricompense e completamenti con la stessa forma
+        actions = np.asarray(actions)
+        rewards = np.zeros((self.num_envs, self.num_drones))
+        dones = np.zeros((self.num_envs, self.num_drones), dtype=bool)
+
+        for drone_index in range(self.num_drones):
+            moving = actions[:, drone_index] >= 0
+            if moving.any():
+                rewards[:, drone_index], dones[:, drone_index] = self.__step_drone(drone_index,
+                                                                                   actions[:, drone_index], moving)
+
+        return self.observations(), rewards, dones
+
+    def __step_drone(self, d, actions, moving):
+        # equivalente vettoriale di DroneDeliveryEnvironment.step(d, action) nei mondi indicati da moving
+        self.__update_weather(np.flatnonzero(moving))
+
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+
+        y = self.positions[:, d, 0].copy()
+        x = self.positions[:, d, 1].copy()
+        battery_level = self.battery_levels[:, d].copy()
+        has_package = self.has_package[:, d].copy()
+        relative_tgt = self.relative_target[:, d]
+        circumnavigate = self.circumnavigate[:, d].copy()
+        station_y, station_x = self.CHARGING_STATIONS[d]
+
+        # se il drone sta caricando, decrementa il timer e salta le operazioni
+        charging = moving & (self.charging_timer[:, d] > 0)
+        self.charging_timer[charging, d] -= 1
+
+        # il drone non ha più compiti da svolgere
+        finished = (moving & ~charging & (self.num_objects == 0) & ~has_package
+                    & (y == station_y) & (x == station_x))
+        dones[finished] = True
+
+        active = moving & ~charging & ~finished
+        if not active.any():
+            return rewards, dones
+
+        # le azioni non valide diventano skip
+        valid = (actions >= 0) & (actions < self.num_actions)
+        action = np.where(valid, actions, ActionType.SKIP.value)
+
+        new_battery_level = np.maximum(0, battery_level - 1)
+        new_y = y.copy()
+        new_x = x.copy()
+
+        is_circumnavigate = action == ActionType.CIRCUMNAVIGATE.value
+        rewards += np.where(active & circumnavigate, np.where(is_circumnavigate, 50, -50), 0)
+        rewards += np.where(active & ~circumnavigate & is_circumnavigate, -30, 0)
+
+        # segue il percorso di circumnavigazione, ricalcolandolo se è vuoto o la batteria è bassa
+        follow = active & circumnavigate & is_circumnavigate
+        for n in np.flatnonzero(follow & (new_battery_level < self.LOW_BATTERY_THRESHOLD) & self.has_path[:, d]):
+            self.circumnavigation_paths[n][d] = []
+            self.has_path[n, d] = False
+
+        worlds = np.flatnonzero(follow & ~self.has_path[:, d])
+        if len(worlds):
+            target_y, target_x = self.__determine_targets(d, new_battery_level, has_package)
+            paths = self.__calculate_weather_circumnavigation_paths(worlds, d, y[worlds], x[worlds],
+                                                                    target_y[worlds], target_x[worlds])
+            for n, path in zip(worlds, paths):
+                self.circumnavigation_paths[n][d] = path
+                self.has_path[n, d] = bool(path)
+
+        for n in np.flatnonzero(follow & self.has_path[:, d]):
+            path = self.circumnavigation_paths[n][d]
+            new_y[n], new_x[n] = path.pop()  # pop della prossima cella del percorso
+            self.has_path[n, d] = bool(path)
+
+        # un'azione diversa dalla circumnavigazione azzera il percorso
+        for n in np.flatnonzero(active & ~is_circumnavigate & self.has_path[:, d]):
+            self.circumnavigation_paths[n][d] = []
+            self.has_path[n, d] = False
+
+        # movimento: ogni azione direzionale sposta il drone se non è al bordo
+        new_y -= active & (action == ActionType.UP.value) & (y > 0)
+        new_y += active & (action == ActionType.DOWN.value) & (y < self.grid_size[0] - 1)
+        new_x -= active & (action == ActionType.LEFT.value) & (x > 0)
+        new_x += active & (action == ActionType.RIGHT.value) & (x < self.grid_size[1] - 1)
+
+        # ricompense del movimento: ostacolo, direzione corretta o penalità
+        is_move = active & (action < ActionType.SKIP.value)
+        move_obstacle = self.obstacles[np.arange(self.num_envs), d, np.minimum(action, 3)] == 1
+        rewards += np.where(is_move, np.where(move_obstacle, -20, np.where(relative_tgt == action, 10, -5)), 0)
+
+        # evita di collidere: impedisce di aggiornare la posizione in una cella occupata
+        collision = active & self.__is_obstacle(d, new_y, new_x, battery_level, has_package)
+        new_y = np.where(collision, y, new_y)
+        new_x = np.where(collision, x, new_x)
+
+        # il percorso viene ricalcolato in caso di collisione o se è presente un ostacolo sul percorso
+        recompute = active & ((circumnavigate & (new_y == y) & (new_x == x))
+                              | self.__is_obstacle(d, new_y, new_x, battery_level, has_package))
+        worlds = np.flatnonzero(recompute)
+        if len(worlds):
+            target_y, target_x = self.__determine_targets(d, new_battery_level, has_package)
+            paths = self.__calculate_weather_circumnavigation_paths(worlds, d, y[worlds], x[worlds],
+                                                                    target_y[worlds], target_x[worlds])
+            for n, path in zip(worlds, paths):
+                if path:
+                    # aggiorna la lista delle celle da percorrere e prende la nuova cella
+                    self.circumnavigation_paths[n][d] = path
+                    new_y[n], new_x[n] = path.pop()
+                    self.has_path[n, d] = bool(path)
+
+        # gestione della ricarica della batteria
+        recharge = (active & (new_y == station_y) & (new_x == station_x)
+                    & (new_battery_level < self.BATTERY_LEVELS - self.LOW_BATTERY_THRESHOLD))
+        self.charging_timer[active, d] = 0
+        if not self.training_mode:
+            battery_needed = self.BATTERY_LEVELS - new_battery_level
+            charging_timer = (battery_needed / self.BATTERY_LEVELS) * self.CHARGING_TIME
+            self.charging_timer[recharge, d] = charging_timer[recharge]
+        new_battery_level = np.where(recharge, self.BATTERY_LEVELS, new_battery_level)
+
+        # gestione della consegna del pacco
+        deliver = (active & has_package & self.has_delivery_point[:, d]
+                   & (new_y == self.delivery_points[:, d, 0]) & (new_x == self.delivery_points[:, d, 1]))
+        self.deliveries_completed[deliver, d] += 1
+        self.has_delivery_point[deliver, d] = False
+        new_has_package = has_package & ~deliver
+
+        # gestione del ritiro del pacco: senza celle libere per il delivery point il pacco resta nel magazzino e
+        # il ritiro viene ritentato agli step successivi
+        pick_up = (active & ~new_has_package & (new_y == self.WAREHOUSE[0]) & (new_x == self.WAREHOUSE[1])
+                   & (self.num_objects > 0))
+        if pick_up.any():
+            worlds = np.flatnonzero(pick_up)
+            pick_up[worlds[~self.__generate_delivery_points(worlds, d)]] = False
+        new_has_package |= pick_up
+        self.num_objects -= pick_up
+
+        target_y, target_x = self.__determine_targets(d, new_battery_level, new_has_package)
+
+        # determina la posizione relativa del target rispetto al drone
+        relative_target_position = self.__get_relative_target_position(new_y, new_x, target_y, target_x)
+
+        # rilevamento degli ostacoli sulla base dello stato precedente del drone
+        obstacle_up = self.__is_obstacle(d, new_y - 1, new_x, battery_level, has_package)
+        obstacle_down = self.__is_obstacle(d, new_y + 1, new_x, battery_level, has_package)
+        obstacle_left = self.__is_obstacle(d, new_y, new_x - 1, battery_level, has_package)
+        obstacle_right = self.__is_obstacle(d, new_y, new_x + 1, battery_level, has_package)
+
+        new_circumnavigate = self.has_path[:, d] | self.__needs_circumnavigation(
+            y, x, target_y, target_x, relative_target_position,
+            obstacle_up, obstacle_down, obstacle_left, obstacle_right, active)
+
+        new_battery_level = self.__decrement_battery_due_to_weather(new_y, new_x, new_battery_level)
+
+        # aggiorna lo stato dei droni solo nei mondi attivi
+        self.positions[active, d, 0] = new_y[active]
+        self.positions[active, d, 1] = new_x[active]
+        self.battery_levels[active, d] = new_battery_level[active]
+        self.obstacles[active, d] = np.stack((obstacle_up, obstacle_down, obstacle_left, obstacle_right),
+                                             axis=-1)[active]
+        self.has_package[active, d] = new_has_package[active]
+        self.relative_target[active, d] = relative_target_position[active]
+        self.circumnavigate[active, d] = new_circumnavigate[active]
+        self.target_distance[active, d] = (np.abs(new_y - target_y) + np.abs(new_x - target_x))[active]
+
+        return rewards, dones
+
+    def __is_obstacle(self, drone_index, y, x, battery_level, has_package):
+        # equivalente vettoriale di DroneDeliveryEnvironment.__is_obstacle() per ogni mondo: oltre la cornice di
+        # una cella attorno alla griglia non ci sono ostacoli
+        obstacle = np.zeros(self.num_envs, dtype=bool)
+        inside = (-1 <= y) & (y <= self.grid_size[0]) & (-1 <= x) & (x <= self.grid_size[1])
+
+        for i in range(self.num_drones):
+            if i == drone_index:
+                continue
+            # delivery point, charging station e posizione degli altri droni
+            obstacle |= (self.has_delivery_point[:, i]
+                         & (self.delivery_points[:, i, 0] == y) & (self.delivery_points[:, i, 1] == x))
+            obstacle |= (self.CHARGING_STATIONS[i, 0] == y) & (self.CHARGING_STATIONS[i, 1] == x)
+            obstacle |= (self.positions[:, i, 0] == y) & (self.positions[:, i, 1] == x)
+
+        # la propria charging station solo se il livello della batteria è maggiore della soglia
+        own_station = (battery_level > self.LOW_BATTERY_THRESHOLD) & (self.num_objects > 0)
+        obstacle |= (own_station & (self.CHARGING_STATIONS[drone_index, 0] == y)
+                     & (self.CHARGING_STATIONS[drone_index, 1] == x))
+
+        obstacle |= has_package & (self.WAREHOUSE[0] == y) & (self.WAREHOUSE[1] == x)
+
+        return obstacle & inside
+
+    def __occupancy_grids(self, worlds, cells):
+        # griglie booleane (una per mondo) con le celle indicate come coppie (y, x, maschera)
+        count = len(worlds)
+        grids = np.zeros((count, self.grid_size[0], self.grid_size[1]), dtype=bool)
+
+        # tutte le celle vengono segnate con un'unica assegnazione
+        y = np.concatenate([np.broadcast_to(y, count) for y, x, mask in cells])
+        x = np.concatenate([np.broadcast_to(x, count) for y, x, mask in cells])
+        mask = np.concatenate([np.broadcast_to(mask, count) for y, x, mask in cells])
+        rows = np.tile(np.arange(count), len(cells))
+        inside = mask & (0 <= y) & (y < self.grid_size[0]) & (0 <= x) & (x < self.grid_size[1])
+        grids[rows[inside], y[inside], x[inside]] = True
+
+        return grids
+
+    def __obstacle_grids(self, worlds, drone_index):
+        # equivalente di __get_obstacles(drone_index) sotto forma di griglia per ogni mondo indicato
+        cells = []
+        for i in range(self.num_drones):
+            if i == drone_index:
+                continue
+            cells.append((self.delivery_points[worlds, i, 0], self.delivery_points[worlds, i, 1],
+                          self.has_delivery_point[worlds, i]))
+            cells.append((self.CHARGING_STATIONS[i, 0], self.CHARGING_STATIONS[i, 1], True))
+            cells.append((self.positions[worlds, i, 0], self.positions[worlds, i, 1], True))
+
+        own_station = ((self.battery_levels[worlds, drone_index] > self.LOW_BATTERY_THRESHOLD)
+                       & (self.num_objects[worlds] > 0))
+        cells.append((self.CHARGING_STATIONS[drone_index, 0], self.CHARGING_STATIONS[drone_index, 1], own_station))
+        cells.append((self.WAREHOUSE[0], self.WAREHOUSE[1], self.has_package[worlds, drone_index]))
+
+        return self.__occupancy_grids(worlds, cells)
+
+    def __calculate_weather_circumnavigation_paths(self, worlds, drone_index, start_y, start_x, target_y, target_x):
+        # stessa ricerca di DroneDeliveryEnvironment, mondo per mondo: DroneDeliveryPlanner sugli ostacoli fisici,
+        # con le celle di maltempo attraversabili ma costose. Le liste sono al contrario e non contengono la
+        # posizione di partenza
+        obstacles = self.__obstacle_grids(worlds, drone_index)
+        paths = []
+        for row, n in enumerate(worlds.tolist()):
+            path = DroneDeliveryPlanner.find_path(obstacles[row].tolist(), (int(start_y[row]), int(start_x[row])),
+                                                  (int(target_y[row]), int(target_x[row])), self.weather[n].cells())
+            paths.append(path[::-1])
+        return paths
+
+    def __determine_targets(self, drone_index, battery_level, has_package):
+        # versione vettoriale di __determine_target su tutti i mondi
+        to_station = ((self.num_objects == 0) & ~has_package) | (battery_level < self.LOW_BATTERY_THRESHOLD)
+        to_delivery_point = ~to_station & has_package & self.has_delivery_point[:, drone_index]
+
+        target_y = np.where(to_station, self.CHARGING_STATIONS[drone_index, 0],
+                            np.where(to_delivery_point, self.delivery_points[:, drone_index, 0], self.WAREHOUSE[0]))
+        target_x = np.where(to_station, self.CHARGING_STATIONS[drone_index, 1],
+                            np.where(to_delivery_point, self.delivery_points[:, drone_index, 1], self.WAREHOUSE[1]))
+        return target_y, target_x
+
+    @staticmethod
+    def __get_relative_target_position(y_drone, x_drone, y_target, x_target):
+        delta_x = x_target - x_drone
+        delta_y = y_target - y_drone
+
+        # priorità al movimento verticale se il target è più distante verticalmente
+        vertical = np.abs(delta_y) > np.abs(delta_x)
+        relative = np.where(delta_x < 0, ActionType.LEFT.value,
+                            np.where(delta_x > 0, ActionType.RIGHT.value, ActionType.SKIP.value))
+        relative = np.where(vertical & (delta_y < 0), ActionType.UP.value, relative)
+        relative = np.where(vertical & (delta_y > 0), ActionType.DOWN.value, relative)
+        return relative
+
+    def __needs_circumnavigation(self, y, x, target_y, target_x, relative_target,
+                                 obstacle_up, obstacle_down, obstacle_left, obstacle_right, active):
+        vertical = (relative_target == ActionType.UP.value) | (relative_target == ActionType.DOWN.value)
+        horizontal = (relative_target == ActionType.LEFT.value) | (relative_target == ActionType.RIGHT.value)
+
+        # c'è un ostacolo tra il drone e il target, oppure ai lati della direzione di movimento
+        blocked = (((relative_target == ActionType.UP.value) & obstacle_up)
+                   | ((relative_target == ActionType.DOWN.value) & obstacle_down)
+                   | ((relative_target == ActionType.LEFT.value) & obstacle_left)
+                   | ((relative_target == ActionType.RIGHT.value) & obstacle_right)
+                   | (vertical & (obstacle_left | obstacle_right))
+                   | (horizontal & (obstacle_up | obstacle_down)))
+
+        # verifica se ci sono zone con maltempo da circumnavigare
+        return blocked | self.__crosses_weather(y, x, target_y, target_x, relative_target, active & ~blocked)
+
+    def __crosses_weather(self, y, x, target_y, target_x, relative_target, worlds):
+        # DroneDeliveryWeather.crosses() nei mondi indicati: la prima cella lungo la direzione del drone viene
+        # controllata sui raster di rilevamento di tutti i mondi insieme, e solo i mondi con maltempo davanti al
+        # drone confrontano le singole zone
+        up = relative_target == ActionType.UP.value
+        down = relative_target == ActionType.DOWN.value
+        left = relative_target == ActionType.LEFT.value
+        right = relative_target == ActionType.RIGHT.value
+        distance = np.where(up | down, np.abs(target_y - y), np.abs(target_x - x))
+        next_y = y + up - down
+        next_x = x + right - left
+
+        side = self.weather_detection.shape[1]
+        candidates = worlds & (up | down | left | right) & (distance > 0) & (0 <= next_y) & (next_y < side) \
+            & (0 <= next_x) & (next_x < side)
+        rows = np.flatnonzero(candidates)
+        candidates[rows] = self.weather_detection[rows, next_y[rows], next_x[rows]] > 0
+
+        crosses = np.zeros(self.num_envs, dtype=bool)
+        for n in np.flatnonzero(candidates).tolist():
+            crosses[n] = self.weather[n].crosses((int(y[n]), int(x[n])), (int(target_y[n]), int(target_x[n])),
+                                                 int(relative_target[n]))
+        return crosses
+
+    def __decrement_battery_due_to_weather(self, y, x, battery_level):
+        # DroneDeliveryWeather.drains_battery() letto sui raster di tutti i mondi insieme
+        side = self.weather_drain.shape[1]
+        inside = (0 <= y) & (y < side) & (0 <= x) & (x < side)
+        rows = np.flatnonzero(inside)
+        drains = np.zeros(self.num_envs, dtype=bool)
+        drains[rows] = self.weather_drain[rows, y[rows], x[rows]] > 0
+        return np.where(drains, np.maximum(0, battery_level - 1), battery_level)
+
+    def __update_weather(self, worlds):
+        # come DroneDeliveryWeather.update() nei mondi indicati, con le estrazioni fatte tutte insieme
+        count = len(worlds)
+        spawn = (self.rng.integers(0, self.weather_frequency + 1, size=count) == 0).tolist()
+        zone_y = self.rng.integers(0, self.grid_size[0], size=count).tolist()
+        zone_x = self.rng.integers(0, self.grid_size[1], size=count).tolist()
+        sizes = self.rng.integers(1, 4, size=(count, 2)).tolist()
+
+        for n, new_zone, y, x, (width, height) in zip(worlds.tolist(), spawn, zone_y, zone_x, sizes):
+            weather = self.weather[n]
+            if new_zone:
+                weather.advance((y, x, width, height), self.weather_lifetime)
+            elif len(weather):
+                weather.advance(None, self.weather_lifetime)
+
+            # copia i raster solo se le zone del mondo sono cambiate
+            if weather.version != self.weather_versions[n]:
+                self.weather_detection[n] = weather.detection
+                self.weather_drain[n] = weather.drain
+                self.weather_versions[n] = weather.version
+
+    def __generate_delivery_points(self, worlds, drone_index):
+        # ritorna per ogni mondo se è stata trovata una cella libera per il nuovo delivery point
+        # celle occupate: magazzino, stazioni di ricarica, delivery point e posizioni dei droni
+        cells = [(self.WAREHOUSE[0], self.WAREHOUSE[1], True)]
+        for i in range(self.num_drones):
+            cells.append((self.CHARGING_STATIONS[i, 0], self.CHARGING_STATIONS[i, 1], True))
+            cells.append((self.delivery_points[worlds, i, 0], self.delivery_points[worlds, i, 1],
+                          self.has_delivery_point[worlds, i]))
+            cells.append((self.positions[worlds, i, 0], self.positions[worlds, i, 1], True))
+        free = ~self.__occupancy_grids(worlds, cells).reshape(len(worlds), -1)
+
+        # estrae una cella libera uniformemente per ogni mondo
+        keys = np.where(free, self.rng.random(free.shape), -1.0)
+        cells = np.argmax(keys, axis=1)
+
+        available = keys[np.arange(len(worlds)), cells] >= 0
+        worlds = worlds[available]
+        self.delivery_points[worlds, drone_index, 0] = cells[available] // self.grid_size[1]
+        self.delivery_points[worlds, drone_index, 1] = cells[available] % self.grid_size[1]
+        self.has_delivery_point[worlds, drone_index] = True
+        return available
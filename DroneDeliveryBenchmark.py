@@ -0,0 +1,286 @@
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+from DroneDeliveryBatchEnvironment import DroneDeliveryBatchEnvironment
+from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+from DroneDeliveryFleet import DroneDeliveryFleet
+from DroneDeliveryPlanner import DroneDeliveryPlanner
+from DroneDeliveryTrainer import DroneDeliveryTrainer
+
+
+class DroneDeliveryBenchmark:
+    # metrica principale di ogni benchmark e se un valore più alto è migliore
+    METRICS = {
+        'step': ('steps_per_sec', True),
+        'batch_step': ('steps_per_sec', True),
+        'path_search': ('mean_us', False),
+        'weather_path_search': ('mean_us', False),
+        'training': ('episodes_per_sec', True),
+        'render': ('mean_ms', False),
+    }
+
+    def __init__(self, grid_sizes=((7, 7), (20, 20), (50, 50)), fleet_sizes=(3, 10, 30), num_steps=5000,
+                 num_searches=200, num_episodes=20, num_frames=30, num_envs=256, seed=0):
+        self.grid_sizes = [tuple(grid_size) for grid_size in grid_sizes]
+        self.fleet_sizes = list(fleet_sizes)
+        self.num_steps = num_steps  # step misurati per ogni combinazione di griglia e flotta
+        self.num_searches = num_searches  # ricerche di percorso misurate per ogni combinazione
+        self.num_episodes = num_episodes  # episodi di addestramento misurati per ogni griglia
+        self.num_frames = num_frames  # frame misurati per ogni combinazione
+        self.num_envs = num_envs  # mondi simulati insieme dall'ambiente vettoriale
+        self.seed = seed
+
+    def run(self, output_path=None, verbose=True):
+        results = []
+        for grid_size in self.grid_sizes:
+            for num_drones in self.fleet_sizes:
+                # le flotte troppo grandi per la griglia vengono saltate
+                if 2 * num_drones + 1 > grid_size[0] * grid_size[1]:
+                    continue
+
+                results.append(self.bench_step(grid_size, num_drones))
+                results.append(self.bench_batch_step(grid_size, num_drones))
+                results.extend(self.bench_path_search(grid_size, num_drones))
+                results.append(self.bench_render(grid_size, num_drones))
+
+            # il trainer addestra un solo drone, quindi dipende solo dalla griglia
+            results.append(self.bench_training(grid_size))
+
+            if verbose:
+                for result in results:
+                    if tuple(result['grid_size']) == grid_size:
+                        metric = self.METRICS[result['benchmark']][0]
+                        print(f"{result['benchmark']:>20} grid={grid_size} drones={result['num_drones']}: "
+                              f"{metric}={result[metric]:.2f}")
+
+        report = {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'machine': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'config': {
+                'grid_sizes': self.grid_sizes,
+                'fleet_sizes': self.fleet_sizes,
+                'num_steps': self.num_steps,
+                'num_searches': self.num_searches,
+                'num_episodes': self.num_episodes,
+                'num_frames': self.num_frames,
+                'num_envs': self.num_envs,
+                'seed': self.seed,
+            },
+            'results': results,
+        }
+
+        if output_path is not None:
+            with open(output_path, "w") as output_file:
+                json.dump(report, output_file, indent=2)
+
+        return report
+
+    def bench_step(self, grid_size, num_drones):
+        env = self.__make_env(grid_size, num_drones)
+        finished = [False] * num_drones
+
+        # i droni si muovono a turno come nella simulazione; quando hanno tutti terminato l'episodio riparte
+        start = time.perf_counter()
+        drone_index = 0
+        for _ in range(self.num_steps):
+            state = env.drone_states[drone_index]
+            next_state, reward, done = env.step(drone_index, env.choose_action(state))
+            finished[drone_index] = done or next_state[2] == 0
+
+            if all(finished):
+                env.reset()
+                finished = [False] * num_drones
+            drone_index = (drone_index + 1) % num_drones
+            while finished[drone_index]:
+                drone_index = (drone_index + 1) % num_drones
+        elapsed = time.perf_counter() - start
+
+        return {'benchmark': 'step', 'grid_size': grid_size, 'num_drones': num_drones, 'steps': self.num_steps,
+                'seconds': elapsed, 'steps_per_sec': self.num_steps / elapsed,
+                'path_cache': env.path_cache_info()}
+
+    def bench_batch_step(self, grid_size, num_drones):
+        env = DroneDeliveryBatchEnvironment(self.num_envs, grid_size, training_mode=False, seed=self.seed,
+                                            fleet=DroneDeliveryFleet(num_drones))
+        states = env.observations()
+        finished = np.zeros((self.num_envs, num_drones), dtype=bool)
+
+        # ogni step muove tutti i droni di tutti i mondi; i mondi in cui i droni hanno tutti terminato ripartono.
+        # Gli step per secondo contano i singoli droni mossi, come in bench_step
+        steps = 0
+        start = time.perf_counter()
+        for _ in range(max(1, self.num_steps // self.num_envs)):
+            actions = np.where(finished, -1, env.choose_actions(states))
+            steps += int(np.count_nonzero(~finished))
+            states, rewards, dones = env.step(actions)
+            finished |= dones | (env.battery_levels == 0)
+
+            reset = finished.all(axis=1)
+            if reset.any():
+                env.reset(reset)
+                states = env.observations()
+                finished[reset] = False
+        elapsed = time.perf_counter() - start
+
+        return {'benchmark': 'batch_step', 'grid_size': grid_size, 'num_drones': num_drones,
+                'num_envs': self.num_envs, 'steps': steps, 'seconds': elapsed, 'steps_per_sec': steps / elapsed}
+
+    def bench_path_search(self, grid_size, num_drones):
+        env = self.__make_env(grid_size, num_drones)
+        rng = np.random.default_rng(self.seed)
+
+        # ostacoli ricavati dalla griglia di occupazione e maltempo attivo come a regime, con una nuova zona
+        # ad ogni aggiornamento
+        obstacles = (env.occupancy[1:-1, 1:-1] > 0).tolist()
+        for _ in range(env.weather_lifetime):
+            env.weather.update(1, env.weather_lifetime)
+        weather = env.weather.cells()
+
+        free_cells = np.argwhere(env.occupancy[1:-1, 1:-1] == 0)
+        pairs = [(tuple(free_cells[i].tolist()), tuple(free_cells[j].tolist()))
+                 for i, j in rng.integers(0, len(free_cells), size=(self.num_searches, 2))]
+
+        # le due ricerche dell'ambiente: circumnavigazione degli ostacoli e del maltempo, senza la cache dei percorsi
+        results = []
+        for benchmark, weather_cells in (('path_search', None), ('weather_path_search', weather)):
+            latencies = []
+            lengths = []
+            for start_position, target_position in pairs:
+                start = time.perf_counter()
+                path = DroneDeliveryPlanner.find_path(obstacles, start_position, target_position, weather_cells)
+                latencies.append(time.perf_counter() - start)
+                lengths.append(len(path))
+
+            latencies = np.array(latencies) * 1e6
+            results.append({'benchmark': benchmark, 'grid_size': grid_size, 'num_drones': num_drones,
+                            'searches': len(pairs), 'mean_us': float(latencies.mean()),
+                            'p50_us': float(np.percentile(latencies, 50)),
+                            'p95_us': float(np.percentile(latencies, 95)),
+                            'max_us': float(latencies.max()), 'mean_path_length': float(np.mean(lengths))})
+
+        return results
+
+    def bench_training(self, grid_size):
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        env = DroneDeliveryEnvironment(grid_size, training_mode=True, fleet=DroneDeliveryFleet(1))
+        trainer = DroneDeliveryTrainer(env, num_episodes=self.num_episodes)
+
+        start = time.perf_counter()
+        trainer.train(q_table_path=None, plot=False, verbose=False)
+        elapsed = time.perf_counter() - start
+
+        return {'benchmark': 'training', 'grid_size': grid_size, 'num_drones': 1, 'episodes': self.num_episodes,
+                'seconds': elapsed, 'episodes_per_sec': self.num_episodes / elapsed}
+
+    def bench_render(self, grid_size, num_drones):
+        # il renderer viene importato solo quando serve, come nella simulazione
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from DroneDeliveryRenderer import DroneDeliveryRenderer
+
+        env = self.__make_env(grid_size, num_drones)
+        figure = Figure()
+        env.canvas = FigureCanvasAgg(figure)
+        env.ax = figure.add_subplot()
+
+        # il primo frame crea gli artisti e disegna lo sfondo, quindi viene misurato a parte
+        start = time.perf_counter()
+        DroneDeliveryRenderer.render(env)
+        first_frame = time.perf_counter() - start
+
+        frame_times = []
+        for frame in range(self.num_frames):
+            drone_index = frame % num_drones
+            env.step(drone_index, env.choose_action(env.drone_states[drone_index]))
+            start = time.perf_counter()
+            DroneDeliveryRenderer.render(env)
+            frame_times.append(time.perf_counter() - start)
+
+        frame_times = np.array(frame_times) * 1e3
+        return {'benchmark': 'render', 'grid_size': grid_size, 'num_drones': num_drones, 'frames': self.num_frames,
+                'first_frame_ms': first_frame * 1e3, 'mean_ms': float(frame_times.mean()),
+                'p50_ms': float(np.percentile(frame_times, 50)), 'p95_ms': float(np.percentile(frame_times, 95))}
+
+    def __make_env(self, grid_size, num_drones):
+        # stesso seed per ogni benchmark, così i carichi sono ripetibili tra un'esecuzione e l'altra
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        env = DroneDeliveryEnvironment(grid_size, training_mode=False, fleet=DroneDeliveryFleet(num_drones))
+        env.reset()
+        return env
+
+    @staticmethod
+    def quick():
+        # configurazione ridotta, per un controllo rapido in CI
+        return DroneDeliveryBenchmark(grid_sizes=((7, 7), (20, 20)), fleet_sizes=(3, 10), num_steps=1000,
+                                      num_searches=50, num_episodes=5, num_frames=10, num_envs=64)
+
+    @staticmethod
+    def compare(baseline, current, tolerance=0.25):
+        # confronta due report (dizionari o percorsi di file json) e ritorna i benchmark peggiorati oltre la
+        # tolleranza relativa indicata
+        if isinstance(baseline, str):
+            with open(baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        if isinstance(current, str):
+            with open(current) as current_file:
+                current = json.load(current_file)
+
+        def key(result):
+            return result['benchmark'], tuple(result['grid_size']), result['num_drones']
+
+        baseline_results = {key(result): result for result in baseline['results']}
+        regressions = []
+        for result in current['results']:
+            previous = baseline_results.get(key(result))
+            if previous is None:
+                continue
+
+            metric, higher_is_better = DroneDeliveryBenchmark.METRICS[result['benchmark']]
+            ratio = result[metric] / previous[metric]
+            if (higher_is_better and ratio < 1 - tolerance) or (not higher_is_better and ratio > 1 + tolerance):
+                regressions.append({'benchmark': result['benchmark'], 'grid_size': list(result['grid_size']),
+                                    'num_drones': result['num_drones'], 'metric': metric,
+                                    'baseline': previous[metric], 'current': result[metric], 'ratio': ratio})
+
+        return regressions
+
+
+def main():
+    # uso: python DroneDeliveryBenchmark.py [output.json] [--compare baseline.json] [--quick]
+    args = sys.argv[1:]
+    if "--compare" in args:
+        del args[args.index("--compare"):args.index("--compare") + 2]
+    args = [arg for arg in args if not arg.startswith("--")]
+    output_path = args[0] if args else "benchmark.json"
+
+    benchmark = DroneDeliveryBenchmark.quick() if "--quick" in sys.argv else DroneDeliveryBenchmark()
+
+    report = benchmark.run(output_path)
+    print(f"Benchmark results saved to '{output_path}'.")
+
+    # con --compare <baseline.json> segnala i peggioramenti e termina con errore, così può essere usato in CI
+    if "--compare" in sys.argv:
+        baseline_path = sys.argv[sys.argv.index("--compare") + 1]
+        regressions = DroneDeliveryBenchmark.compare(baseline_path, report)
+        for regression in regressions:
+            print(f"Regression: {regression['benchmark']} grid={tuple(regression['grid_size'])} "
+                  f"drones={regression['num_drones']} {regression['metric']} "
+                  f"{regression['baseline']:.2f} -> {regression['current']:.2f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import copy
+import json
+import sys
+
+
+class DroneDeliveryCLI:
+    # configurazione di default di ogni comando; un file json indicato con --config sovrascrive solo le chiavi
+    # presenti. num_drones a None usa la flotta originale con le tre stazioni di ricarica
+    DEFAULTS = {
+        'q_table': "q_table.npy",
+        'state_encoder': None,  # parametri di DroneDeliveryStateEncoder, ad esempio {"has_package": true}
+        'q_table_storage': 'dense',  # 'dense' oppure 'sparse', usato dall'addestramento
+        'q_table_dtype': 'float64',
+        'train': {
+            'grid_size': [5, 5], 'num_drones': None, 'multi_agent': False, 'num_episodes': 4000, 'seed': None,
+            'alpha': 0.1, 'gamma': 0.9, 'epsilon': 0.5, 'epsilon_decay': 0.997,
+            'replay_size': 0, 'batch_size': 32, 'update_every': 4,
+            'metrics': "training_metrics.jsonl", 'plot': "training_rewards.png",
+            'checkpoint': None, 'checkpoint_every': 100, 'resume': False, 'mmap': False,
+            'convergence': None,  # parametri di DroneDeliveryConvergence, ad esempio {"reward_tolerance": 0.05}
+            'workers': 0, 'parallel_mode': 'hogwild',  # con workers > 0 usa DroneDeliveryParallelTrainer
+        },
+        'simulate': {
+            'grid_size': [7, 7], 'num_drones': None, 'headless': False, 'seed': 0, 'max_ticks': 10000,
+            'export': None, 'stride': 1, 'record': None, 'synchronous': False,
+        },
+        'evaluate': {
+            'grid_size': [7, 7], 'num_drones': None, 'num_runs': 10, 'seed': 0, 'max_ticks': 10000, 'output': None,
+            'synchronous': False,
+        },
+        'bench': {
+            'output': "benchmark.json", 'quick': False, 'compare': None, 'tolerance': 0.25,
+        },
+    }
+
+    # comandi e metodi che li eseguono
+    COMMANDS = {'train': 'train', 'simulate': 'simulate', 'evaluate': 'evaluate', 'bench': 'bench',
+                'config': 'show_config'}
+
+    def __init__(self, config=None):
+        self.config = config if config is not None else DroneDeliveryCLI.load_config()
+
+    def run(self, command):
+        if command not in self.COMMANDS:
+            raise ValueError(f"unknown command '{command}', expected one of {tuple(self.COMMANDS)}")
+        return getattr(self, self.COMMANDS[command])()
+
+    # ogni comando importa solo i moduli che gli servono: matplotlib e tkinter vengono caricati solo dalla
+    # simulazione grafica e dai grafici, così i processi brevi dei job batch partono più in fretta
+
+    def train(self):
+        section = self.config['train']
+        self.__seed(section['seed'])
+
+        from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+        from DroneDeliveryMetrics import DroneDeliveryMetrics
+
+        env = DroneDeliveryEnvironment(tuple(section['grid_size']), section['epsilon'], training_mode=True,
+                                       fleet=self.__fleet(section), state_encoder=self.__state_encoder(),
+                                       q_table_storage=self.config['q_table_storage'],
+                                       q_table_dtype=self.config['q_table_dtype'])
+        metrics = DroneDeliveryMetrics(section['metrics'], append=section['resume'])
+
+        if section['workers'] > 0:
+            from DroneDeliveryParallelTrainer import DroneDeliveryParallelTrainer
+
+            trainer = DroneDeliveryParallelTrainer(env, num_episodes=section['num_episodes'],
+                                                   num_workers=section['workers'], mode=section['parallel_mode'],
+                                                   alpha=section['alpha'], gamma=section['gamma'],
+                                                   epsilon=section['epsilon'], epsilon_decay=section['epsilon_decay'],
+                                                   multi_agent=section['multi_agent'], seed=section['seed'] or 0,
+                                                   metrics=metrics)
+            print(f"Starting {trainer.mode} training with {trainer.num_workers} workers...")
+            trainer.train(q_table_path=self.config['q_table'])
+            if section['plot']:
+                DroneDeliveryMetrics.plot(metrics, section['plot'])
+            metrics.close()
+            print(f"Training complete. {metrics.summary()}")
+            return metrics.summary()
+
+        from DroneDeliveryTrainer import DroneDeliveryTrainer
+
+        replay_memory = None
+        if section['replay_size'] > 0:
+            from DroneDeliveryReplayMemory import DroneDeliveryReplayMemory
+            replay_memory = DroneDeliveryReplayMemory(section['replay_size'], seed=section['seed'])
+
+        trainer = DroneDeliveryTrainer(env, num_episodes=section['num_episodes'], alpha=section['alpha'],
+                                       gamma=section['gamma'], epsilon=section['epsilon'],
+                                       epsilon_decay=section['epsilon_decay'], replay_memory=replay_memory,
+                                       batch_size=section['batch_size'], update_every=section['update_every'],
+                                       metrics=metrics, multi_agent=section['multi_agent'])
+
+        checkpoint = None
+        if section['checkpoint'] is not None:
+            from DroneDeliveryCheckpoint import DroneDeliveryCheckpoint
+
+            checkpoint = DroneDeliveryCheckpoint(section['checkpoint'], every=section['checkpoint_every'],
+                                                 mmap=section['mmap'])
+            if section['resume']:
+                if trainer.resume(checkpoint):
+                    print(f"Resuming training from episode {trainer.episode}...")
+                else:
+                    print(f"No checkpoint found in '{checkpoint.directory}', starting a new training.")
+
+        convergence = None
+        if section['convergence']:
+            from DroneDeliveryConvergence import DroneDeliveryConvergence
+            convergence = DroneDeliveryConvergence(**section['convergence'])
+
+        print("Starting training...")
+        trainer.train(q_table_path=self.config['q_table'], plot=section['plot'] or False, checkpoint=checkpoint,
+                      convergence=convergence)
+        metrics.close()
+        print(f"Training complete. {metrics.summary()}")
+        return metrics.summary()
+
+    def simulate(self):
+        section = self.config['simulate']
+        fleet = self.__fleet(section)
+
+        if not section['headless']:
+            from DroneDeliverySimulation import main
+            return main(tuple(section['grid_size']), self.config['q_table'], fleet, self.__state_encoder(),
+                        section['synchronous'])
+
+        from DroneDeliverySimulation import main_headless
+        return main_headless(1, tuple(section['grid_size']), self.config['q_table'], fleet, section['export'],
+                             section['record'], section['seed'], section['max_ticks'], self.__state_encoder(),
+                             section['synchronous'], section['stride'])
+
+    def evaluate(self):
+        section = self.config['evaluate']
+
+        import numpy as np
+        from DroneDeliverySimulation import DroneDeliverySimulation
+
+        try:
+            q_table = np.load(self.config['q_table'])
+        except FileNotFoundError:
+            print("Error: q-table not found.")
+            return None
+
+        results = DroneDeliverySimulation.evaluate(q_table, tuple(section['grid_size']), section['num_runs'],
+                                                   section['seed'], section['max_ticks'], self.__fleet(section),
+                                                   self.__state_encoder(), section['synchronous'])
+        summary = {
+            'runs': len(results),
+            'average_deliveries': float(np.mean([sum(result['deliveries']) for result in results])),
+            'battery_failures': sum(sum(result['battery_failures']) for result in results),
+            'unfinished_runs': sum(1 for result in results if not result['finished']),
+        }
+        print(f"Average deliveries: {summary['average_deliveries']}, "
+              f"battery failures: {summary['battery_failures']}")
+
+        if section['output'] is not None:
+            with open(section['output'], "w") as output_file:
+                json.dump({'config': section, 'summary': summary, 'results': results}, output_file, indent=2)
+            print(f"Evaluation results saved to '{section['output']}'.")
+        return summary
+
+    def bench(self):
+        section = self.config['bench']
+
+        from DroneDeliveryBenchmark import DroneDeliveryBenchmark
+
+        benchmark = DroneDeliveryBenchmark.quick() if section['quick'] else DroneDeliveryBenchmark()
+        report = benchmark.run(section['output'])
+        print(f"Benchmark results saved to '{section['output']}'.")
+
+        if section['compare'] is not None:
+            regressions = DroneDeliveryBenchmark.compare(section['compare'], report, section['tolerance'])
+            for regression in regressions:
+                print(f"Regression: {regression['benchmark']} grid={tuple(regression['grid_size'])} "
+                      f"drones={regression['num_drones']} {regression['metric']} "
+                      f"{regression['baseline']:.2f} -> {regression['current']:.2f}")
+            if regressions:
+                sys.exit(1)
+        return report
+
+    def show_config(self):
+        # stampa la configurazione effettiva, utilizzabile come base per un file di configurazione
+        print(json.dumps(self.config, indent=2))
+        return self.config
+
+    def __fleet(self, section):
+        if section['num_drones'] is None:
+            return None
+
+        from DroneDeliveryFleet import DroneDeliveryFleet
+        return DroneDeliveryFleet(section['num_drones'])
+
+    def __state_encoder(self):
+        if self.config['state_encoder'] is None:
+            return None
+
+        from DroneDeliveryStateEncoder import DroneDeliveryStateEncoder
+        return DroneDeliveryStateEncoder(**self.config['state_encoder'])
+
+    @staticmethod
+    def __seed(seed):
+        if seed is not None:
+            import random
+            import numpy as np
+
+            random.seed(seed)
+            np.random.seed(seed)
+
+    @staticmethod
+    def load_config(path=None, overrides=()):
+        # parte dai default, applica il file di configurazione e poi gli override "sezione.chiave=valore" (il
+        # valore viene letto come json, altrimenti resta una stringa)
+        config = copy.deepcopy(DroneDeliveryCLI.DEFAULTS)
+        if path is not None:
+            with open(path) as config_file:
+                DroneDeliveryCLI.__merge(config, json.load(config_file), path)
+
+        for override in overrides:
+            key, separator, value = override.partition("=")
+            if not separator:
+                raise ValueError(f"invalid override '{override}', expected key=value")
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+
+            *sections, name = key.split(".")
+            update = {name: value}
+            for section in reversed(sections):
+                update = {section: update}
+            DroneDeliveryCLI.__merge(config, update, override)
+
+        DroneDeliveryCLI.__check_fleets(config)
+        DroneDeliveryCLI.__check_workers(config)
+        return config
+
+    @staticmethod
+    def __check_fleets(config):
+        # le stazioni di ricarica di tutti i droni che si muovono devono essere nella griglia: con la flotta
+        # originale questo vale dalla griglia 7x7 in su, mentre l'addestramento a un solo drone usa solo la prima
+        from DroneDeliveryFleet import DroneDeliveryFleet
+
+        for name in ('train', 'simulate', 'evaluate'):
+            section = config[name]
+            if name == 'train' and not section['multi_agent']:
+                continue
+            fleet = DroneDeliveryFleet.legacy() if section['num_drones'] is None else \
+                DroneDeliveryFleet(section['num_drones'])
+            try:
+                fleet.check_grid(section['grid_size'])
+            except ValueError as e:
+                raise ValueError(f"invalid '{name}' configuration: {e}; use a larger grid_size or set num_drones")
+
+    @staticmethod
+    def __check_workers(config):
+        # DroneDeliveryParallelTrainer non supporta checkpoint, replay memory e criterio di convergenza: queste
+        # chiavi vengono rifiutate invece di essere ignorate in silenzio
+        section = config['train']
+        if section['workers'] <= 0:
+            return
+        defaults = DroneDeliveryCLI.DEFAULTS['train']
+        unsupported = [key for key in ('checkpoint', 'checkpoint_every', 'resume', 'mmap', 'replay_size', 'batch_size',
+                                       'update_every', 'convergence') if section[key] != defaults[key]]
+        if unsupported:
+            raise ValueError(f"invalid 'train' configuration: {', '.join(unsupported)} not supported with workers > 0")
+
+    @staticmethod
+    def __merge(config, update, source):
+        # le chiavi sconosciute sono quasi sempre errori di battitura: vengono segnalate invece di essere ignorate
+        for key, value in update.items():
+            if key not in config:
+                raise ValueError(f"unknown configuration key '{key}' in '{source}'")
+            if isinstance(config[key], dict) and key in DroneDeliveryCLI.DEFAULTS and isinstance(value, dict):
+                DroneDeliveryCLI.__merge(config[key], value, source)
+            elif isinstance(config[key], dict) and key in DroneDeliveryCLI.DEFAULTS:
+                raise ValueError(f"configuration key '{key}' in '{source}' must be an object")
+            else:
+                config[key] = value
+
+
+def main():
+    # uso: python DroneDeliveryCLI.py train|simulate|evaluate|bench|config [--config config.json]
+    #      [--set sezione.chiave=valore ...]
+    args = sys.argv[1:]
+    config_path = None
+    overrides = []
+    positional = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--config":
+            config_path = args.pop(0)
+        elif arg == "--set":
+            overrides.append(args.pop(0))
+        else:
+            positional.append(arg)
+
+    if len(positional) != 1 or positional[0] not in DroneDeliveryCLI.COMMANDS:
+        print(f"usage: python DroneDeliveryCLI.py {'|'.join(DroneDeliveryCLI.COMMANDS)} [--config config.json] "
+              f"[--set section.key=value ...]")
+        sys.exit(2)
+
+    try:
+        config = DroneDeliveryCLI.load_config(config_path, overrides)
+    except ValueError as e:
+        print(f"error: {e}")
+        sys.exit(2)
+
+    cli = DroneDeliveryCLI(config)
+    cli.run(positional[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import pickle
+import random
+import numpy as np
+
+
+class DroneDeliveryCheckpoint:
+    # con mmap la q-table vive in un file mappato che riceve anche gli aggiornamenti successivi al checkpoint:
+    # per restare coerente ogni checkpoint ne salva comunque una copia, quindi mmap riduce la memoria occupata ma
+    # non le scritture su disco. La copia viene scritta solo se la q-table è cambiata dall'ultimo checkpoint; il
+    # confronto legge la copia precedente a blocchi, senza caricarla in memoria
+    COMPARE_CHUNK_SIZE = 1 << 20  # elementi confrontati per blocco
+
+    STATE_FILE = "checkpoint.pkl"
+    MMAP_Q_TABLE_FILE = "q_table.npy"
+
+    def __init__(self, directory, every=100, mmap=False):
+        self.directory = directory
+        self.every = every  # episodi tra un checkpoint e il successivo
+        self.mmap = mmap  # se True la q-table vive in un file .npy mappato in memoria nella cartella
+        os.makedirs(directory, exist_ok=True)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, self.STATE_FILE))
+
+    def attach(self, env):
+        # con mmap la q-table dell'ambiente viene spostata nel file mappato: gli aggiornamenti scrivono
+        # direttamente su disco invece di occupare memoria
+        if self.mmap and env.q_table_storage == 'sparse':
+            raise ValueError("memory-mapped checkpoints need a dense q-table")
+        if self.mmap and not isinstance(env.Q_table, np.memmap):
+            env.Q_table = self.__map_q_table(env.Q_table)
+
+    def __map_q_table(self, q_table):
+        path = os.path.join(self.directory, self.MMAP_Q_TABLE_FILE)
+        mapped = np.lib.format.open_memmap(path, mode='w+', dtype=q_table.dtype, shape=q_table.shape)
+        mapped[...] = q_table
+        return mapped
+
+    def save(self, trainer):
+        env = trainer.env
+
+        path = os.path.join(self.directory, self.STATE_FILE)
+        previous = self.__read_state(path)['q_table_file'] if os.path.exists(path) else None
+
+        # ogni checkpoint punta a una copia della q-table scritta prima dello stato; anche con mmap, perché il
+        # file mappato continua a ricevere gli aggiornamenti successivi al checkpoint. Se la q-table non è
+        # cambiata, il checkpoint riusa la copia precedente
+        q_table = env.q_table_array()
+        if self.mmap and previous is not None and previous != self.MMAP_Q_TABLE_FILE \
+                and self.__same_q_table(os.path.join(self.directory, previous), q_table):
+            q_table_file = previous
+        else:
+            q_table_file = f"q_table_{trainer.episode:08d}.npy"
+            DroneDeliveryCheckpoint.atomic_save(os.path.join(self.directory, q_table_file), q_table)
+
+        state = {
+            'episode': trainer.episode,
+            'epsilon': trainer.epsilon,
+            'total_steps': trainer.total_steps,
+            'q_table_file': q_table_file,
+            'random_state': random.getstate(),
+            'numpy_random_state': np.random.get_state(),
+            'weather_zones': [(y, x, width, height, lifetime)
+                              for (y, x), (width, height), lifetime in env.weather.zones()],
+            'replay_memory': None,
+            'metrics': trainer.metrics.state(),
+            'convergence': trainer.convergence.state() if trainer.convergence is not None else None,
+        }
+
+        memory = trainer.replay_memory
+        if memory is not None:
+            state['replay_memory'] = {
+                'states': memory.states[:memory.size].copy(), 'actions': memory.actions[:memory.size].copy(),
+                'rewards': memory.rewards[:memory.size].copy(),
+                'next_states': memory.next_states[:memory.size].copy(),
+                'position': memory.position, 'size': memory.size, 'rng_state': memory.rng.bit_generator.state,
+            }
+
+        # lo stato viene sostituito in modo atomico: è lui a rendere valido il checkpoint
+        DroneDeliveryCheckpoint.atomic_write(path, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+        # la q-table del checkpoint precedente non serve più (il file mappato resta quello in uso)
+        if previous is not None and previous not in (q_table_file, self.MMAP_Q_TABLE_FILE):
+            os.remove(os.path.join(self.directory, previous))
+
+    def restore(self, trainer):
+        # riporta trainer e ambiente allo stato dell'ultimo checkpoint; ritorna False se la cartella non contiene
+        # un checkpoint. Le ricompense dei singoli episodi non vengono salvate: restano nel file delle metriche,
+        # troncato alla posizione registrata nel checkpoint
+        path = os.path.join(self.directory, self.STATE_FILE)
+        if not os.path.exists(path):
+            return False
+
+        state = self.__read_state(path)
+        env = trainer.env
+
+        q_table_path = os.path.join(self.directory, state['q_table_file'])
+        if self.mmap and state['q_table_file'] == self.MMAP_Q_TABLE_FILE:
+            # checkpoint che puntano direttamente al file mappato
+            env.Q_table = np.load(q_table_path, mmap_mode='r+')
+        elif self.mmap:
+            # la copia del checkpoint viene letta dal disco e copiata nel file mappato senza caricarla in memoria
+            env.set_q_table(np.load(q_table_path, mmap_mode='r'))
+            env.Q_table = self.__map_q_table(env.Q_table)
+        else:
+            env.set_q_table(np.load(q_table_path))
+            self.attach(env)
+
+        trainer.episode = state['episode']
+        trainer.epsilon = state['epsilon']
+        trainer.total_steps = state['total_steps']
+        env.epsilon = trainer.epsilon
+
+        random.setstate(state['random_state'])
+        np.random.set_state(state['numpy_random_state'])
+        env.weather.set_zones(state['weather_zones'])
+        trainer.metrics.restore(state['metrics'])
+        trainer.convergence_state = state.get('convergence')  # ripristinato da convergence.start()
+
+        saved_memory = state['replay_memory']
+        if saved_memory is not None and trainer.replay_memory is not None:
+            memory = trainer.replay_memory
+            size = saved_memory['size']
+            if size > memory.capacity:
+                raise ValueError(f"checkpoint replay memory has {size} transitions, capacity is {memory.capacity}")
+            memory.states[:size] = saved_memory['states']
+            memory.actions[:size] = saved_memory['actions']
+            memory.rewards[:size] = saved_memory['rewards']
+            memory.next_states[:size] = saved_memory['next_states']
+            memory.position = saved_memory['position'] % memory.capacity
+            memory.size = size
+            memory.rng.bit_generator.state = saved_memory['rng_state']
+
+        return True
+
+    @staticmethod
+    def __same_q_table(path, q_table):
+        saved = np.load(path, mmap_mode='r')
+        if saved.shape != q_table.shape or saved.dtype != q_table.dtype:
+            return False
+
+        saved, q_table = saved.reshape(-1), q_table.reshape(-1)
+        for start in range(0, len(q_table), DroneDeliveryCheckpoint.COMPARE_CHUNK_SIZE):
+            end = start + DroneDeliveryCheckpoint.COMPARE_CHUNK_SIZE
+            if not np.array_equal(saved[start:end], q_table[start:end]):
+                return False
+        return True
+
+    @staticmethod
+    def __read_state(path):
+        with open(path, "rb") as state_file:
+            return pickle.load(state_file)
+
+    @staticmethod
+    def atomic_save(path, array):
+        # scrive l'array in un file temporaneo nella stessa cartella e lo sostituisce a path solo a scrittura
+        # completata: un'interruzione lascia intatto il file precedente
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as array_file:
+            np.save(array_file, array)
+            array_file.flush()
+            os.fsync(array_file.fileno())
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def atomic_write(path, data):
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as data_file:
+            data_file.write(data)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        os.replace(temporary_path, path)
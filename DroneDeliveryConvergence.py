@@ -0,0 +1,109 @@
+
+class DroneDeliveryConvergence:
+    def __init__(self, window=100, q_delta_threshold=None, policy_change_threshold=None, reward_tolerance=None,
+                 patience=3, min_episodes=0):
+        # le statistiche vengono calcolate ogni window episodi; l'addestramento si ferma quando tutti i criteri
+        # indicati (quelli a None non vengono usati) valgono per patience finestre consecutive
+        self.window = window
+        self.q_delta_threshold = q_delta_threshold  # massima variazione assoluta della q-table nella finestra
+        self.policy_change_threshold = policy_change_threshold  # stati in cui cambia l'azione greedy
+        self.reward_tolerance = reward_tolerance  # variazione relativa della media delle ricompense
+        self.patience = patience
+        self.min_episodes = min_episodes
+
+        self.history = []
+        self.streak = 0
+        self.stop_reason = None
+        self.previous_q_table = None
+        self.previous_policy = None
+
+        # somma delle ricompense della finestra corrente e media di quella precedente
+        self.window_reward_sum = 0.0
+        self.previous_reward_mean = None
+
+    def enabled(self):
+        return any(threshold is not None for threshold in
+                   (self.q_delta_threshold, self.policy_change_threshold, self.reward_tolerance))
+
+    def state(self):
+        # stato salvato nei checkpoint: finestre già valutate, serie di finestre convergenti e copie di confronto
+        return {'history': list(self.history), 'streak': self.streak, 'previous_q_table': self.previous_q_table,
+                'previous_policy': self.previous_policy, 'window_reward_sum': self.window_reward_sum,
+                'previous_reward_mean': self.previous_reward_mean}
+
+    def start(self, trainer):
+        # riprendendo da un checkpoint continua dallo stato salvato, altrimenti la prima finestra viene confrontata
+        # con la q-table e la politica di partenza
+        self.stop_reason = None
+        if trainer.convergence_state is not None:
+            for name, value in trainer.convergence_state.items():
+                setattr(self, name, value)
+            self.history = list(self.history)
+            return
+
+        self.previous_q_table = trainer.env.q_table_snapshot()
+        self.previous_policy = trainer.env.policy_snapshot()
+        self.streak = 0
+        self.stop_reason = None
+        self.window_reward_sum = 0.0
+        self.previous_reward_mean = None
+
+    def update(self, trainer):
+        # chiamato al termine di ogni episodio; ritorna True se l'addestramento può fermarsi
+        episode = trainer.episode
+        env = trainer.env
+        self.window_reward_sum += trainer.metrics.last_reward
+
+        if episode % self.window != 0:
+            return False
+
+        # variazione della q-table e della politica greedy rispetto alla finestra precedente
+        q_delta_max, q_delta_mean = env.q_table_delta(self.previous_q_table)
+        policy_changes = env.policy_changes(self.previous_policy)
+        self.previous_q_table = env.q_table_snapshot()
+        self.previous_policy = env.policy_snapshot()
+
+        # media mobile delle ricompense dell'ultima finestra confrontata con quella della finestra precedente
+        reward_mean = self.window_reward_sum / self.window
+        reward_change = None
+        if self.previous_reward_mean is not None:
+            previous_mean = self.previous_reward_mean
+            reward_change = abs(reward_mean - previous_mean) / max(abs(previous_mean), 1e-9)
+        self.previous_reward_mean = reward_mean
+        self.window_reward_sum = 0.0
+
+        window = {
+            'episode': episode,
+            'q_delta_max': q_delta_max,
+            'q_delta_mean': q_delta_mean,
+            'policy_changes': policy_changes,
+            'reward_mean': reward_mean,
+            'reward_change': reward_change,
+        }
+        self.history.append(window)
+
+        if not self.enabled():
+            return False
+
+        converged = (
+            (self.q_delta_threshold is None or window['q_delta_max'] <= self.q_delta_threshold) and
+            (self.policy_change_threshold is None or window['policy_changes'] <= self.policy_change_threshold) and
+            (self.reward_tolerance is None or (reward_change is not None and reward_change <= self.reward_tolerance))
+        )
+        self.streak = self.streak + 1 if converged else 0
+
+        if self.streak >= self.patience and episode >= self.min_episodes:
+            self.stop_reason = (f"converged at episode {episode}: {self.patience} windows of {self.window} episodes "
+                                f"with {self.__describe(window)}")
+            return True
+        return False
+
+    def __describe(self, window):
+        criteria = []
+        if self.q_delta_threshold is not None:
+            criteria.append(f"max Q delta {window['q_delta_max']:.4g} <= {self.q_delta_threshold}")
+        if self.policy_change_threshold is not None:
+            criteria.append(f"policy changes {window['policy_changes']} <= {self.policy_change_threshold}")
+        if self.reward_tolerance is not None:
+            criteria.append(f"reward change {window['reward_change']:.4g} <= {self.reward_tolerance}")
+        return ", ".join(criteria)
@@ -1,150 +1,420 @@
-
 import numpy as np
 import random
 
-from collections import deque
+from collections import OrderedDict
 from ActionType import ActionType
+from DroneDeliveryFleet import DroneDeliveryFleet
+from DroneDeliveryPlanner import DroneDeliveryPlanner
+from DroneDeliveryProfiler import DroneDeliveryProfiler
+from DroneDeliverySparseQTable import DroneDeliverySparseQTable
+from DroneDeliveryStateEncoder import DroneDeliveryStateEncoder
+from DroneDeliveryWeather import DroneDeliveryWeather
+from DroneState import DroneState
 
 
 class DroneDeliveryEnvironment:
     def __init__(self, grid_size, epsilon=0.5, root=None, canvas=None, ax=None,
-                 training_mode=True):
+                 training_mode=True, fleet=None, state_encoder=None, q_table_storage='dense', q_table_dtype=np.float64):
         self.grid_size = grid_size
         self.WAREHOUSE_ITEMS = 20
         self.BATTERY_LEVELS = 40
         self.LOW_BATTERY_THRESHOLD = 20
-        self.CHARGING_STATIONS = [(3, 3), (6, 0), (0, 6)]
         self.WAREHOUSE = (grid_size[0] // 2, grid_size[1] - 1)
         self.CHARGING_TIME = 7
 
-        self.drone_states = [
-            (3, 3, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, []),
-            (6, 0, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, []),
-            (0, 6, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, [])
-        ]
+        # la flotta determina il numero di droni e le stazioni di ricarica (di default la disposizione originale)
+        self.fleet = fleet if fleet is not None else DroneDeliveryFleet.legacy()
+        self.CHARGING_STATIONS = self.fleet.charging_stations(grid_size, self.WAREHOUSE)
+        self.num_drones = len(self.CHARGING_STATIONS)
+
+        # lo stato di ogni drone viene aggiornato sul posto: step() e reset() ne restituiscono una vista a tupla
+        self.drone_states = self.__initial_drone_states()
 
         self.actions = [ActionType.UP, ActionType.DOWN, ActionType.LEFT, ActionType.RIGHT,
                         ActionType.SKIP, ActionType.CIRCUMNAVIGATE]
 
         self.num_actions = len(self.actions)
 
-        self.Q_table = np.zeros((2, 2, 2, 2, 5, 2, self.num_actions))
+        # la codifica degli stati determina gli assi della q-table (di default quelli originali); la q-table può
+        # essere densa, in float64 o float32, oppure sparsa per codifiche con molti stati
+        if q_table_storage not in ('dense', 'sparse'):
+            raise ValueError(f"unknown q-table storage '{q_table_storage}', expected 'dense' or 'sparse'")
+        self.state_encoder = state_encoder if state_encoder is not None else DroneDeliveryStateEncoder.legacy()
+        self.q_table_storage = q_table_storage
+        self.q_table_dtype = np.dtype(q_table_dtype)
+        self.Q_table = self.new_q_table()
+
+        # vista piatta della q-table e politica greedy, ricalcolate quando la q-table cambia
+        self.flat_q_table = None
+        self.flat_q_table_source = None
+        self.greedy_policy = None
+        self.greedy_policy_source = None
 
         self.alpha = 0.1
         self.gamma = 0.9
         self.epsilon = epsilon
         self.num_objects = self.WAREHOUSE_ITEMS
-        self.deliveries_completed = [0, 0, 0]
+        self.deliveries_completed = [0] * self.num_drones
         self.training_mode = training_mode
         self.root = root
         self.canvas = canvas
         self.ax = ax
         self.im = None
-        self.drone_labels = [None, None, None]
+        self.drone_labels = [None] * self.num_drones
         self.warehouse_label = None
-        self.charging_stations_labels = [None, None, None]
-        self.delivery_points_labels = [None, None, None]
+        self.charging_stations_labels = [None] * self.num_drones
+        self.delivery_points_labels = [None] * self.num_drones
         self.count = 0
-        self.target_delivery_points = [None, None, None]
-        self.weather_zones = []  # lista per memorizzare le zone di maltempo
+        self.target_delivery_points = [None] * self.num_drones
+        self.weather = DroneDeliveryWeather(grid_size)  # zone di maltempo attive
         self.weather_frequency = 20  # frequenza con cui appaiono le zone di maltempo (in numero di step)
         self.weather_lifetime = 20  # durata delle zone di maltempo (in step)
         self.weather_zone_patches = []
+        self.charging_station_patches = []
+        self.render_background = None
 
         # memorizza le coordinate degli elementi
         self.elements_coordinates = {
-            'drones': [state[:2] for state in self.drone_states],
+            'drones': [(state.y, state.x) for state in self.drone_states],
             'delivery_points': [None] * len(self.drone_states),
             'warehouse': [self.WAREHOUSE],
             'charging_stations': self.CHARGING_STATIONS
         }
 
+        # griglia di occupazione con un bordo di una cella: conta stazioni di ricarica, delivery point e droni
+        # presenti in ogni cella e viene aggiornata solo quando uno di questi elementi cambia posizione
+        self.occupancy = np.zeros((grid_size[0] + 2, grid_size[1] + 2), dtype=np.int16)
+
+        # impronta della griglia di occupazione: somma di una chiave casuale per ogni elemento presente,
+        # aggiornata insieme alla griglia (il generatore è separato per non alterare quello globale)
+        self.occupancy_keys = np.random.default_rng(0).integers(0, 2 ** 62, size=self.occupancy.shape).tolist()
+        self.occupancy_hash = 0
+        self.drones_hash = 0  # parte dell'impronta dovuta ai soli droni
+
+        # indice delle celle libere (non occupate e diverse dal magazzino), aggiornato insieme alla griglia di
+        # occupazione: la lista permette di estrarre una cella con una sola estrazione casuale, la posizione di ogni
+        # cella nella lista (-1 se occupata) di toglierla scambiandola con l'ultima
+        self.free_cells = []
+        self.free_cell_index = [[-1] * grid_size[1] for _ in range(grid_size[0])]
+        self.no_free_cell_pick_ups = 0  # ritiri rinviati perché non c'era una cella libera per il delivery point
+        self.__rebuild_occupancy()
+
+        # cache LRU dei percorsi di circumnavigazione, indicizzata su partenza, target e impronte degli ostacoli fissi
+        # e del maltempo; ogni percorso è valido finché non cambiano i droni vicini (vedi __get_cached_path)
+        self.path_cache = OrderedDict()
+        self.path_cache_size = 1024
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+
+        # profilazione opzionale delle fasi di step(): disattivata, costa un solo confronto per fase
+        self.profiler = None
+
     def reset(self):
-        self.drone_states = [
-            (3, 3, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, []),
-            (6, 0, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, []),
-            (0, 6, self.BATTERY_LEVELS - 1, 0, 0, 0, 0, False, 0, ActionType.SKIP.value, 0, [])
-        ]
-        self.target_delivery_points = [None, None, None]
-        self.deliveries_completed = [0, 0, 0]
+        self.drone_states = self.__initial_drone_states()
+        self.target_delivery_points = [None] * self.num_drones
+        self.deliveries_completed = [0] * self.num_drones
         self.num_objects = self.WAREHOUSE_ITEMS
 
-        return self.drone_states
+        # riporta droni e delivery point nelle coordinate degli elementi e ricostruisce la griglia di occupazione
+        self.elements_coordinates['drones'] = [(state.y, state.x) for state in self.drone_states]
+        self.elements_coordinates['delivery_points'] = [None] * len(self.drone_states)
+        self.__rebuild_occupancy()
+
+        return [state.as_tuple() for state in self.drone_states]
+
+    def __initial_drone_states(self):
+        # ogni drone parte dalla propria stazione di ricarica
+        return [DroneState(y, x, self.BATTERY_LEVELS - 1, relative_target=ActionType.SKIP.value)
+                for y, x in self.CHARGING_STATIONS]
 
     def choose_action(self, state):
-        _, _, battery_level, obstacle_up, obstacle_down, obstacle_left, obstacle_right, _, _, relative_target_position, circumnavigate, _, = state
-        obstacle_state = (obstacle_up, obstacle_down, obstacle_left, obstacle_right)
-        circumnavigate_state = 1 if circumnavigate else 0
-
-        q_values = self.Q_table[
-            obstacle_state[0], obstacle_state[1], obstacle_state[2], obstacle_state[3], relative_target_position, circumnavigate_state]
-        if random.uniform(0, 1) < self.epsilon or np.sum(q_values) == 0:
-            #if np.sum(q_values) == 0:
-                # self.count += 1
-                # print("random action: " + str(self.count))
+        state_index = self.encode_state(state)
+
+        if random.uniform(0, 1) < self.epsilon:
             return random.choice(range(self.num_actions))
+
+        # con epsilon nullo la q-table non cambia: la politica greedy viene calcolata una volta e poi letta
+        # direttamente; durante l'addestramento si usa solo la riga dello stato corrente
+        policy = self.greedy_policy if self.greedy_policy_source is self.Q_table else None
+        if policy is None and self.epsilon == 0:
+            policy = self.get_greedy_policy()
+
+        if policy is not None:
+            if self.q_table_storage == 'sparse':
+                action = self.Q_table.greedy_action(policy, state_index)
+            else:
+                action = policy[state_index]
         else:
-            return np.argmax(q_values)
+            # sulla singola riga le operazioni sulle liste costano meno di quelle numpy
+            q_values = self.__flat_q_table()[state_index].tolist()
+            action = -1 if sum(q_values) == 0 else q_values.index(max(q_values))
 
-    def update_q_table(self, state, action, reward, next_state):
-        _, _, _, obstacle_up, obstacle_down, obstacle_left, obstacle_right, _, _, relative_target_position, circumnavigate, _ = state
-        _, _, _, next_obstacle_up, next_obstacle_down, next_obstacle_left, next_obstacle_right, _, _, next_relative_target_position, next_circumnavigate, _ = next_state
+        # con q-values tutti nulli lo stato non è mai stato visitato, quindi l'azione è casuale
+        if action < 0:
+            return random.choice(range(self.num_actions))
+        return action
 
-        # valori del vecchio stato
-        obstacle_state = (obstacle_up, obstacle_down, obstacle_left, obstacle_right)
-        next_obstacle_state = (next_obstacle_up, next_obstacle_down, next_obstacle_left, next_obstacle_right)
+    def choose_actions(self, states):
+        # sceglie le azioni di tutta la flotta: in inferenza (epsilon nullo) con un'unica lettura della politica
+        # greedy, altrimenti stato per stato come choose_action()
+        if self.epsilon != 0:
+            return [self.choose_action(state) for state in states]
 
-        circumnavigate_state = 1 if circumnavigate else 0
-        next_circumnavigate_state = 1 if next_circumnavigate else 0
+        policy = self.get_greedy_policy()
+        if self.q_table_storage == 'sparse':
+            actions = [self.Q_table.greedy_action(policy, self.encode_state(state)) for state in states]
+        else:
+            actions = policy[[self.encode_state(state) for state in states]].tolist()
+        return [random.choice(range(self.num_actions)) if action < 0 else action for action in actions]
 
-        # ricava la migliore azione che si può scegliere nel nuovo stato
-        best_next_action = np.argmax(self.Q_table[
-                                         next_obstacle_state[0], next_obstacle_state[1], next_obstacle_state[2],
-                                         next_obstacle_state[3], next_relative_target_position, next_circumnavigate_state])
+    def update_q_table(self, state, action, reward, next_state):
+        q_table = self.__flat_q_table()
 
-        # calcola il target che rappresenta il valore atteso della ricompensa futura:
-        td_target = reward + self.gamma * self.Q_table[
-            next_obstacle_state[0], next_obstacle_state[1], next_obstacle_state[2], next_obstacle_state[
-                3], next_relative_target_position, next_circumnavigate_state, best_next_action]
+        # calcola il target che rappresenta il valore atteso della ricompensa futura, usando la migliore azione
+        # che si può scegliere nel nuovo stato (letto per primo: con la q-table sparsa la creazione di una riga
+        # può riallocare le altre)
+        td_target = reward + self.gamma * max(q_table[self.encode_state(next_state)].tolist())
+        q_values = q_table[self.encode_state(state)]
 
         # calcola l'errore: quello che è venuto in meno rispetto al valore atteso
-        td_error = td_target - self.Q_table[
-            obstacle_state[0], obstacle_state[1], obstacle_state[2], obstacle_state[
-                3], relative_target_position, circumnavigate_state, action]
+        td_error = td_target - q_values.item(action)
 
         # aggiorna la q-table per l'azione corrente, migliorando le scelte future
-        self.Q_table[
-            obstacle_state[0], obstacle_state[1], obstacle_state[2], obstacle_state[
-                3], relative_target_position, circumnavigate_state, action] += self.alpha * td_error
+        q_values[action] += self.alpha * td_error
+        self.greedy_policy = None
+
+    def update_q_table_indices(self, state_indices, actions, rewards, next_state_indices):
+        # applica in sequenza la regola di update_q_table() a transizioni già codificate con encode_state()
+        q_table = self.__flat_q_table()
+        gamma = self.gamma
+        alpha = self.alpha
+        for state_index, action, reward, next_state_index in zip(state_indices, actions, rewards,
+                                                                 next_state_indices):
+            td_target = reward + gamma * max(q_table[next_state_index].tolist())
+            q_values = q_table[state_index]
+            q_values[action] += alpha * (td_target - q_values.item(action))
+        self.greedy_policy = None
+
+    def update_q_table_batch(self, state_indices, actions, rewards, next_state_indices):
+        # stesso aggiornamento di update_q_table() per un minibatch di transizioni (indici piatti degli stati):
+        # gli errori sono calcolati tutti sulla q-table prima dell'aggiornamento e np.add.at somma i contributi
+        # delle transizioni ripetute sulla stessa coppia stato-azione
+        q_table = self.__flat_q_table()
+        if self.q_table_storage == 'sparse':
+            # gli indici degli stati diventano righe del blocco di q-values, create prima di leggerlo
+            state_indices = q_table.row_indices(state_indices)
+            next_state_indices = q_table.row_indices(next_state_indices)
+            q_table = q_table.values
+
+        td_target = rewards + self.gamma * q_table[next_state_indices].max(axis=1)
+        td_error = td_target - q_table[state_indices, actions]
+        np.add.at(q_table, (state_indices, actions), self.alpha * td_error)
+        self.greedy_policy = None
+
+    def encode_state(self, state):
+        # indice piatto della q-table secondo la codifica degli stati dell'ambiente
+        return self.state_encoder.encode(state)
+
+    def new_q_table(self):
+        if self.q_table_storage == 'sparse':
+            return DroneDeliverySparseQTable(self.state_encoder.num_states, self.num_actions, self.q_table_dtype)
+        return np.zeros(self.state_encoder.shape + (self.num_actions,), dtype=self.q_table_dtype)
+
+    def set_q_table(self, q_table):
+        # imposta una q-table letta da file (ad esempio q_table.npy): un array denso con gli assi della codifica
+        # degli stati oppure i record di una q-table sparsa, convertiti nel formato di memorizzazione dell'ambiente
+        if q_table.dtype.names is not None:
+            if q_table.dtype['q_values'].shape != (self.num_actions,) or \
+                    (len(q_table) and q_table['state'].max() >= self.state_encoder.num_states):
+                raise ValueError(f"sparse q-table does not match the state encoding with "
+                                 f"{self.state_encoder.num_states} states and {self.num_actions} actions")
+            sparse = DroneDeliverySparseQTable.from_records(q_table, self.state_encoder.num_states, self.num_actions,
+                                                             self.q_table_dtype)
+            self.Q_table = sparse if self.q_table_storage == 'sparse' else \
+                sparse.to_dense().reshape(self.state_encoder.shape + (self.num_actions,))
+            return
+
+        shape = self.state_encoder.shape + (self.num_actions,)
+        if q_table.size != self.state_encoder.num_states * self.num_actions:
+            raise ValueError(f"q-table with shape {q_table.shape} does not match the state encoding {shape}")
+        if q_table.shape != shape:
+            q_table = q_table.reshape(shape)
+
+        if self.q_table_storage == 'sparse':
+            self.Q_table = DroneDeliverySparseQTable.from_dense(q_table, self.q_table_dtype)
+        else:
+            self.Q_table = q_table.astype(self.q_table_dtype, copy=False)
+
+    def load_q_table(self, path):
+        self.set_q_table(np.load(path))
+
+    def q_table_array(self):
+        # array da salvare con np.save: la q-table densa oppure i record degli stati memorizzati
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.to_records()
+        return self.Q_table
+
+    def q_table_snapshot(self):
+        # copia della q-table da confrontare con q_table_delta(): con la q-table sparsa solo le righe memorizzate
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.snapshot()
+        return np.array(self.Q_table)
+
+    def q_table_delta(self, snapshot):
+        # variazione assoluta massima e media dei q-values rispetto a q_table_snapshot()
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.abs_diff(snapshot)
+        q_delta = np.abs(self.Q_table - snapshot)
+        return float(q_delta.max()), float(q_delta.mean())
+
+    def policy_snapshot(self):
+        # copia della politica greedy da confrontare con policy_changes(); con la q-table sparsa insieme agli stati
+        # delle righe a cui si riferisce
+        policy = self.get_greedy_policy()
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.states[:len(policy)].copy(), policy.copy()
+        return policy.copy()
+
+    def policy_changes(self, snapshot):
+        # numero di stati in cui l'azione greedy è cambiata rispetto a policy_snapshot()
+        policy = self.get_greedy_policy()
+        if self.q_table_storage == 'sparse':
+            return self.Q_table.policy_changes(policy, *snapshot)
+        return int(np.count_nonzero(policy != snapshot))
+
+    def get_greedy_policy(self):
+        # azione migliore per ogni stato (-1 se i q-values sono tutti nulli), per la q-table sparsa per ogni riga
+        # memorizzata; viene ricalcolata solo se la q-table è stata aggiornata o sostituita
+        if self.greedy_policy is None or self.greedy_policy_source is not self.Q_table:
+            q_table = self.__flat_q_table()
+            if self.q_table_storage == 'sparse':
+                self.greedy_policy = q_table.greedy_policy()
+            else:
+                self.greedy_policy = np.where(q_table.sum(axis=1) == 0, -1, np.argmax(q_table, axis=1))
+            self.greedy_policy_source = self.Q_table
+        return self.greedy_policy
+
+    def __flat_q_table(self):
+        # vista bidimensionale (stato, azione) della q-table, aggiornata se la q-table viene sostituita; la q-table
+        # sparsa è già indicizzata per stato
+        if self.flat_q_table_source is not self.Q_table:
+            if self.q_table_storage == 'sparse':
+                self.flat_q_table = self.Q_table
+            else:
+                if not self.Q_table.flags.c_contiguous:
+                    self.Q_table = np.ascontiguousarray(self.Q_table)
+                self.flat_q_table = self.Q_table.reshape(-1, self.num_actions)
+            self.flat_q_table_source = self.Q_table
+        return self.flat_q_table
 
     def step(self, drone_index, action):
+        profiler = self.profiler
+        if profiler is None:
+            reward, done = self.__step(drone_index, action)
+        else:
+            profiler.start()
+            reward, done = self.__step(drone_index, action)
+            profiler.stop()
+        return self.drone_states[drone_index].as_tuple(), reward, done
+
+    def step_all(self, actions):
+        # esegue un tick di tutta la flotta: actions contiene un'azione per drone (None per i droni da non
+        # muovere, ad esempio quelli che hanno terminato) e ritorna stati, ricompense e completamenti dei droni
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        # il maltempo avanza una sola volta per tick, indipendentemente dal numero di droni
+        self.weather.update(self.weather_frequency, self.weather_lifetime)
+        if profiler is not None:
+            profiler.lap('weather_update')
+
+        # tutti i droni scelgono la prossima cella sulla stessa griglia di occupazione, con le posizioni di inizio
+        # tick: nessun drone può entrare in una cella occupata da un altro, quindi le mosse sono simultanee
+        num_drones = len(self.drone_states)
+        rewards = [0] * num_drones
+        dones = [False] * num_drones
+        moves = [None] * num_drones
+        for drone_index, action in enumerate(actions):
+            if action is not None:
+                rewards[drone_index], dones[drone_index], moves[drone_index] = self.__plan_move(drone_index, action)
+
+        # due droni possono però scegliere la stessa cella libera: la ottiene quello con l'indice più basso,
+        # gli altri restano fermi
+        claimed = set()
+        for drone_index, move in enumerate(moves):
+            if move is None:
+                continue
+            new_position = move[0]
+            if new_position != self.elements_coordinates['drones'][drone_index]:
+                if new_position in claimed:
+                    state = self.drone_states[drone_index]
+                    moves[drone_index] = ((state.y, state.x), move[1])
+                    if state.path_index > 0 and state.path[state.path_index - 1] == new_position:
+                        state.path_index -= 1  # la cella del percorso viene ritentata al prossimo tick
+                    if profiler is not None:
+                        profiler.count('move_conflicts')
+                else:
+                    claimed.add(new_position)
+        if profiler is not None:
+            profiler.lap('conflict_resolution')
+
+        # sposta tutti i droni prima di ricariche, consegne e ritiri: i nuovi punti di consegna vengono estratti
+        # tra le celle libere dopo il tick e gli ostacoli rilevati sono quelli delle posizioni finali
+        for drone_index, move in enumerate(moves):
+            if move is not None:
+                self.__move_drone(drone_index, move[0])
+        if profiler is not None:
+            profiler.lap('drone_moves')
+        for drone_index, move in enumerate(moves):
+            if move is not None:
+                moves[drone_index] = self.__arrive(drone_index, move[0], move[1])
+        for drone_index, move in enumerate(moves):
+            if move is not None:
+                self.__update_drone(drone_index, *move)
+
+        if profiler is not None:
+            profiler.stop()
+        return [state.as_tuple() for state in self.drone_states], rewards, dones
+
+    def __step(self, drone_index, action):
+        # aggiorna sul posto lo stato del drone e ritorna ricompensa e completamento
+        profiler = self.profiler
+
+        self.weather.update(self.weather_frequency, self.weather_lifetime)
+        if profiler is not None:
+            profiler.lap('weather_update')
+
+        reward, done, move = self.__plan_move(drone_index, action)
+        if move is not None:
+            self.__update_drone(drone_index, *self.__arrive(drone_index, *move))
+        return reward, done
+
+    def __plan_move(self, drone_index, action):
+        # sceglie la prossima cella del drone: ritorna ricompensa, completamento e la mossa (nuova posizione e
+        # livello di batteria), None se il drone sta caricando o ha terminato
         state = self.drone_states[drone_index]
-        (y, x, battery_level, obstacle_up, obstacle_down, obstacle_left, obstacle_right, has_package,
-         charging_timer, relative_tgt, circumnavigate, circumnavigation_path) = state
-
-        self.__update_weather_zones()
+        y, x, battery_level, has_package, charging_timer = (state.y, state.x, state.battery_level, state.has_package,
+                                                            state.charging_timer)
+        obstacle_up, obstacle_down, obstacle_left, obstacle_right = (state.obstacle_up, state.obstacle_down,
+                                                                     state.obstacle_left, state.obstacle_right)
+        relative_tgt, circumnavigate = state.relative_target, state.circumnavigate
+        profiler = self.profiler
 
         reward = 0
-        done = False
 
         new_y = y
         new_x = x
 
         # se il drone sta caricando, decrementa il timer e salta le operazioni
         if charging_timer > 0:
-            charging_timer -= 1
-
             # aggiorna lo stato del drone con il timer decrementato
-            self.drone_states[drone_index] = (
-                y, x, battery_level, obstacle_up, obstacle_down, obstacle_left, obstacle_right,
-                has_package, charging_timer, relative_tgt, circumnavigate, circumnavigation_path)
-
-            # ritorna lo stato aggiornato del drone
-            return self.drone_states[drone_index], 0, False  # nessuna ricompensa durante la ricarica
+            state.charging_timer = charging_timer - 1
+            return 0, False, None  # nessuna ricompensa durante la ricarica
 
         # il drone non ha più compiti da svolgere
         elif self.num_objects == 0 and not has_package and (y, x) == self.CHARGING_STATIONS[drone_index]:
-            return self.drone_states[drone_index], 0, True
+            return 0, True, None
 
         try:
             action_type = ActionType(action)
@@ -159,14 +429,14 @@ class DroneDeliveryEnvironment:
 
                 if new_battery_level < self.LOW_BATTERY_THRESHOLD:
                     # azzera il percorso di circumnavigazione se la batteria è bassa
-                    circumnavigation_path = []
+                    state.clear_path()
 
-                if not circumnavigation_path:
+                if not state.has_path():
                     target = self.__determine_target(new_battery_level, has_package, drone_index)
-                    circumnavigation_path = self.__calculate_weather_circumnavigation_path((y, x), target, drone_index)
+                    state.set_path(self.__calculate_weather_circumnavigation_path((y, x), target, drone_index))
 
-                if circumnavigation_path:
-                    new_y, new_x = circumnavigation_path.pop(0)  # pop della prossima cella del percorso
+                if state.has_path():
+                    new_y, new_x = state.next_cell()  # prossima cella del percorso
                 else:
                     # se la lista è vuota o non c'è necessità di circumnavigare, mantiene la posizione corrente
                     new_y, new_x = y, x
@@ -179,7 +449,7 @@ class DroneDeliveryEnvironment:
                 reward -= 30  # penalità perché ha scelto circumnavigazione quando non è necessario
 
         if action_type != ActionType.CIRCUMNAVIGATE:
-            circumnavigation_path = []
+            state.clear_path()
 
         if action_type == ActionType.UP:
             if y > 0:  # muove su se non è già al bordo
@@ -193,7 +463,7 @@ class DroneDeliveryEnvironment:
                 reward -= 5  # penalità per tentare di uscire dal bordo
 
         elif action_type == ActionType.DOWN:
-            if y < self.grid_size[1] - 1:  # muove giù se non è al bordo inferiore
+            if y < self.grid_size[0] - 1:  # muove giù se non è al bordo inferiore
                 new_y += 1
 
             if obstacle_down:
@@ -215,7 +485,7 @@ class DroneDeliveryEnvironment:
                 reward -= 5
 
         elif action_type == ActionType.RIGHT:
-            if x < self.grid_size[0] - 1:  # muove a destra se non è al bordo destro
+            if x < self.grid_size[1] - 1:  # muove a destra se non è al bordo destro
                 new_x += 1
 
             if obstacle_right:
@@ -225,11 +495,16 @@ class DroneDeliveryEnvironment:
             else:
                 reward -= 5
 
+        if profiler is not None:
+            profiler.lap('action_handling')
+
         # evita di collidere: impedisce di aggiornare la posizione in una cella occupata
         new_y, new_x = self.__check_collision(drone_index, new_y, new_x, y, x)
+        if profiler is not None:
+            profiler.lap('collision_check')
 
         # il percorso viene ricalcolato in caso di collisione o se è presente un ostacolo sul percorso
-        if circumnavigate and (new_y, new_x) == (y, x) or (new_y, new_x) in self.__get_obstacles(drone_index):
+        if circumnavigate and (new_y, new_x) == (y, x) or self.__is_obstacle((new_y, new_x), drone_index):
             # ricalcola il percorso se la cella è diventata occupata
             start_position = (y, x)
             target = self.__determine_target(new_battery_level, has_package, drone_index)
@@ -237,17 +512,50 @@ class DroneDeliveryEnvironment:
 
             if path:
                 # aggiorna la lista delle celle da percorrere
-                circumnavigation_path = path
+                state.set_path(path)
                 # prende la nuova cella dal percorso e aggiorna la posizione
-                new_y, new_x = circumnavigation_path.pop(0) if circumnavigation_path else (y, x)
+                new_y, new_x = state.next_cell()
+
+            if profiler is not None:
+                profiler.count('path_recomputations')
+        if profiler is not None:
+            profiler.lap('path_recomputation')
+
+        return reward, False, ((new_y, new_x), new_battery_level)
+
+    def __move_drone(self, drone_index, position):
+        # aggiorna la posizione del drone nella lista delle coordinate e, se si è spostato, nella griglia di occupazione
+        if self.elements_coordinates['drones'][drone_index] != position:
+            self.drones_hash -= self.__update_occupancy(self.elements_coordinates['drones'][drone_index], -1)
+            self.drones_hash += self.__update_occupancy(position, 1)
+        self.elements_coordinates['drones'][drone_index] = position
+
+    def __arrive(self, drone_index, position, new_battery_level):
+        # ricarica, consegna e ritiro nella nuova cella; ritorna gli argomenti di __update_drone()
+        new_y, new_x = position
+        has_package = self.drone_states[drone_index].has_package
+        profiler = self.profiler
 
         # gestione della ricarica della batteria
         new_battery_level, charging_timer = self.__recharge_battery(new_y, new_x, new_battery_level, drone_index)
+        if profiler is not None:
+            profiler.lap('recharge')
 
         # gestione della consegna del pacco
         has_package = self.__deliver_package(new_y, new_x, has_package, drone_index)
         # gestione del ritiro del pacco
         has_package = self.__pick_up_package(new_y, new_x, has_package, drone_index)
+        if profiler is not None:
+            profiler.lap('deliver_pick_up')
+
+        return position, new_battery_level, has_package, charging_timer
+
+    def __update_drone(self, drone_index, position, new_battery_level, has_package, charging_timer):
+        # rileva ostacoli e target dalla nuova cella e aggiorna lo stato del drone
+        state = self.drone_states[drone_index]
+        y, x = state.y, state.x
+        new_y, new_x = position
+        profiler = self.profiler
 
         target = self.__determine_target(new_battery_level, has_package, drone_index)
 
@@ -257,60 +565,27 @@ class DroneDeliveryEnvironment:
         # rilevamento degli ostacoli
         obstacle_up, obstacle_down, obstacle_left, obstacle_right = self.__detect_obstacles(
             (new_y, new_x, new_battery_level, has_package), drone_index)
+        if profiler is not None:
+            profiler.lap('obstacle_detection')
 
-        circumnavigate = True if circumnavigation_path else self.__needs_circumnavigation((y, x), target, relative_target_position,
+        circumnavigate = True if state.has_path() else self.__needs_circumnavigation((y, x), target, relative_target_position,
                                                                                           obstacle_up, obstacle_down, obstacle_left, obstacle_right)
+        if profiler is not None:
+            profiler.lap('circumnavigation_decision')
 
-        # aggiorna la posizione del drone nella lista delle coordinate
-        self.elements_coordinates['drones'][drone_index] = (new_y, new_x)
+        self.__move_drone(drone_index, position)
 
         new_battery_level = self.__decrement_battery_due_to_weather(new_y, new_x, new_battery_level)
 
-        new_state = (new_y, new_x, new_battery_level, obstacle_up, obstacle_down,
-                     obstacle_left, obstacle_right, has_package, charging_timer, relative_target_position, circumnavigate, circumnavigation_path)
-
-        self.drone_states[drone_index] = new_state
-
-        return new_state, reward, done
-
-    def __calculate_circumnavigation_path(self, start_position, target_position, drone_index):
-        # ricava la lista degli ostacoli
-        obstacles = self.__get_obstacles(drone_index)
-
-        # crea una coda a doppia estremità e la inizializza con la posizione di partenza e un percorso vuoto
-        # ogni elemento della coda è una tupla che contiene la posizione corrente e il percorso esplorato
-        queue = deque([(start_position, [])])
-
-        # set per tracciare le posizioni visitate
-        visited = set()
-        visited.add(start_position)
-
-        # direzioni possibili
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-        # finché la coda non è vuota continua a esplorare il percorso
-        while queue:
-            # estrae il primo elemento della coda, posizione corrente e percorso associato
-            (current_position, path) = queue.popleft()
-            y, x = current_position
-
-            # se ha raggiunto il target restituisce il percorso
-            if current_position == target_position:
-                return path
-
-            # esplora tutte le celle adiacenti
-            for dy, dx in directions:
-                new_y, new_x = y + dy, x + dx
-                new_position = (new_y, new_x)
-
-                # verifica se la nuova posizione è valida e non è un ostacolo
-                if (0 <= new_y < self.grid_size[0] and 0 <= new_x < self.grid_size[1]  # Check dentro i limiti
-                        and new_position not in obstacles and new_position not in visited):
-                    visited.add(new_position)
-                    queue.append((new_position, path + [new_position]))
-
-        # ritorna una lista vuota se non c'è un percorso disponibile
-        return []
+        # aggiorna lo stato solo alla fine: durante lo step ostacoli e percorsi usano batteria e pacco precedenti
+        state.y, state.x, state.battery_level = new_y, new_x, new_battery_level
+        state.obstacle_up, state.obstacle_down = obstacle_up, obstacle_down
+        state.obstacle_left, state.obstacle_right = obstacle_left, obstacle_right
+        state.has_package, state.charging_timer = has_package, charging_timer
+        state.relative_target, state.circumnavigate = relative_target_position, circumnavigate
+        state.target_distance = abs(new_y - target[0]) + abs(new_x - target[1])
+        if profiler is not None:
+            profiler.lap('state_update')
 
     def __needs_circumnavigation(self, current_pos, target, relative_target, obstacle_up, obstacle_down, obstacle_left, obstacle_right):
         # c'è un ostacolo tra il drone e il target, quindi circumnaviga
@@ -331,7 +606,7 @@ class DroneDeliveryEnvironment:
                 return True
 
         # verifica se ci sono zone con maltempo da circumnavigare
-        return self.__detect_weather_zones(current_pos, target, relative_target)
+        return self.weather.crosses(current_pos, target, relative_target)
 
     def __get_relative_target_position(self, drone_position, target_position):
         # coordinate del drone e del target
@@ -378,36 +653,193 @@ class DroneDeliveryEnvironment:
 
         return new_battery_level, 0
 
-    def __get_obstacles(self, drone_index):
-        obstacles = set()
-
-        # aggiunge i delivery points degli altri droni come ostacoli
-        for i, dp in enumerate(self.elements_coordinates['delivery_points']):
-            if i != drone_index:
-                obstacles.add(dp)
-
-        # aggiunge le charging stations degli altri droni come ostacoli
-        for i, cs in enumerate(self.elements_coordinates['charging_stations']):
-            if i != drone_index:
-                obstacles.add(cs)
-
-        # aggiunge la propria charging station solo se il livello della batteria è maggiore della soglia
-        current_drone_state = self.drone_states[drone_index]
-        y, x, battery_level, _, _, _, _, has_package, _, _, _, _ = current_drone_state
+    def __rebuild_occupancy(self):
+        self.occupancy.fill(0)
+        self.occupancy_hash = 0
+        self.drones_hash = 0
+        self.free_cells = []
+        for y in range(self.grid_size[0]):
+            for x in range(self.grid_size[1]):
+                self.free_cell_index[y][x] = -1
+                if (y, x) != self.WAREHOUSE:
+                    self.__add_free_cell(y, x)
+        for charging_station in self.elements_coordinates['charging_stations']:
+            self.__update_occupancy(charging_station, 1)
+        for delivery_point in self.elements_coordinates['delivery_points']:
+            self.__update_occupancy(delivery_point, 1)
+        for drone_coords in self.elements_coordinates['drones']:
+            self.drones_hash += self.__update_occupancy(drone_coords, 1)
+
+    def __update_occupancy(self, position, delta):
+        # ritorna la chiave della cella nell'impronta, 0 per gli elementi oltre il bordo: questi non possono mai
+        # essere adiacenti a una cella della griglia
+        if position is not None:
+            y, x = position[0] + 1, position[1] + 1
+            if 0 <= y < self.occupancy.shape[0] and 0 <= x < self.occupancy.shape[1]:
+                count = self.occupancy.item(y, x) + delta
+                self.occupancy[y, x] = count
+                self.occupancy_hash += delta * self.occupancy_keys[y][x]
+
+                # la cella diventa occupata o torna libera (il bordo e il magazzino non sono mai liberi)
+                if (count == 0 or count == delta) and 1 <= y <= self.grid_size[0] and 1 <= x <= self.grid_size[1] \
+                        and (y - 1, x - 1) != self.WAREHOUSE:
+                    if count == 0:
+                        self.__add_free_cell(y - 1, x - 1)
+                    else:
+                        self.__remove_free_cell(y - 1, x - 1)
+                return self.occupancy_keys[y][x]
+        return 0
+
+    def __add_free_cell(self, y, x):
+        self.free_cell_index[y][x] = len(self.free_cells)
+        self.free_cells.append((y, x))
+
+    def __remove_free_cell(self, y, x):
+        # sostituisce la cella con l'ultima della lista, così la rimozione non sposta le altre
+        index = self.free_cell_index[y][x]
+        last = self.free_cells.pop()
+        if last != (y, x):
+            self.free_cells[index] = last
+            self.free_cell_index[last[0]][last[1]] = index
+        self.free_cell_index[y][x] = -1
+
+    def sample_free_cell(self):
+        # cella libera scelta uniformemente con una sola estrazione, oppure None se la griglia è piena
+        if not self.free_cells:
+            return None
+        return self.free_cells[np.random.randint(len(self.free_cells))]
+
+    def __get_obstacles_fingerprint(self, drone_index):
+        # impronta degli ostacoli fissi del drone: l'impronta della griglia senza i droni e senza i suoi elementi,
+        # più lo stato che decide se la sua stazione e il magazzino sono ostacoli. Le posizioni degli altri droni
+        # cambiano ad ogni step: vengono confrontate solo vicino al percorso, in __get_cached_path
+        fingerprint = self.occupancy_hash - self.drones_hash
+        own_cells = (self.elements_coordinates['delivery_points'][drone_index],
+                     self.elements_coordinates['charging_stations'][drone_index])
+        for cell in own_cells:
+            if cell is not None:
+                y, x = cell[0] + 1, cell[1] + 1
+                if 0 <= y < self.occupancy.shape[0] and 0 <= x < self.occupancy.shape[1]:
+                    fingerprint -= self.occupancy_keys[y][x]
 
-        if battery_level > self.LOW_BATTERY_THRESHOLD and self.num_objects > 0:
-            own_charging_station = self.elements_coordinates['charging_stations'][drone_index]
-            obstacles.add(own_charging_station)
+        state = self.drone_states[drone_index]
+        own_charging_station = state.battery_level > self.LOW_BATTERY_THRESHOLD and self.num_objects > 0
+
+        return drone_index, fingerprint, own_charging_station, bool(state.has_package)
+
+    def __get_drones_fingerprint(self, drone_index, bounds):
+        # impronta degli altri droni all'interno del rettangolo (y minima, x minima, y massima, x massima)
+        min_y, min_x, max_y, max_x = bounds
+        fingerprint = 0
+        for index, position in enumerate(self.elements_coordinates['drones']):
+            if index != drone_index and position is not None and min_y <= position[0] <= max_y \
+                    and min_x <= position[1] <= max_x:
+                fingerprint += self.occupancy_keys[position[0] + 1][position[1] + 1]
+        return fingerprint
+
+    def __get_cached_path(self, key, drone_index):
+        # il percorso salvato resta valido se nel suo rettangolo (allargato di una cella) i droni sono gli stessi:
+        # un drone lontano che si sposta non lo può bloccare. Con molti droni la chiave non dipende così dalle
+        # posizioni di tutta la flotta, che cambiano ad ogni step
+        entry = self.path_cache.get(key)
+        if entry is None or entry[2] != self.__get_drones_fingerprint(drone_index, entry[1]):
+            self.path_cache_misses += 1
+            return None
+
+        self.path_cache_hits += 1
+        self.path_cache.move_to_end(key)
+        # il percorso è una tupla condivisa: lo stato del drone lo scorre con un cursore senza modificarlo
+        return entry[0]
+
+    def __store_cached_path(self, key, path, drone_index):
+        if self.path_cache_size <= 0:
+            return
+        if path:
+            cells = path + key[:2]
+            bounds = (min(cell[0] for cell in cells) - 1, min(cell[1] for cell in cells) - 1,
+                      max(cell[0] for cell in cells) + 1, max(cell[1] for cell in cells) + 1)
+        else:
+            # nessun percorso: può aprirsene uno spostando un drone in qualsiasi punto della griglia
+            bounds = (-1, -1, self.grid_size[0], self.grid_size[1])
+        self.path_cache[key] = (path, bounds, self.__get_drones_fingerprint(drone_index, bounds))
+        # elimina il percorso usato meno di recente se la cache è piena
+        if len(self.path_cache) > self.path_cache_size:
+            self.path_cache.popitem(last=False)
+
+    def path_cache_info(self):
+        return {'hits': self.path_cache_hits, 'misses': self.path_cache_misses,
+                'size': len(self.path_cache), 'max_size': self.path_cache_size}
+
+    def clear_path_cache(self):
+        self.path_cache.clear()
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+
+    def enable_profiling(self, profiler=None):
+        # da qui in poi step() misura il tempo di ogni fase; ritorna il profiler usato
+        self.profiler = profiler if profiler is not None else DroneDeliveryProfiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        profiler = self.profiler
+        self.profiler = None
+        return profiler
+
+    def profile_info(self):
+        # tempi per fase e contatori raccolti finora, None se la profilazione non è attiva
+        if self.profiler is None:
+            return None
+        info = self.profiler.snapshot()
+        info['counters'].update({'path_cache_hits': self.path_cache_hits, 'path_cache_misses': self.path_cache_misses})
+        return info
+
+    def clear_profile(self):
+        if self.profiler is not None:
+            self.profiler.reset()
+
+    def __is_obstacle(self, position, drone_index):
+        # equivale a verificare se position è tra gli ostacoli del drone, senza costruirne l'insieme
+        y, x = position
+        if not (-1 <= y <= self.grid_size[0] and -1 <= x <= self.grid_size[1]):
+            return False
+
+        # elementi nella cella, esclusi delivery point, charging station e posizione del drone stesso
+        count = self.occupancy.item(y + 1, x + 1)
+        own_charging_station = self.elements_coordinates['charging_stations'][drone_index]
+        if count:
+            if position == self.elements_coordinates['delivery_points'][drone_index]:
+                count -= 1
+            if position == own_charging_station:
+                count -= 1
+            if position == self.elements_coordinates['drones'][drone_index]:
+                count -= 1
+            if count > 0:
+                return True
 
-        # aggiunge le coordinate degli altri droni come ostacoli
-        for i, drone_coords in enumerate(self.elements_coordinates['drones']):
-            if i != drone_index:
-                obstacles.add(drone_coords)
+        # la propria charging station è un ostacolo solo se il livello della batteria è maggiore della soglia
+        if (position == own_charging_station
+                and self.drone_states[drone_index].battery_level > self.LOW_BATTERY_THRESHOLD and self.num_objects > 0):
+            return True
 
-        if has_package:
-            obstacles.add(self.WAREHOUSE)
+        # il magazzino è un ostacolo quando il drone ha già un pacco
+        return position == self.WAREHOUSE and self.drone_states[drone_index].has_package
 
-        return obstacles
+    def __get_obstacles(self, drone_index):
+        # vista degli ostacoli del drone sulla griglia: parte dalle celle occupate e corregge solo
+        # quelle che dipendono dal drone (i suoi elementi, la sua stazione e il magazzino)
+        obstacles = self.occupancy[1:-1, 1:-1] > 0
+        if self.profiler is not None:
+            self.profiler.count('obstacle_builds')
+
+        own_cells = (self.elements_coordinates['delivery_points'][drone_index],
+                     self.elements_coordinates['charging_stations'][drone_index],
+                     self.elements_coordinates['drones'][drone_index],
+                     self.WAREHOUSE)
+        for cell in own_cells:
+            if cell is not None and 0 <= cell[0] < self.grid_size[0] and 0 <= cell[1] < self.grid_size[1]:
+                obstacles[cell] = self.__is_obstacle(cell, drone_index)
+
+        return obstacles.tolist()
 
     def __deliver_package(self, y, x, has_package, drone_index):
         # verifica se il drone ha un pacco e si trova al suo punto di consegna
@@ -416,37 +848,41 @@ class DroneDeliveryEnvironment:
             self.target_delivery_points[drone_index] = None  # reset del punto di consegna per il drone
             has_package = False
 
-            # rimuove il punto di consegna dalla lista delle coordinate
+            # rimuove il punto di consegna dalla lista delle coordinate e dalla griglia di occupazione
+            self.__update_occupancy(self.elements_coordinates['delivery_points'][drone_index], -1)
             self.elements_coordinates['delivery_points'][drone_index] = None
         return has_package
 
     def __pick_up_package(self, y, x, has_package, drone_index):
         # verifica se il drone non ha un pacco e si trova nel magazzino
         if not has_package and (y, x) == self.WAREHOUSE and self.num_objects > 0:
+            # genera un nuovo punto di consegna casuale per il drone in una cella libera: la griglia di occupazione
+            # conta stazioni di ricarica, delivery point e droni, quindi l'estrazione non dipende dal numero di droni
+            new_delivery_point = self.sample_free_cell()
+
+            # senza celle libere il pacco resta nel magazzino e il ritiro viene ritentato agli step successivi
+            if new_delivery_point is None:
+                self.no_free_cell_pick_ups += 1
+                if self.profiler is not None:
+                    self.profiler.count('no_free_cell_pick_ups')
+                return has_package
+
             has_package = True
             self.num_objects -= 1
 
-            # genera un nuovo punto di consegna casuale per il drone
-            while True:
-                new_delivery_point = (
-                    np.random.randint(0, self.grid_size[0]), np.random.randint(0, self.grid_size[1])
-                )
-                # verifica che il nuovo dp venga generato in una posizione che non è già occupata
-                if new_delivery_point != self.WAREHOUSE and new_delivery_point not in self.CHARGING_STATIONS and new_delivery_point not in self.target_delivery_points and new_delivery_point not in self.elements_coordinates['drones']:
-                    break
-
             self.target_delivery_points[drone_index] = new_delivery_point  # assegna il dp al drone specifico
+            self.__update_occupancy(self.elements_coordinates['delivery_points'][drone_index], -1)
             self.elements_coordinates['delivery_points'][drone_index] = new_delivery_point
+            self.__update_occupancy(new_delivery_point, 1)
         return has_package
 
     def __detect_obstacles(self, state, drone_index):
         y, x, battery_level, has_package = state
-        obstacles = self.__get_obstacles(drone_index)
 
-        obstacle_up = 1 if (y - 1, x) in obstacles else 0
-        obstacle_down = 1 if (y + 1, x) in obstacles else 0
-        obstacle_left = 1 if (y, x - 1) in obstacles else 0
-        obstacle_right = 1 if (y, x + 1) in obstacles else 0
+        obstacle_up = 1 if self.__is_obstacle((y - 1, x), drone_index) else 0
+        obstacle_down = 1 if self.__is_obstacle((y + 1, x), drone_index) else 0
+        obstacle_left = 1 if self.__is_obstacle((y, x - 1), drone_index) else 0
+        obstacle_right = 1 if self.__is_obstacle((y, x + 1), drone_index) else 0
 
         return obstacle_up, obstacle_down, obstacle_left, obstacle_right
 
@@ -464,155 +900,32 @@ class DroneDeliveryEnvironment:
 
     def __check_collision(self, drone_index, new_y, new_x, y, x):
         # controlla se il drone collide con un ostacolo
-        if (new_y, new_x) in self.__get_obstacles(drone_index):
+        if self.__is_obstacle((new_y, new_x), drone_index):
             # print(f"Drone {drone_index} colliso con un ostacolo alle coordinate ({new_y}, {new_x})")
             return y, x  # ritorna le vecchie coordinate se c'è una collisione con un ostacolo
 
         # se non ci sono collisioni, ritorna le nuove coordinate
         return new_y, new_x
 
-    def __generate_weather_zone(self):
-        # genera una posizione casuale all'interno della griglia
-        y = random.randint(0, self.grid_size[0] - 1)
-        x = random.randint(0, self.grid_size[1] - 1)
-
-        # genera dimensioni casuali per la zona
-        width = random.randint(1, 3)  # larghezza casuale (da 1 a 3 celle)
-        height = random.randint(1, 3)  # altezza casuale (da 1 a 3 celle)
-
-        # aggiunge la nuova zona di maltempo alla lista con un timer di durata
-        self.weather_zones.append({'position': (y, x), 'size': (width, height), 'lifetime': self.weather_lifetime})
-
-    def __update_weather_zones(self):
-        # decide casualmente se creare una nuova zona di maltempo
-        if random.randint(0, self.weather_frequency) == 0:
-            self.__generate_weather_zone()
-
-        # aggiorna la durata delle zone esistenti e rimuove quelle scadute
-        self.weather_zones = [zone for zone in self.weather_zones if zone['lifetime'] > 0]
-        for zone in self.weather_zones:
-            zone['lifetime'] -= 1
-
-    def __detect_weather_zones(self, position, target_position, relative_direction):
-        y, x = position
-        tgt_y, tgt_x = target_position
-        weather_cells_count = 0
-
-        for weather_zone in self.weather_zones:
-            (zone_y, zone_x), (width, height), _ = weather_zone.values()
-
-            # il drone si sta muovendo verso l'alto
-            if relative_direction == ActionType.UP.value:
-                # rileva una zona di maltempo sopra di lui
-                if zone_y <= y and (zone_x <= x <= zone_x + width):
-                    weather_cells_count += 1
-            # movimento verso il basso
-            elif relative_direction == ActionType.DOWN.value:
-                # rileva una zona di maltempo sotto di lui
-                if zone_y + height >= y and (zone_x <= x <= zone_x + width):
-                    weather_cells_count += 1
-            # movimento a sx
-            elif relative_direction == ActionType.LEFT.value:
-                # rileva zona di maltempo a sx
-                if zone_x <= x and (zone_y <= y <= zone_y + height):
-                    weather_cells_count += 1
-            # movimento a dx
-            elif relative_direction == ActionType.RIGHT.value:
-                # rileva maltempo a dx
-                if zone_x + width >= x and (zone_y <= y <= zone_y + height):
-                    weather_cells_count += 1
-
-            # stima se deve attraversare più di una cella all'interno della zona di maltempo
-            if weather_cells_count > 0:
-                # itera lungo la direzione del movimento per vedere se deve attraversare più celle con maltempo
-                # il movimento è 1 se sta muovendo in alto o verso dx, -1 se muove verso il basso o sx
-                step = 1 if relative_direction in [ActionType.UP.value, ActionType.RIGHT.value] else -1
-
-                # scorre le celle lungo la direzione del drone
-                for i in range(1, abs(tgt_y - y) + 1) if relative_direction in [ActionType.UP.value,
-                                                                                ActionType.DOWN.value] else range(1,
-                                                                                                                  abs(tgt_x - x) + 1):
-
-                    # calcola la prossima cella lungo la traiettoria:
-                    # se il drone si muove in verticale aggiorna la y
-                    # se il drone si muove in orizzontale aggiorna la x
-                    next_y = y + i * step if relative_direction in [ActionType.UP.value, ActionType.DOWN.value] else y
-                    next_x = x + i * step if relative_direction in [ActionType.LEFT.value, ActionType.RIGHT.value] else x
-
-                    # verifica se la prossima cella da attraversare si trova all'interno di una zona di maltempo
-                    if (zone_x <= next_x <= zone_x + width) and (zone_y <= next_y <= zone_y + height):
-                        weather_cells_count += 1
-                        if weather_cells_count >= 2:
-                            return True # ritorna True solo se attraversa almeno due celle consecutive di maltempo
-                    else:
-                        break # se non è più in una zona di maltempo interrompe il controllo
+    def __calculate_weather_circumnavigation_path(self, start_position, target_position, drone_index):
+        # il percorso è riutilizzabile finché ostacoli fissi, droni vicini e zone di maltempo restano gli stessi
+        key = (start_position, target_position, self.__get_obstacles_fingerprint(drone_index),
+               self.weather.fingerprint())
+        path = self.__get_cached_path(key, drone_index)
+        if path is not None:
+            return path
 
-        return False # se attraverso meno di due celle di maltempo consecutive ritorna False
+        # un'unica ricerca sugli ostacoli fisici in cui le celle di maltempo sono attraversabili ma costose:
+        # se esiste un percorso sicuro lo preferisce, altrimenti attraversa il minor numero di celle di maltempo
+        path = tuple(DroneDeliveryPlanner.find_path(self.__get_obstacles(drone_index), start_position, target_position,
+                                                    self.weather.cells(), profiler=self.profiler))
+        self.__store_cached_path(key, path, drone_index)
 
-    def __calculate_weather_circumnavigation_path(self, start_position, target_position, drone_index):
-        # recupera gli ostacoli fisici
-        obstacles = set(self.__get_obstacles(drone_index))
-
-        # recupera le zone di maltempo attive
-        weather_zones = set()
-        for weather_zone in self.weather_zones:
-            (zone_y, zone_x), (width, height), _ = weather_zone.values()
-            # aggiunge tutte le celle che compongono le zone di maltempo
-            for y in range(zone_y, zone_y + height):
-                for x in range(zone_x, zone_x + width):
-                    weather_zones.add((y, x))
-
-        # unisce ostacoli fisici e zone di maltempo
-        combined_obstacles = obstacles.union(weather_zones)
-
-        # crea una coda a doppia estremità e la inizializza con la posizione di partenza e un percorso vuoto
-        # ogni elemento della coda è una tupla che contiene la posizione corrente e il percorso esplorato
-        queue = deque([(start_position, [])])
-
-        # set per memorizzare le celle già visitate
-        visited = set()
-        visited.add(start_position)
-
-        # direzioni possibili
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-
-        # finché la coda non è vuota continua a esplorare il percorso
-        while queue:
-            # estrae il primo elemento della coda, posizione corrente e percorso associato
-            (current_position, path) = queue.popleft()
-            y, x = current_position
-
-            # se ha raggiunto il target restituisce il percorso
-            if current_position == target_position:
-                return path
-
-            # per ogni direzione possibile calcola la nuova posizione
-            for dy, dx in directions:
-                new_y, new_x = y + dy, x + dx
-                new_position = (new_y, new_x)
-
-                # verifica che la nuova posizione sia valida e non ricada tra gli ostacoli
-                if (0 <= new_y < self.grid_size[0] and 0 <= new_x < self.grid_size[1] and
-                        new_position not in combined_obstacles and new_position not in visited):
-                    visited.add(new_position)
-                    queue.append((new_position, path + [new_position]))
-
-        # se non c'è un percorso sicuro, attraversa comunque la zona di maltempo
-        return self.__calculate_circumnavigation_path(start_position, target_position, drone_index)
+        return path
 
     # decrementa la batteria del drone se la sua posizione è in una zona con maltempo attivo
     def __decrement_battery_due_to_weather(self, y, x, battery_level):
-        # controlla se la posizione del drone è in una zona di maltempo
-        for zone in self.weather_zones:
-            zone_x, zone_y = zone['position']
-            width, height = zone['size']
-
-            # verifica se la posizione del drone è all'interno della zona di maltempo
-            if zone_x <= x < zone_x + width and zone_y <= y < zone_y + height:
-                battery_level = max(0, battery_level - 1)
-                break # esce dal ciclo se la batteria è stata decrementata
+        if self.weather.drains_battery(y, x):
+            battery_level = max(0, battery_level - 1)
 
         return battery_level
-
-
-
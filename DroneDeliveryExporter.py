@@ -0,0 +1,143 @@
+import os
+import zlib
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from DroneDeliveryRenderer import DroneDeliveryRenderer
+
+
+class DroneDeliveryExporter:
+    # spazio riservato all'intestazione dei file .npy, riscritta alla chiusura con il numero finale di frame
+    NPY_HEADER_SIZE = 128
+    # posizione del chunk acTL (firma di 8 byte e chunk IHDR di 25 byte) nei png animati
+    PNG_ACTL_OFFSET = 33
+
+    def __init__(self, env, path, stride=1, fps=10, figsize=(6.4, 4.8), dpi=100):
+        self.env = env
+        self.path = path
+        self.stride = stride  # esporta un frame ogni stride chiamate a capture()
+        self.fps = fps
+        self.calls = 0
+        self.frames = 0
+
+        # figura fuori schermo: il canvas Agg disegna in memoria senza Tk né display
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        env.ax = self.figure.add_subplot()
+        env.canvas = self.canvas
+        env.root = None
+        env.im = None
+
+        # il formato dipende dall'estensione: .npy (frame grezzi), .gif o .png (animati), altrimenti una
+        # cartella con un'immagine png per ogni frame
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.npy':
+            self.format = 'npy'
+            self.file = open(path, 'wb')
+            self.file.write(b'\x00' * self.NPY_HEADER_SIZE)
+            self.frame_shape = None
+        elif extension in ('.gif', '.png'):
+            # i frame animati vengono scritti nel file man mano che sono catturati, senza tenerli in memoria
+            # fino alla chiusura (il salvataggio multi-frame di Pillow li accumula tutti)
+            self.format = extension[1:]
+            self.file = open(path, 'wb')
+        else:
+            self.format = 'sequence'
+            os.makedirs(path, exist_ok=True)
+
+    def capture(self):
+        # ritorna True se il frame corrente è stato esportato
+        self.calls += 1
+        if (self.calls - 1) % self.stride != 0:
+            return False
+
+        DroneDeliveryRenderer.render(self.env)
+        frame = np.asarray(self.canvas.buffer_rgba())[:, :, :3]
+
+        if self.format == 'npy':
+            if self.frame_shape is None:
+                self.frame_shape = frame.shape
+            self.file.write(np.ascontiguousarray(frame).tobytes())
+        elif self.format == 'gif':
+            self.__write_gif_frame(frame)
+        elif self.format == 'png':
+            self.__write_png_frame(frame)
+        else:
+            from PIL import Image
+            Image.fromarray(frame).save(os.path.join(self.path, f"frame_{self.frames:06d}.png"), compress_level=1)
+
+        self.frames += 1
+        return True
+
+    def close(self):
+        if self.format == 'npy':
+            self.__write_npy_header()
+            self.file.close()
+        elif self.format in ('gif', 'png') and not self.file.closed:
+            if self.frames == 0:
+                # nessun frame catturato: non lascia un file incompleto
+                self.file.close()
+                os.remove(self.path)
+            elif self.format == 'gif':
+                self.file.write(b';')
+                self.file.close()
+            else:
+                self.__write_png_chunk(b'IEND', b'')
+                # il numero di frame dell'animazione è noto solo ora: riscrive il chunk acTL
+                self.file.seek(self.PNG_ACTL_OFFSET)
+                self.__write_png_chunk(b'acTL', self.frames.to_bytes(4, 'big') + bytes(4))
+                self.file.close()
+
+    def __write_gif_frame(self, frame):
+        from PIL import Image, GifImagePlugin
+        # ogni frame ha la propria palette adattiva come tabella dei colori locale
+        image = Image.fromarray(frame).convert('P', palette=Image.ADAPTIVE)
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(image, info={'loop': 0, 'optimize': False})
+            self.file.write(b''.join(header))
+        for data in GifImagePlugin.getdata(image, duration=int(1000 / self.fps), include_color_table=True):
+            self.file.write(data)
+
+    def __write_png_frame(self, frame):
+        # png animato (APNG) in RGB: righe con filtro nullo compresse con zlib, un chunk fcTL per frame
+        height, width = frame.shape[:2]
+        if self.frames == 0:
+            self.file.write(b'\x89PNG\r\n\x1a\n')
+            self.__write_png_chunk(b'IHDR', width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes([8, 2, 0, 0, 0]))
+            self.__write_png_chunk(b'acTL', bytes(8))
+            self.sequence = 0
+
+        control = (self.sequence.to_bytes(4, 'big') + width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes(8) +
+                   (1).to_bytes(2, 'big') + int(self.fps).to_bytes(2, 'big') + bytes(2))
+        self.__write_png_chunk(b'fcTL', control)
+        self.sequence += 1
+
+        rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+        rows[:, 1:] = frame.reshape(height, width * 3)
+        data = zlib.compress(rows.tobytes(), 6)
+        if self.frames == 0:
+            self.__write_png_chunk(b'IDAT', data)
+        else:
+            self.__write_png_chunk(b'fdAT', self.sequence.to_bytes(4, 'big') + data)
+            self.sequence += 1
+
+    def __write_png_chunk(self, kind, data):
+        self.file.write(len(data).to_bytes(4, 'big') + kind + data +
+                        zlib.crc32(kind + data).to_bytes(4, 'big'))
+
+    def __write_npy_header(self):
+        # intestazione .npy (versione 1.0) per l'array (frame, altezza, larghezza, 3) di uint8, completata con
+        # spazi fino alla dimensione riservata: il file può essere aperto con np.load(path, mmap_mode='r')
+        shape = (self.frames,) + (self.frame_shape or (0, 0, 3))
+        header = repr({'descr': '|u1', 'fortran_order': False, 'shape': shape}).encode('latin1')
+        padding = self.NPY_HEADER_SIZE - 10 - len(header) - 1
+        self.file.seek(0)
+        self.file.write(b'\x93NUMPY\x01\x00' + (self.NPY_HEADER_SIZE - 10).to_bytes(2, 'little') + header +
+                        b' ' * padding + b'\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,76 @@
+import math
+
+
+class DroneDeliveryFleet:
+    # disposizione originale: tre droni con stazioni di ricarica pensate per la griglia 7x7
+    LEGACY_CHARGING_STATIONS = [(3, 3), (6, 0), (0, 6)]
+
+    def __init__(self, num_drones=3, charging_stations=None):
+        # le stazioni possono essere indicate esplicitamente, altrimenti vengono generate per la griglia
+        if charging_stations is not None:
+            num_drones = len(charging_stations)
+        if num_drones < 1:
+            raise ValueError("the fleet needs at least one drone")
+
+        self.num_drones = num_drones
+        self.stations = None if charging_stations is None else [tuple(station) for station in charging_stations]
+
+    @staticmethod
+    def legacy():
+        return DroneDeliveryFleet(charging_stations=DroneDeliveryFleet.LEGACY_CHARGING_STATIONS)
+
+    def check_grid(self, grid_size):
+        # le stazioni indicate esplicitamente (ad esempio quelle originali, pensate per la griglia 7x7) possono
+        # cadere fuori da griglie più piccole, dove i droni che si muovono partirebbero fuori dalla griglia
+        if self.stations is None:
+            return
+        outside = [station for station in self.stations
+                   if not (0 <= station[0] < grid_size[0] and 0 <= station[1] < grid_size[1])]
+        if outside:
+            raise ValueError(f"charging stations {outside} lie outside the {grid_size[0]}x{grid_size[1]} grid")
+
+    def charging_stations(self, grid_size, warehouse):
+        # ogni drone ha la propria stazione di ricarica, che è anche la sua posizione di partenza
+        if self.stations is not None:
+            return list(self.stations)
+
+        height, width = grid_size
+
+        # servono celle libere anche per magazzino, punti di consegna e spostamenti dei droni
+        if 2 * self.num_drones + 1 > height * width:
+            raise ValueError(f"a {height}x{width} grid is too small for {self.num_drones} drones")
+
+        # distribuisce le stazioni su un reticolo regolare con lo stesso rapporto d'aspetto della griglia
+        rows = min(height, max(1, round(math.sqrt(self.num_drones * height / width))))
+        columns = math.ceil(self.num_drones / rows)
+        if columns > width:
+            columns = width
+            rows = math.ceil(self.num_drones / columns)
+
+        stations = []
+        used = {warehouse}
+        for i in range(self.num_drones):
+            row, column = divmod(i, columns)
+            y = int((row + 0.5) * height / rows)
+            x = int((column + 0.5) * width / columns)
+            station = DroneDeliveryFleet.__nearest_free_cell((y, x), grid_size, used)
+            stations.append(station)
+            used.add(station)
+
+        return stations
+
+    @staticmethod
+    def __nearest_free_cell(position, grid_size, used):
+        if position not in used:
+            return position
+
+        # cerca la cella libera più vicina allargando la distanza di Manhattan
+        y, x = position
+        for distance in range(1, grid_size[0] + grid_size[1]):
+            for dy in range(-distance, distance + 1):
+                dx = distance - abs(dy)
+                for cell in ((y + dy, x + dx), (y + dy, x - dx)):
+                    if 0 <= cell[0] < grid_size[0] and 0 <= cell[1] < grid_size[1] and cell not in used:
+                        return cell
+
+        raise ValueError("no free cell left for a charging station")
@@ -0,0 +1,191 @@
+import csv
+import json
+import math
+import os
+from collections import deque
+
+
+class DroneDeliveryMetrics:
+    # campi di ogni record, nell'ordine delle colonne del formato csv
+    FIELDS = ('episode', 'reward', 'steps', 'deliveries', 'epsilon', 'battery_failure', 'wall_time')
+
+    def __init__(self, path=None, window=100, flush_every=100, append=False):
+        # senza path mantiene solo gli aggregati; altrimenti scrive un record per episodio in formato jsonl
+        # oppure csv (in base all'estensione), svuotando il buffer ogni flush_every record
+        self.path = path
+        self.window = window
+        self.flush_every = flush_every
+        self.file = None
+        self.writer = None
+
+        # aggregati aggiornati in O(1) ad ogni record: totali, media e varianza (Welford), minimo e massimo
+        self.count = 0
+        self.last_reward = None
+        self.total_steps = 0
+        self.total_deliveries = 0
+        self.battery_failures = 0
+        self.reward_mean = 0.0
+        self.reward_m2 = 0.0
+        self.reward_min = math.inf
+        self.reward_max = -math.inf
+
+        # media mobile sulle ultime window ricompense e medie dei blocchi di window episodi per il grafico
+        self.recent_rewards = deque(maxlen=window)
+        self.recent_sum = 0.0
+        self.block_sum = 0.0
+        self.block_means = []
+
+        if path is not None:
+            self.format = 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl'
+            self.__open(append)
+        self.pending = 0
+
+    def __open(self, append):
+        exists = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self.file = open(self.path, 'a' if append else 'w', newline='')
+        if self.format == 'csv':
+            self.writer = csv.writer(self.file)
+            if not exists:
+                self.writer.writerow(self.FIELDS)
+
+    def record(self, episode, reward, steps, deliveries, epsilon, battery_failure, wall_time):
+        self.count += 1
+        self.last_reward = reward
+        self.total_steps += steps
+        self.total_deliveries += deliveries
+        self.battery_failures += 1 if battery_failure else 0
+
+        delta = reward - self.reward_mean
+        self.reward_mean += delta / self.count
+        self.reward_m2 += delta * (reward - self.reward_mean)
+        self.reward_min = min(self.reward_min, reward)
+        self.reward_max = max(self.reward_max, reward)
+
+        if len(self.recent_rewards) == self.window:
+            self.recent_sum -= self.recent_rewards[0]
+        self.recent_rewards.append(reward)
+        self.recent_sum += reward
+
+        self.block_sum += reward
+        if self.count % self.window == 0:
+            self.block_means.append(self.block_sum / self.window)
+            self.block_sum = 0.0
+
+        if self.file is not None:
+            values = (episode, reward, steps, deliveries, epsilon, bool(battery_failure), wall_time)
+            if self.format == 'csv':
+                self.writer.writerow(values)
+            else:
+                self.file.write(json.dumps(dict(zip(self.FIELDS, values))) + "\n")
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.flush()
+
+    def rewards(self):
+        # ricompense degli episodi scritti nel file (nessuna senza path), ad esempio dopo la ripresa da un checkpoint
+        if self.file is None:
+            return []
+        self.flush()
+        return [record['reward'] for record in DroneDeliveryMetrics.load(self.path)]
+
+    def block_averages(self):
+        # medie dei blocchi di window episodi, compreso l'ultimo blocco incompleto
+        partial = self.count % self.window
+        return self.block_means + ([self.block_sum / partial] if partial else [])
+
+    def moving_average(self):
+        return self.recent_sum / len(self.recent_rewards) if self.recent_rewards else 0.0
+
+    def summary(self):
+        return {
+            'episodes': self.count,
+            'reward_mean': self.reward_mean,
+            'reward_std': math.sqrt(self.reward_m2 / self.count) if self.count else 0.0,
+            'reward_min': self.reward_min if self.count else None,
+            'reward_max': self.reward_max if self.count else None,
+            'reward_moving_average': self.moving_average(),
+            'total_steps': self.total_steps,
+            'total_deliveries': self.total_deliveries,
+            'battery_failures': self.battery_failures,
+        }
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+        self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+    def state(self):
+        # stato salvato nei checkpoint: aggregati e dimensione del file dopo l'ultimo record scritto
+        self.flush()
+        state = {name: getattr(self, name) for name in
+                 ('count', 'last_reward', 'total_steps', 'total_deliveries', 'battery_failures', 'reward_mean',
+                  'reward_m2', 'reward_min', 'reward_max', 'recent_sum', 'block_sum', 'block_means')}
+        state['recent_rewards'] = list(self.recent_rewards)
+        state['offset'] = self.file.tell() if self.file is not None else None
+        return state
+
+    def restore(self, state):
+        # riprende dagli aggregati di un checkpoint; i record scritti dopo il checkpoint vengono scartati
+        for name, value in state.items():
+            if name not in ('recent_rewards', 'offset'):
+                setattr(self, name, value)
+        self.block_means = list(state['block_means'])
+        self.recent_rewards = deque(state['recent_rewards'], maxlen=self.window)
+
+        if self.file is not None and state['offset'] is not None:
+            self.file.close()
+            with open(self.path, 'r+') as sink:
+                sink.truncate(state['offset'])
+            self.__open(append=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def load(path):
+        # legge i record di un file jsonl o csv
+        with open(path, newline='') as sink:
+            if os.path.splitext(path)[1].lower() == '.csv':
+                records = []
+                for row in csv.DictReader(sink):
+                    record = {name: float(row[name]) for name in ('reward', 'epsilon', 'wall_time')}
+                    record.update({name: int(row[name]) for name in ('episode', 'steps', 'deliveries')})
+                    record['battery_failure'] = row['battery_failure'] == 'True'
+                    records.append(record)
+                return records
+            return [json.loads(line) for line in sink if line.strip()]
+
+    @staticmethod
+    def plot(source, output_path, window=100):
+        # grafico della ricompensa media per blocchi di window episodi, disegnato fuori schermo su un file;
+        # source può essere un DroneDeliveryMetrics, il percorso di un file di record o una lista di ricompense
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        if isinstance(source, DroneDeliveryMetrics):
+            avg_rewards = source.block_averages()
+            window = source.window
+        else:
+            if isinstance(source, str):
+                source = [record['reward'] for record in DroneDeliveryMetrics.load(source)]
+            rewards = list(source)
+            avg_rewards = [sum(rewards[i:i + window]) / len(rewards[i:i + window])
+                           for i in range(0, len(rewards), window)]
+
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        ax.plot(range(0, len(avg_rewards) * window, window), avg_rewards)
+        ax.set_xlabel('Episode')
+        ax.set_ylabel('Average Cumulative Reward')
+        ax.set_title(f'Average Cumulative Reward per {window} Episodes')
+        figure.savefig(output_path)
@@ -0,0 +1,218 @@
+import multiprocessing
+import queue
+import random
+import sys
+import time
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+
+from DroneDeliveryCheckpoint import DroneDeliveryCheckpoint
+from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+from DroneDeliveryMetrics import DroneDeliveryMetrics
+from DroneDeliveryTrainer import DroneDeliveryTrainer
+
+
+def run_worker(worker_id, config, q_table_name, epsilon, stop, messages):
+    # processo attore: esegue episodi sul proprio ambiente leggendo la q-table condivisa
+    random.seed(config['seed'] + worker_id)
+    np.random.seed(config['seed'] + worker_id)
+
+    shared = shared_memory.SharedMemory(name=q_table_name)
+    try:
+        env = DroneDeliveryEnvironment(config['grid_size'], epsilon.value, training_mode=True, fleet=config['fleet'],
+                                       state_encoder=config['state_encoder'], q_table_dtype=config['q_table_dtype'])
+        env.Q_table = np.ndarray(config['q_table_shape'], dtype=config['q_table_dtype'], buffer=shared.buf)
+
+        # con il learner le transizioni vengono accumulate e inviate a blocchi; in modalità hogwild il worker
+        # aggiorna direttamente la q-table condivisa, senza lock
+        transitions = ([], [], [], [])
+        transition_sink = None
+        if config['mode'] == 'learner':
+            def transition_sink(state, action, reward, next_state):
+                transitions[0].append(env.encode_state(state))
+                transitions[1].append(int(action))
+                transitions[2].append(reward)
+                transitions[3].append(env.encode_state(next_state))
+                if len(transitions[0]) >= config['chunk_size']:
+                    send_transitions()
+
+            def send_transitions():
+                messages.put(('transitions', worker_id) + tuple(list(values) for values in transitions))
+                for values in transitions:
+                    values.clear()
+
+        trainer = DroneDeliveryTrainer(env, num_episodes=0, alpha=config['alpha'], gamma=config['gamma'],
+                                       epsilon=epsilon.value, multi_agent=config['multi_agent'],
+                                       transition_sink=transition_sink)
+
+        while not stop.is_set():
+            # epsilon viene aggiornato dal processo principale ad ogni episodio completato; la politica greedy in
+            # cache non è più valida perché la q-table condivisa cambia anche negli altri processi
+            env.epsilon = epsilon.value
+            env.greedy_policy = None
+            episode_start = time.perf_counter()
+            total_reward, steps, deliveries, battery_failure = trainer.run_episode()
+            if transition_sink is not None and transitions[0]:
+                send_transitions()
+            messages.put(('episode', worker_id, total_reward, steps, deliveries, bool(battery_failure),
+                          env.epsilon, time.perf_counter() - episode_start))
+    except Exception:
+        # l'errore viene riportato al processo principale, che interrompe l'addestramento senza salvare
+        messages.put(('error', worker_id, traceback.format_exc()))
+    else:
+        messages.put(('done', worker_id))
+    finally:
+        shared.close()
+
+
+class DroneDeliveryParallelTrainer:
+    MODES = ('hogwild', 'learner')
+    # blocchi di transizioni in attesa per worker: quando il learner resta indietro i worker si fermano sul put
+    # invece di accumulare transizioni in memoria
+    PENDING_CHUNKS_PER_WORKER = 4
+
+    def __init__(self, env, num_episodes=4000, num_workers=None, mode='hogwild', alpha=0.1, gamma=0.9, epsilon=0.5,
+                 epsilon_decay=0.997, multi_agent=False, seed=0, chunk_size=512, metrics=None, keep_rewards=False):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown parallel training mode '{mode}', expected one of {self.MODES}")
+        if env.q_table_storage != 'dense':
+            raise ValueError("parallel training shares a dense q-table between processes")
+        if multi_agent:
+            env.fleet.check_grid(env.grid_size)
+
+        self.env = env
+        self.num_episodes = num_episodes
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.mode = mode
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.epsilon_decay = epsilon_decay
+        self.multi_agent = multi_agent
+        self.seed = seed
+        self.chunk_size = chunk_size  # transizioni per messaggio inviato al learner
+        self.metrics = metrics if metrics is not None else DroneDeliveryMetrics()
+        self.keep_rewards = keep_rewards  # come in DroneDeliveryTrainer, la lista delle ricompense è opzionale
+        self.rewards_per_episode = []
+        self.transitions_applied = 0
+
+        # il processo principale usa gli stessi parametri di apprendimento quando fa da learner
+        self.env.alpha = alpha
+        self.env.gamma = gamma
+
+    def train(self, q_table_path="q_table.npy", verbose=True):
+        q_table = np.ascontiguousarray(self.env.Q_table)
+        shared = shared_memory.SharedMemory(create=True, size=q_table.nbytes)
+        try:
+            # la q-table vive nella memoria condivisa: attori e learner leggono e scrivono lo stesso array
+            shared_q_table = np.ndarray(q_table.shape, dtype=q_table.dtype, buffer=shared.buf)
+            shared_q_table[...] = q_table
+            self.env.Q_table = shared_q_table
+            try:
+                self.__run(shared, shared_q_table, verbose)
+            finally:
+                # la memoria condivisa viene rilasciata anche se l'addestramento fallisce
+                self.env.Q_table = shared_q_table.copy()
+        finally:
+            shared.close()
+            shared.unlink()
+
+        if q_table_path is not None:
+            DroneDeliveryCheckpoint.atomic_save(q_table_path, self.env.q_table_array())
+            print(f"Q-table salvata come '{q_table_path}'.")
+
+        self.metrics.flush()
+        return self.rewards_per_episode
+
+    def __run(self, shared, q_table, verbose):
+        context = multiprocessing.get_context()
+        epsilon = context.Value('d', self.epsilon, lock=False)
+        stop = context.Event()
+        messages = context.Queue(maxsize=self.PENDING_CHUNKS_PER_WORKER * self.num_workers)
+
+        config = {'grid_size': tuple(self.env.grid_size), 'fleet': self.env.fleet,
+                  'state_encoder': self.env.state_encoder, 'q_table_shape': q_table.shape,
+                  'q_table_dtype': q_table.dtype.str, 'mode': self.mode, 'alpha': self.alpha, 'gamma': self.gamma, 'multi_agent': self.multi_agent,
+                  'seed': self.seed, 'chunk_size': self.chunk_size}
+        workers = [context.Process(target=run_worker, args=(i, config, shared.name, epsilon, stop, messages),
+                                   daemon=True)
+                   for i in range(self.num_workers)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self.__collect(workers, messages, epsilon, stop, verbose)
+        except BaseException:
+            # un worker fallito (o un'interruzione) ferma anche gli altri
+            stop.set()
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+            raise
+
+        for worker in workers:
+            worker.join()
+        failed = [i for i, worker in enumerate(workers) if worker.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"parallel training workers {failed} exited with codes "
+                               f"{[workers[i].exitcode for i in failed]}")
+
+    def __collect(self, workers, messages, epsilon, stop, verbose):
+        # il processo principale raccoglie gli episodi, aggiorna epsilon e, con il learner, applica le transizioni;
+        # gli episodi completati dopo il budget vengono scartati, ma le loro transizioni sono comunque usate
+        running = len(workers)
+        episode = 0
+        while running > 0:
+            try:
+                message = messages.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError(f"parallel training workers exited unexpectedly with codes "
+                                       f"{[worker.exitcode for worker in workers]}")
+                continue
+
+            kind = message[0]
+            if kind == 'transitions':
+                self.env.update_q_table_indices(*message[2:])
+                self.transitions_applied += len(message[2])
+            elif kind == 'episode' and episode < self.num_episodes:
+                _, _, total_reward, steps, deliveries, battery_failure, episode_epsilon, wall_time = message
+                if self.keep_rewards:
+                    self.rewards_per_episode.append(total_reward)
+                self.metrics.record(episode, total_reward, steps, deliveries, episode_epsilon, battery_failure,
+                                    wall_time)
+
+                # riduce epsilon con lo stesso schedule del trainer, contando gli episodi di tutti i worker
+                self.epsilon = max(0.01, self.epsilon * self.epsilon_decay)
+                epsilon.value = self.epsilon
+
+                if verbose and episode % 100 == 0:
+                    print(f"Episode {episode}/{self.num_episodes} complete, "
+                          f"Average Reward: {self.metrics.moving_average()}")
+                episode += 1
+                if episode == self.num_episodes:
+                    stop.set()
+            elif kind == 'error':
+                raise RuntimeError(f"parallel training worker {message[1]} failed:\n{message[2]}")
+            elif kind == 'done':
+                running -= 1
+
+
+def main():
+    # uso: python DroneDeliveryParallelTrainer.py [--workers N] [--learner] [--multi-agent]
+    num_workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+    mode = 'learner' if "--learner" in sys.argv else 'hogwild'
+    multi_agent = "--multi-agent" in sys.argv
+
+    env = DroneDeliveryEnvironment((7, 7) if multi_agent else (5, 5), 1, training_mode=True)
+    trainer = DroneDeliveryParallelTrainer(env, num_workers=num_workers, mode=mode, multi_agent=multi_agent)
+
+    print(f"Starting {mode} training with {trainer.num_workers} workers...")
+    trainer.train()
+    print(f"Training complete. {trainer.metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import heapq
+
+
+class DroneDeliveryPlanner:
+    # direzioni possibili: su, giù, sinistra, destra
+    DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+    @staticmethod
+    def find_path(obstacles, start_position, target_position, weather=None, weather_cost=None, profiler=None):
+        # A* con euristica di Manhattan: obstacles e weather sono griglie (liste di liste) di booleani
+        height, width = len(obstacles), len(obstacles[0])
+
+        # attraversare una cella di maltempo costa più di qualsiasi percorso che la eviti, così il percorso
+        # evita il maltempo quando è possibile e altrimenti ne attraversa il minor numero di celle
+        if weather_cost is None:
+            weather_cost = height * width
+
+        if start_position == target_position:
+            return []
+
+        target_y, target_x = target_position
+        start_y, start_x = start_position
+
+        # ogni cella ricorda il costo migliore con cui è stata raggiunta e il suo predecessore
+        costs = {start_position: 0}
+        parents = {start_position: None}
+
+        # la coda con priorità ordina per costo stimato totale e, a parità, per distanza residua minore
+        distance = abs(target_y - start_y) + abs(target_x - start_x)
+        queue = [(distance, distance, 0, start_position)]
+        expansions = 0
+
+        while queue:
+            _, _, cost, current_position = heapq.heappop(queue)
+
+            # scarta le voci superate da un percorso migliore verso la stessa cella
+            if cost > costs[current_position]:
+                continue
+            expansions += 1
+
+            # se ha raggiunto il target ricostruisce il percorso, senza la posizione di partenza
+            if current_position == target_position:
+                path = []
+                while parents[current_position] is not None:
+                    path.append(current_position)
+                    current_position = parents[current_position]
+                path.reverse()
+                if profiler is not None:
+                    DroneDeliveryPlanner.__count_search(profiler, expansions)
+                return path
+
+            y, x = current_position
+
+            for dy, dx in DroneDeliveryPlanner.DIRECTIONS:
+                new_y, new_x = y + dy, x + dx
+
+                # verifica se la nuova posizione è valida e non è un ostacolo
+                if not (0 <= new_y < height and 0 <= new_x < width) or obstacles[new_y][new_x]:
+                    continue
+
+                new_cost = cost + 1
+                if weather is not None and weather[new_y][new_x]:
+                    new_cost += weather_cost
+
+                new_position = (new_y, new_x)
+                if new_cost < costs.get(new_position, new_cost + 1):
+                    costs[new_position] = new_cost
+                    parents[new_position] = current_position
+                    distance = abs(target_y - new_y) + abs(target_x - new_x)
+                    heapq.heappush(queue, (new_cost + distance, distance, new_cost, new_position))
+
+        # ritorna una lista vuota se non c'è un percorso disponibile
+        if profiler is not None:
+            DroneDeliveryPlanner.__count_search(profiler, expansions)
+        return []
+
+    @staticmethod
+    def __count_search(profiler, expansions):
+        profiler.count('path_searches')
+        profiler.count('node_expansions', expansions)
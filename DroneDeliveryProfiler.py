@@ -0,0 +1,62 @@
+import time
+
+
+class DroneDeliveryProfiler:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.total_time = 0.0
+        self.phases = {}  # fase -> [tempo totale, chiamate]
+        self.counters = {}
+        self.step_start = 0.0
+        self.last = 0.0
+
+    def start(self):
+        # inizio di uno step: le fasi successive sono misurate a partire da qui
+        self.steps += 1
+        self.step_start = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        # attribuisce a phase il tempo trascorso dalla fase precedente
+        now = time.perf_counter()
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [now - self.last, 1]
+        else:
+            entry[0] += now - self.last
+            entry[1] += 1
+        self.last = now
+
+    def stop(self):
+        self.total_time += time.perf_counter() - self.step_start
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        # copia dei valori raccolti: il tempo non attribuito ad alcuna fase (ad esempio gli step di ricarica,
+        # che terminano subito) è riportato come untracked
+        tracked = sum(elapsed for elapsed, _ in self.phases.values())
+        phases = {}
+        for phase, (elapsed, calls) in self.phases.items():
+            phases[phase] = {'time': elapsed, 'calls': calls, 'mean_us': elapsed / calls * 1e6,
+                             'share': elapsed / self.total_time if self.total_time else 0.0}
+
+        return {'steps': self.steps, 'total_time': self.total_time,
+                'mean_step_us': self.total_time / self.steps * 1e6 if self.steps else 0.0,
+                'untracked_time': max(0.0, self.total_time - tracked),
+                'phases': phases, 'counters': dict(self.counters)}
+
+    def report(self):
+        # riepilogo testuale con le fasi ordinate per tempo totale
+        snapshot = self.snapshot()
+        lines = [f"{snapshot['steps']} steps, {snapshot['total_time'] * 1e3:.1f} ms "
+                 f"({snapshot['mean_step_us']:.1f} us/step)"]
+        for phase, values in sorted(snapshot['phases'].items(), key=lambda item: -item[1]['time']):
+            lines.append(f"  {phase:<26} {values['time'] * 1e3:9.2f} ms {values['share'] * 100:5.1f}% "
+                         f"{values['calls']:8d} calls {values['mean_us']:8.2f} us/call")
+        for counter, value in sorted(snapshot['counters'].items()):
+            lines.append(f"  {counter:<26} {value}")
+        return "\n".join(lines)
@@ -0,0 +1,145 @@
+import numpy as np
+
+
+class DroneDeliveryRecorder:
+    # tipi di record
+    STEP = 0  # uno step di un drone, con lo stato risultante
+    RESET = 1  # inizio di un episodio: y e x contengono le dimensioni della griglia
+    DRONE = 2  # stato di un drone all'inizio dell'episodio
+    ZONE = 3  # zona di maltempo già attiva all'inizio dell'episodio
+
+    # eventi di consegna
+    PICK_UP = 1
+    DELIVERY = 2
+
+    # bit del campo flags: pacco a bordo, circumnavigazione e ostacoli (su, giù, sinistra, destra)
+    HAS_PACKAGE = 1
+    CIRCUMNAVIGATE = 2
+    OBSTACLES = (4, 8, 16, 32)
+
+    RECORD_DTYPE = np.dtype([
+        ('kind', np.int8),
+        ('drone', np.int16),
+        ('action', np.int8),
+        ('done', np.bool_),
+        ('reward', np.float32),
+        ('y', np.int16),
+        ('x', np.int16),
+        ('battery', np.int16),
+        ('charging_timer', np.float64),
+        ('flags', np.uint8),
+        ('relative_target', np.int8),
+        ('delivery_point', np.int16, (2,)),  # (-1, -1) se il drone non ha un punto di consegna
+        ('num_objects', np.int16),
+        ('deliveries', np.int16),
+        ('event', np.int8),
+        ('zone', np.int16, (4,)),  # zona di maltempo creata nello step (y, x, width, height), -1 se nessuna
+        ('zone_lifetime', np.int16),
+    ])
+
+    def __init__(self, env, path=None, capacity=4096):
+        self.env = env
+        self.path = path
+        self.count = 0
+
+        # i record sono scritti in un array preallocato, in memoria oppure in un file .npy mappato in memoria
+        # che viene ingrandito quando si riempie
+        if path is None:
+            self.records = np.zeros(capacity, dtype=self.RECORD_DTYPE)
+        else:
+            self.records = np.lib.format.open_memmap(path, mode='w+', dtype=self.RECORD_DTYPE, shape=(capacity,))
+            self.header_size = self.records.offset
+
+    def reset(self):
+        # registra lo stato iniziale dell'episodio: droni e zone di maltempo ancora attive
+        states = self.env.reset()
+
+        self.__append(self.RESET, -1, y=self.env.grid_size[0], x=self.env.grid_size[1])
+        for drone_index, state in enumerate(states):
+            self.__append(self.DRONE, drone_index, state)
+        for (y, x), (width, height), lifetime in self.env.weather.zones():
+            self.__append(self.ZONE, -1, zone=(y, x, width, height), zone_lifetime=lifetime)
+
+        return states
+
+    def step(self, drone_index, action):
+        has_package = self.env.drone_states[drone_index][7]
+        deliveries = self.env.deliveries_completed[drone_index]
+
+        next_state, reward, done = self.env.step(drone_index, action)
+
+        # eventi di consegna avvenuti durante lo step
+        event = 0
+        if self.env.deliveries_completed[drone_index] != deliveries:
+            event = self.DELIVERY
+        elif next_state[7] and not has_package:
+            event = self.PICK_UP
+
+        self.__append(self.STEP, drone_index, next_state, action=action, reward=reward, done=done, event=event,
+                      zone=self.env.weather.last_zone, zone_lifetime=self.env.weather_lifetime)
+
+        return next_state, reward, done
+
+    def __append(self, kind, drone_index, state=None, action=-1, reward=0, done=False, event=0, zone=None,
+                 zone_lifetime=0, y=0, x=0):
+        if self.count == len(self.records):
+            self.__grow()
+
+        # i campi seguono l'ordine di RECORD_DTYPE
+        if zone is None:
+            zone = (-1, -1, -1, -1)
+
+        if state is None:
+            self.records[self.count] = (kind, drone_index, action, done, reward, y, x, 0, 0, 0, 0, (-1, -1),
+                                        self.env.num_objects, 0, event, zone, zone_lifetime)
+        else:
+            (y, x, battery_level, obstacle_up, obstacle_down, obstacle_left, obstacle_right, has_package,
+             charging_timer, relative_tgt, circumnavigate, _) = state
+
+            flags = (self.HAS_PACKAGE if has_package else 0) | (self.CIRCUMNAVIGATE if circumnavigate else 0)
+            for bit, obstacle in zip(self.OBSTACLES, (obstacle_up, obstacle_down, obstacle_left, obstacle_right)):
+                if obstacle:
+                    flags |= bit
+
+            delivery_point = self.env.target_delivery_points[drone_index]
+            self.records[self.count] = (kind, drone_index, action, done, reward, y, x, battery_level, charging_timer,
+                                        flags, relative_tgt, delivery_point or (-1, -1), self.env.num_objects,
+                                        self.env.deliveries_completed[drone_index], event, zone, zone_lifetime)
+
+        self.count += 1
+
+    def __grow(self):
+        # raddoppia la capacità mantenendo i record già scritti
+        capacity = 2 * len(self.records)
+        if self.path is None:
+            records = np.zeros(capacity, dtype=self.RECORD_DTYPE)
+            records[:self.count] = self.records[:self.count]
+            self.records = records
+        else:
+            self.records.flush()
+            del self.records
+            self.__write_header(capacity)
+            self.records = np.memmap(self.path, dtype=self.RECORD_DTYPE, mode='r+', offset=self.header_size,
+                                     shape=(capacity,))
+
+    def __write_header(self, length):
+        # riscrive l'intestazione .npy con la nuova lunghezza, mantenendo la stessa dimensione
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.RECORD_DTYPE), 'fortran_order': False,
+                       'shape': (length,)}).encode('latin1')
+        with open(self.path, 'r+b') as file:
+            file.seek(8)
+            header_length = int.from_bytes(file.read(2), 'little')
+            file.seek(10)
+            file.write(header + b' ' * (header_length - len(header) - 1) + b'\n')
+            file.truncate(self.header_size + length * self.RECORD_DTYPE.itemsize)
+
+    def close(self):
+        # con un file, lo riduce ai soli record scritti; ritorna i record registrati
+        if self.path is None:
+            return self.records[:self.count]
+
+        self.records.flush()
+        del self.records
+        self.__write_header(self.count)
+        self.records = np.load(self.path, mmap_mode='r')
+        return self.records
@@ -1,8 +1,7 @@
 
-from matplotlib import pyplot as plt
-
 import numpy as np
 from matplotlib.colors import ListedColormap, BoundaryNorm
+from matplotlib.patches import Rectangle
 
 FONT_SIZE_M = 10
 FONT_SIZE_S = 8
@@ -35,89 +34,201 @@ def get_drone_color(charging_timer):
 
 
 class DroneDeliveryRenderer:
+    # colori per cella vuota, delivery point, stazione di ricarica, magazzino e droni
+    CMAP = ListedColormap(['#D3D3D3', 'yellow', '#90EE90', '#D2B48C', 'azure', 'azure', 'azure', '#4682B4'])
+    NORM = BoundaryNorm([0, 1, 2, 3, 4, 5, 6, 7, 8], CMAP.N)
+
+    # colore blu per le zone di maltempo con trasparenza del 40%
+    WEATHER_ZONE_COLOR = (0.5, 0.8, 1.0, 0.4)
+
+    # oltre questo numero di droni il titolo mostra solo valori riassuntivi
+    MAX_TITLE_DRONES = 5
+
     @staticmethod
     def render(env):
+        # controlla che ax e canvas siano inizializzati
+        if env.ax is None or env.canvas is None:
+            print("Error: canvas or ax not initialized correctly")
+            return
+
+        # gli artisti vengono creati solo la prima volta e poi aggiornati ad ogni frame
+        if env.im is None:
+            DroneDeliveryRenderer.__create_artists(env)
+
+        # indici delle stazioni di ricarica e primo drone presente in ogni cella, calcolati una volta per frame
+        # così che il costo delle etichette cresca linearmente con il numero di droni
+        stations = {station: i for i, station in enumerate(env.CHARGING_STATIONS)}
+        drones = {}
+        for i, drone_state in enumerate(env.drone_states):
+            drones.setdefault((drone_state[0], drone_state[1]), f'D{i + 1}')
+
+        env.im.set_data(DroneDeliveryRenderer.__build_grid(env, stations))
+        DroneDeliveryRenderer.__update_weather_zones(env)
+        DroneDeliveryRenderer.__update_charging_stations(env, stations)
+        DroneDeliveryRenderer.__update_labels(env, stations, drones)
+        DroneDeliveryRenderer.__update_title(env)
+
+        # aggiorna il canvas per visualizzare i cambiamenti
+        DroneDeliveryRenderer.__blit(env)
+        if env.root is not None:
+            env.root.update()
+
+    @staticmethod
+    def __create_artists(env):
+        # con il blitting gli elementi che cambiano vengono esclusi dal disegno completo e ridisegnati
+        # sopra lo sfondo salvato; se il canvas non lo supporta si ridisegna tutto ad ogni frame
+        animated = env.canvas.supports_blit
+        text_style = dict(ha='center', va='center', fontsize=FONT_SIZE_S, color='black', fontweight='bold',
+                          animated=animated)
+
+        stations = {station: i for i, station in enumerate(env.CHARGING_STATIONS)}
+        env.im = env.ax.imshow(DroneDeliveryRenderer.__build_grid(env, stations), cmap=DroneDeliveryRenderer.CMAP,
+                               norm=DroneDeliveryRenderer.NORM, interpolation='nearest', animated=animated)
+
+        # rimuove i numeri e le etichette degli assi x e y del disegno
+        env.ax.set_xticks([])
+        env.ax.set_yticks([])
+        env.ax.set_xticklabels([])
+        env.ax.set_yticklabels([])
+        env.ax.set_title("", fontsize=FONT_SIZE_M)
+        env.ax.title.set_animated(animated)
+
+        # i bordi degli assi stanno sopra la griglia, quindi vengono ridisegnati insieme agli elementi animati
+        for spine in env.ax.spines.values():
+            spine.set_animated(animated)
+
+        # un rettangolo per ogni stazione di ricarica, visibile solo quando un drone vi si trova sopra
+        env.charging_station_patches = []
+        for x, y in env.CHARGING_STATIONS:
+            patch = Rectangle((y - 0.5, x - 0.5), 1, 1, lw=0, visible=False, animated=animated)
+            env.ax.add_patch(patch)
+            env.charging_station_patches.append(patch)
+
+        # etichette di droni, delivery point, magazzino e stazioni di ricarica
+        env.drone_labels = [env.ax.text(0, 0, f'D{i + 1}', visible=False, **text_style)
+                            for i in range(len(env.drone_states))]
+        env.delivery_points_labels = [env.ax.text(0, 0, f'DP{i + 1}', visible=False, **text_style)
+                                      for i in range(len(env.target_delivery_points))]
+        env.warehouse_label = env.ax.text(env.WAREHOUSE[1], env.WAREHOUSE[0], "", **text_style)
+        env.charging_stations_labels = [env.ax.text(y, x, "", **text_style) for x, y in env.CHARGING_STATIONS]
+
+        # le zone di maltempo riutilizzano i rettangoli già creati, quindi non vanno rimossi
+        env.weather_zone_patches = []
+
+        # ad ogni ridisegno completo (primo frame, ridimensionamento della finestra) salva il nuovo sfondo
+        env.render_background = None
+        if animated:
+            env.canvas.mpl_connect('draw_event', lambda event: DroneDeliveryRenderer.__save_background(env))
+
+    @staticmethod
+    def __build_grid(env, stations):
         # crea una griglia vuota
         grid = np.zeros(env.grid_size)
 
         # assegna il valore 1 ad ogni delivery point
         for delivery_point in env.target_delivery_points:
             if delivery_point is not None:
-                x, y = delivery_point
-                grid[x, y] = 1
+                grid[delivery_point[0], delivery_point[1]] = 1
 
-        # assegna il valore 2 ad ogni stazione di ricarica
+        # assegna il valore 2 ad ogni stazione di ricarica e il valore 3 al magazzino
         for charging_station in env.CHARGING_STATIONS:
             grid[charging_station[0], charging_station[1]] = 2
+        grid[env.WAREHOUSE[0], env.WAREHOUSE[1]] = 3
 
-        # assegna il valore 3 al magazzino
-        warehouse = env.WAREHOUSE
-        grid[warehouse[0], warehouse[1]] = 3
-
-        # lista per rappresentare le zone di maltempo sotto forma di rettangoli
-        if not hasattr(env, 'weather_zone_patches'):
-            env.weather_zone_patches = []
+        # i droni occupano solo le celle libere, e quelli sulle stazioni di ricarica hanno un proprio rettangolo;
+        # se più droni sono nella stessa cella prevale l'ultimo
+        drone_positions = {}
+        for drone_state in env.drone_states:
+            if (drone_state[0], drone_state[1]) not in stations:
+                drone_positions[drone_state[0], drone_state[1]] = 4  # tutti i droni hanno lo stesso colore
 
-        # prima di disegnare rimuove le vecchie zone di maltempo
-        for patch in env.weather_zone_patches:
-            patch.remove()
-        env.weather_zone_patches.clear()
+        for (x, y), value in drone_positions.items():
+            if grid[x, y] == 0:
+                grid[x, y] = value
 
-        # colore blu per le zone di maltempo con trasparenza del 40%
-        weather_zone_color = (0.5, 0.8, 1.0, 0.4)
-
-        # acquisisce i dati per le zone di maltempo attive
-        for weather_zone in env.weather_zones:
-            (y, x), (width, height), _ = weather_zone.values()
-            rect = plt.Rectangle((y - 0.5, x - 0.5), width, height, color=weather_zone_color, lw=0)
-            env.ax.add_patch(rect)
-            env.weather_zone_patches.append(rect)
-
-        # imposta un valore di default temporaneo per la posizione dei droni
-        drone_positions = np.full(env.grid_size, -1)
-
-        # aggiunge i droni sulla griglia e gestisce i colori
-        for i, drone_state in enumerate(env.drone_states):
-            x, y, battery_level, _, _, _, _, has_package, charging_timer, _, _, _ = drone_state
-
-            # verifica se il drone è su una stazione di ricarica
-            if (x, y) in env.CHARGING_STATIONS:
-                drone_color = get_drone_color(charging_timer)
-                env.ax.add_patch(plt.Rectangle((y - 0.5, x - 0.5), 1, 1, color=drone_color, lw=0))
-            else:
-                drone_positions[x, y] = 4 + i  # ogni drone ha un valore unico
+        return grid
 
+    @staticmethod
+    def __update_weather_zones(env):
+        zones = env.weather.zones()
+
+        # aggiunge nuovi rettangoli solo se le zone attive sono più di quelle mai disegnate
+        while len(env.weather_zone_patches) < len(zones):
+            patch = Rectangle((0, 0), 1, 1, color=DroneDeliveryRenderer.WEATHER_ZONE_COLOR, lw=0,
+                                  animated=env.im.get_animated())
+            env.ax.add_patch(patch)
+            env.weather_zone_patches.append(patch)
+
+        # acquisisce i dati per le zone di maltempo attive e nasconde i rettangoli inutilizzati
+        for patch, ((y, x), (width, height), _) in zip(env.weather_zone_patches, zones):
+            if patch.get_xy() != (y - 0.5, x - 0.5) or (patch.get_width(), patch.get_height()) != (width, height):
+                patch.set_bounds(y - 0.5, x - 0.5, width, height)
+            patch.set_visible(True)
+        for patch in env.weather_zone_patches[len(zones):]:
+            patch.set_visible(False)
 
-        # rappresenta i droni sulla griglia
-        for x in range(env.grid_size[0]):
-            for y in range(env.grid_size[1]):
-                if drone_positions[x, y] != -1:
-                    if grid[x, y] == 0:
-                        grid[x, y] = drone_positions[x, y]
+    @staticmethod
+    def __update_charging_stations(env, stations):
+        # colora la stazione di ricarica in base al tempo di ricarica del drone che vi si trova sopra
+        colors = [None] * len(env.CHARGING_STATIONS)
+        for drone_state in env.drone_states:
+            station = stations.get((drone_state[0], drone_state[1]))
+            if station is not None:
+                colors[station] = get_drone_color(drone_state[8])
+
+        for patch, color in zip(env.charging_station_patches, colors):
+            patch.set_visible(color is not None)
+            if color is not None:
+                patch.set_color(color)
 
-        # imposta i colori per tutti gli elementi
-        cmap = ListedColormap(['#D3D3D3', 'yellow', '#90EE90', '#D2B48C', 'azure', 'azure', 'azure', '#4682B4'])
-        bounds = [0, 1, 2, 3, 4, 5, 6, 7, 8]
-        norm = BoundaryNorm(bounds, cmap.N)
+    @staticmethod
+    def __update_labels(env, stations, drones):
+        warehouse = env.WAREHOUSE
 
-        # controlla che ax e canvas siano inizializzati
-        if env.ax is None or env.canvas is None:
-            print("Error: canvas or ax not initialized correctly")
-            return
+        # le etichette dei droni non vengono mostrate sulle stazioni di ricarica e sul magazzino
+        for label, drone_state in zip(env.drone_labels, env.drone_states):
+            x, y = drone_state[0], drone_state[1]
+            visible = (x, y) not in stations and (x, y) != warehouse
+            label.set_visible(visible)
+            if visible:
+                label.set_position((y, x))
+
+        # etichette dei punti di consegna
+        for label, delivery_point in zip(env.delivery_points_labels, env.target_delivery_points):
+            label.set_visible(delivery_point is not None)
+            if delivery_point is not None:
+                label.set_position((delivery_point[1], delivery_point[0]))
 
-        # inizializza l'immagine solo la prima volta
-        if env.im is None:
-            env.im = env.ax.imshow(grid, cmap=cmap, norm=norm, interpolation='nearest')
+        # label per il magazzino: quando un drone si trova sul magazzino mostra il carico
+        drone_at_warehouse = drones.get(warehouse)
+        if drone_at_warehouse:
+            warehouse_label_text = f"Load\n({drone_at_warehouse})"
         else:
-            env.im.set_data(grid)
+            warehouse_label_text = f"Warehouse\n({env.num_objects})"
+        DroneDeliveryRenderer.__set_text(env.warehouse_label, warehouse_label_text)
 
-        # calcola le percentuali di batteria
-        max_battery_level = env.BATTERY_LEVELS  # env.BATTERY_LEVELS vale 20
-        battery_percentages = [(drone_state[2] / max_battery_level) * 100 for drone_state in env.drone_states]
+        # etichette delle stazioni di ricarica, con il numero del drone che vi si trova sopra
+        for i, charging_station in enumerate(env.CHARGING_STATIONS):
+            drone_at_station = drones.get(charging_station)
+            label_text = f'Charge\n({drone_at_station})' if drone_at_station else f'R{i + 1}'
+            DroneDeliveryRenderer.__set_text(env.charging_stations_labels[i], label_text)
 
-        # crea una stringa con i dettagli dei droni e le percentuali di batteria
+    @staticmethod
+    def __update_title(env):
+        # calcola le percentuali di batteria
+        max_battery_level = env.BATTERY_LEVELS
+
+        # con molti droni il dettaglio per drone non entra nel titolo: mostra media e minimo della batteria
+        if len(env.drone_states) > DroneDeliveryRenderer.MAX_TITLE_DRONES:
+            battery_levels = [drone_state[2] / max_battery_level * 100 for drone_state in env.drone_states]
+            title = (f"Battery Percentages: mean {sum(battery_levels) / len(battery_levels):.1f}%, "
+                     f"min {min(battery_levels):.1f}% ({len(battery_levels)} drones)\n"
+                     f"Deliveries Completed: {sum(env.deliveries_completed)}/{env.WAREHOUSE_ITEMS}")
+            DroneDeliveryRenderer.__set_text(env.ax.title, title)
+            return
         battery_levels_str = ", ".join(
-            [f"Drone {i + 1}: {battery_percentage:.1f}%" for i, battery_percentage in enumerate(battery_percentages)]
+            [f"Drone {i + 1}: {(drone_state[2] / max_battery_level) * 100:.1f}%"
+             for i, drone_state in enumerate(env.drone_states)]
         )
 
         # crea una stringa con il dettaglio delle consegne effettuate per ogni drone
@@ -125,98 +236,45 @@ class DroneDeliveryRenderer:
             [f"Drone {i + 1}: {completed}" for i, completed in enumerate(env.deliveries_completed)]
         )
 
-        # calcola il totale complessivo delle consegne completate
-        total_deliveries = sum(env.deliveries_completed)
-
         # aggiorna il titolo con il totale delle consegne e i valori della batteria
         title = (f"Battery Percentages: {battery_levels_str}\n"
-                 f"Deliveries Completed: {completed_deliveries_str} (Total: {total_deliveries}/{env.WAREHOUSE_ITEMS})")
-
-        env.ax.set_title(title, fontsize=FONT_SIZE_M)
+                 f"Deliveries Completed: {completed_deliveries_str} "
+                 f"(Total: {sum(env.deliveries_completed)}/{env.WAREHOUSE_ITEMS})")
+        DroneDeliveryRenderer.__set_text(env.ax.title, title)
 
-        # rimuove i numeri e le etichette degli assi x e y del disegno
-        env.ax.set_xticks([])
-        env.ax.set_yticks([])
-        env.ax.set_xticklabels([])
-        env.ax.set_yticklabels([])
-
-        # rimuove le etichette dei droni a ogni passo
-        for label in env.drone_labels:
-            if label is not None:
-                label.remove()
-        env.drone_labels = [None] * len(env.drone_states)
-
-        # ricava la posizione delle stazioni di ricarica
-        charging_station_positions = {charging_station: i for i, charging_station in enumerate(env.CHARGING_STATIONS)}
+    @staticmethod
+    def __set_text(label, text):
+        if label.get_text() != text:
+            label.set_text(text)
 
-        # rimuove le etichette dei droni se si trovano su una stazione di ricarica
-        drone_positions_on_charging_stations = set()
-        for i, drone_state in enumerate(env.drone_states):
-            x, y, _, _, _, _, _, _, _, _, _, _ = drone_state
-            if (x, y) in charging_station_positions:
-                drone_positions_on_charging_stations.add((x, y))
-                env.drone_labels[i] = None  # rimuove l'etichetta del drone che è sulla stazione di ricarica
+    @staticmethod
+    def __animated_artists(env):
+        # ordine di disegno: griglia, zone di maltempo, stazioni occupate, bordi, etichette e titolo
+        return ([env.im] + env.weather_zone_patches + env.charging_station_patches + list(env.ax.spines.values()) +
+                env.drone_labels + env.delivery_points_labels + [env.warehouse_label] + env.charging_stations_labels +
+                [env.ax.title])
 
-        # aggiunge le nuove etichette per i droni
-        for i, drone_state in enumerate(env.drone_states):
-            x, y, battery_level, _, _, _, _, _, _, _, _, _ = drone_state
-            if (x, y) not in drone_positions_on_charging_stations:
-                # quando il drone si trova sul magazzino l'etichetta non viene renderizzata
-                if (x, y) != warehouse:
-                    env.drone_labels[i] = env.ax.text(y, x, f'D{i + 1}', ha='center', va='center', fontsize=FONT_SIZE_S,
-                                                      color='black', fontweight='bold')
-
-        # rimuove le etichette dei delivery point esistenti
-        for label in env.delivery_points_labels:
-            if label is not None:
-                label.remove()
-        env.delivery_points_labels = [None] * len(env.target_delivery_points)
-
-        # aggiunge le nuove etichette ai punti di consegna
-        for i, delivery_point in enumerate(env.target_delivery_points):
-            if delivery_point is not None:
-                x, y = delivery_point
-                label = env.ax.text(y, x, f'DP{i + 1}', ha='center', va='center', fontsize=FONT_SIZE_S, color='black',
-                                    fontweight='bold')
-                env.delivery_points_labels.append(label)
+    @staticmethod
+    def __save_background(env):
+        env.render_background = env.canvas.copy_from_bbox(env.canvas.figure.bbox)
+        DroneDeliveryRenderer.__draw_animated(env)
 
-        # label per il magazzino
-        warehouse_label_text = f"Warehouse\n({env.num_objects})"
-        drone_at_warehouse = next((f'D{i + 1}' for i, drone_state in enumerate(env.drone_states)
-                                   if (drone_state[0], drone_state[1]) == warehouse), None)
+    @staticmethod
+    def __draw_animated(env):
+        for artist in DroneDeliveryRenderer.__animated_artists(env):
+            env.ax.draw_artist(artist)
 
-        # quando il drone si trova sul magazzino
-        if drone_at_warehouse:
-            warehouse_label_text = f"Load\n({drone_at_warehouse})"
+    @staticmethod
+    def __blit(env):
+        if not env.im.get_animated():
+            env.canvas.draw()
+            return
 
-        if env.warehouse_label is None:
-            env.warehouse_label = env.ax.text(warehouse[1], warehouse[0], warehouse_label_text,
-                                              ha='center', va='center', fontsize=FONT_SIZE_S, color='black',
-                                              fontweight='bold')
+        # il primo frame disegna tutta la figura e ne salva lo sfondo, i successivi ridisegnano solo
+        # gli elementi animati sopra lo sfondo e copiano sul canvas la regione aggiornata
+        if env.render_background is None:
+            env.canvas.draw()
         else:
-            env.warehouse_label.set_text(warehouse_label_text)
-
-        # aggiunge le etichette per le stazioni di ricarica
-        for i, charging_station in enumerate(env.CHARGING_STATIONS):
-            x, y = charging_station
-            # verifica se un drone si trova sulla stazione di ricarica
-            drone_at_station = next((f'D{i + 1}' for i, drone_state in enumerate(env.drone_states)
-                                     if (drone_state[0], drone_state[1]) == charging_station), None)
-
-            if drone_at_station:
-                # mostra l'etichetta aggiornata per la stazione di ricarica con il numero del drone
-                label_text = f'Charge\n({drone_at_station})'
-            else:
-                # mostra etichetta normale per la stazione di ricarica
-                label_text = f'R{i + 1}'
-
-            if env.charging_stations_labels[i] is None:
-                env.charging_stations_labels[i] = (
-                    env.ax.text(y, x, label_text, ha='center', va='center', fontsize=FONT_SIZE_S, color='black',
-                                fontweight='bold'))
-            else:
-                env.charging_stations_labels[i].set_text(label_text)
-
-        # aggiorna il canvas per visualizzare i cambiamenti
-        env.canvas.draw()
-        env.root.update()
\ No newline at end of file
+            env.canvas.restore_region(env.render_background)
+            DroneDeliveryRenderer.__draw_animated(env)
+        env.canvas.blit(env.canvas.figure.bbox)
@@ -0,0 +1,132 @@
+import numpy as np
+
+from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+from DroneDeliveryFleet import DroneDeliveryFleet
+from DroneDeliveryRecorder import DroneDeliveryRecorder
+from DroneState import DroneState
+
+
+class DroneDeliveryReplay:
+    def __init__(self, records, training_mode=False):
+        # accetta i record in memoria oppure il percorso di un file .npy, che viene mappato in memoria
+        if isinstance(records, str):
+            records = np.load(records, mmap_mode='r')
+        self.records = records
+
+        kind = np.asarray(records['kind'])
+        self.resets = np.flatnonzero(kind == DroneDeliveryRecorder.RESET)
+        if len(self.resets) == 0:
+            raise ValueError("recording has no reset record")
+
+        # l'ambiente non viene mai eseguito: contiene solo lo stato ricostruito per il renderer; ogni drone parte
+        # dalla propria stazione di ricarica, quindi la flotta si ricava dagli stati iniziali del primo episodio
+        grid_size = (int(records['y'][self.resets[0]]), int(records['x'][self.resets[0]]))
+        first = self.resets[0] + 1
+        last = first
+        while last < len(kind) and kind[last] == DroneDeliveryRecorder.DRONE:
+            last += 1
+        stations = list(zip(np.asarray(records['y'][first:last]).tolist(),
+                            np.asarray(records['x'][first:last]).tolist()))
+        self.env = DroneDeliveryEnvironment(grid_size, training_mode=training_mode,
+                                            fleet=DroneDeliveryFleet(charging_stations=stations))
+
+        # indici precalcolati per ricostruire lo stato dopo un qualsiasi record senza rieseguire la simulazione
+        is_step = kind == DroneDeliveryRecorder.STEP
+        self.frames = np.flatnonzero(is_step)
+        self.step_counts = np.cumsum(is_step)  # numero di step fino al record i incluso
+
+        # per ogni drone, i record che ne contengono lo stato
+        drones = np.asarray(records['drone'])
+        has_state = is_step | (kind == DroneDeliveryRecorder.DRONE)
+        self.drone_rows = [np.flatnonzero(has_state & (drones == i)) for i in range(len(self.env.drone_states))]
+
+        # zone di maltempo: quelle create in uno step valgono dal record stesso con durata residua lifetime - 1,
+        # quelle già attive all'inizio dell'episodio con la durata registrata
+        zone_lifetime = np.asarray(records['zone_lifetime']).astype(np.int64)
+        spawned = is_step & (np.asarray(records['zone'][:, 0]) >= 0) & (zone_lifetime > 0)
+        restored = kind == DroneDeliveryRecorder.ZONE
+        self.zone_rows = np.flatnonzero(spawned | restored)
+        self.zone_remaining = np.where(spawned, zone_lifetime - 1, zone_lifetime)[self.zone_rows]
+
+        self.position = -1
+
+    def __len__(self):
+        return len(self.frames)
+
+    def seek(self, index):
+        # porta l'ambiente allo stato successivo al record index
+        records = self.records
+        self.position = index
+
+        for drone_index, rows in enumerate(self.drone_rows):
+            row = np.searchsorted(rows, index, side='right') - 1
+            if row < 0:
+                continue
+            record = records[rows[row]]
+            self.env.drone_states[drone_index] = self.__drone_state(record)
+            delivery_point = tuple(record['delivery_point'].tolist())
+            self.env.target_delivery_points[drone_index] = delivery_point if delivery_point[0] >= 0 else None
+            self.env.deliveries_completed[drone_index] = int(record['deliveries'])
+
+        self.env.num_objects = int(records['num_objects'][index])
+
+        # zone ancora attive: registrate dopo l'ultimo reset e non ancora scadute
+        last_reset = self.resets[np.searchsorted(self.resets, index, side='right') - 1]
+        first = np.searchsorted(self.zone_rows, last_reset)
+        last = np.searchsorted(self.zone_rows, index, side='right')
+        rows = self.zone_rows[first:last]
+        remaining = self.zone_remaining[first:last] - (self.step_counts[index] - self.step_counts[rows])
+        alive = remaining >= 0
+        zones = records['zone'][rows[alive]].tolist()
+        self.env.weather.set_zones([zone + [lifetime] for zone, lifetime in zip(zones, remaining[alive].tolist())])
+
+        return self.env
+
+    def seek_frame(self, frame):
+        # porta l'ambiente allo stato successivo allo step frame-esimo
+        return self.seek(int(self.frames[frame]))
+
+    def play(self, callback, start=0, stop=None, stride=1):
+        # ricostruisce uno step ogni stride e passa l'ambiente al callback, ad esempio DroneDeliveryRenderer.render
+        # oppure il capture() di un DroneDeliveryExporter
+        for frame in range(start, len(self.frames) if stop is None else stop, stride):
+            callback(self.seek_frame(frame))
+
+    def results(self, episode=-1):
+        # stesse statistiche della simulazione headless, calcolate dai record dell'episodio indicato
+        records = self.records
+        start = self.resets[episode]
+        end = self.resets[episode + 1] if episode != -1 and episode + 1 < len(self.resets) else len(records)
+
+        steps, deliveries, battery_failures, charging_steps, finished = [], [], [], [], []
+        for rows in self.drone_rows:
+            rows = rows[(rows >= start) & (rows < end)]
+            is_step = records['kind'][rows] == DroneDeliveryRecorder.STEP
+            last = records[rows[-1]]
+
+            # uno step è di ricarica se lo stato precedente del drone aveva il timer di ricarica attivo
+            charging = records['charging_timer'][rows[:-1]] > 0
+
+            steps.append(int(is_step.sum()))
+            deliveries.append(int(last['deliveries']))
+            battery_failures.append(bool(last['battery'] == 0))
+            charging_steps.append(int((charging & is_step[1:]).sum()))
+            finished.append(bool(last['done']) or bool(last['battery'] == 0))
+
+        return {
+            'ticks': max(steps),
+            'finished': all(finished),
+            'deliveries': deliveries,
+            'steps': steps,
+            'battery_failures': battery_failures,
+            'charging_steps': charging_steps,
+        }
+
+    @staticmethod
+    def __drone_state(record):
+        # il percorso di circumnavigazione e la distanza dal target non vengono registrati
+        flags = int(record['flags'])
+        obstacles = [1 if flags & bit else 0 for bit in DroneDeliveryRecorder.OBSTACLES]
+        return DroneState(int(record['y']), int(record['x']), int(record['battery']), *obstacles,
+                          bool(flags & DroneDeliveryRecorder.HAS_PACKAGE), float(record['charging_timer']),
+                          int(record['relative_target']), 1 if flags & DroneDeliveryRecorder.CIRCUMNAVIGATE else 0)
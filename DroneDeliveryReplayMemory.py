@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class DroneDeliveryReplayMemory:
+    def __init__(self, capacity=10000, seed=None):
+        if capacity < 1:
+            raise ValueError("replay memory capacity must be at least 1")
+
+        # buffer circolare: le transizioni più vecchie vengono sovrascritte quando è pieno
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)  # indici piatti degli stati (encode_state)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.position = 0
+        self.size = 0
+
+        # generatore separato, così il campionamento non altera la sequenza casuale dell'ambiente
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state_index, action, reward, next_state_index):
+        position = self.position
+        self.states[position] = state_index
+        self.actions[position] = action
+        self.rewards[position] = reward
+        self.next_states[position] = next_state_index
+
+        self.position = (position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        # campiona uniformemente (con ripetizione) tra le transizioni memorizzate
+        indices = self.rng.integers(0, self.size, size=batch_size)
+        return self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices]
+
+    def clear(self):
+        self.position = 0
+        self.size = 0
@@ -1,34 +1,73 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import tkinter as tk
+import random
+import sys
 
 from DroneDeliveryEnvironment import DroneDeliveryEnvironment
-from DroneDeliveryRenderer import DroneDeliveryRenderer
 
 
 class DroneDeliverySimulation:
-    def __init__(self, env, root):
+    def __init__(self, env, root=None, recorder=None, synchronous=False):
+        # con synchronous tutti i droni si muovono insieme ad ogni tick (env.step_all()), con un solo
+        # aggiornamento del maltempo; il recorder registra invece uno step alla volta
+        if synchronous and recorder is not None:
+            raise ValueError("synchronous simulations cannot be recorded")
+
         self.env = env  # inizializza l'ambiente
-        self.root = root # inizializza l'istanza dell'interfaccia grafica
-        self.states = env.reset()  # inizializza lo stato dei droni
-        self.done = [False, False, False]  # stato di completamento per ciascun drone
+        self.root = root # inizializza l'istanza dell'interfaccia grafica (None se la simulazione è headless)
+        self.recorder = recorder  # se presente, registra ogni step della simulazione
+        self.synchronous = synchronous
+        self.states = (recorder or env).reset()  # inizializza lo stato dei droni
+        self.done = [False] * len(self.states)  # stato di completamento per ciascun drone
         self.env.epsilon = 0  # impostato a zero per annullare l'esplorazione durante la simulazione
 
+        # statistiche raccolte durante la simulazione
+        self.ticks = 0  # numero di step della simulazione (uno step per ogni drone ancora attivo)
+        self.steps = [0] * len(self.states)
+        self.charging_steps = [0] * len(self.states)
+        self.battery_failures = [False] * len(self.states)
+
+    def __step_drones(self):
+        # esegue uno step per ogni drone che non ha ancora terminato e ritorna quelli con la batteria esaurita
+        depleted = []
+
+        # le azioni dei droni attivi vengono scelte insieme: ogni drone modifica solo il proprio stato
+        active = [i for i in range(len(self.states)) if not self.done[i]]
+        actions = self.env.choose_actions([self.states[i] for i in active])
+
+        if self.synchronous:
+            tick_actions = [None] * len(self.states)
+            for i, action in zip(active, actions):
+                tick_actions[i] = action
+            next_states, _, dones = self.env.step_all(tick_actions)
+
+        for i, action in zip(active, actions):
+            if self.states[i][8] > 0:  # il drone passa questo step in ricarica
+                self.charging_steps[i] += 1
+
+            if self.synchronous:
+                next_state, done = next_states[i], dones[i]
+            else:
+                next_state, reward, done = (self.recorder or self.env).step(i, action)  # esegue uno step per il drone i-esimo
+            self.states[i] = next_state
+            self.done[i] = done
+            self.steps[i] += 1
+
+            if self.states[i][2] == 0:  # se la batteria è esaurita
+                self.done[i] = True
+                self.battery_failures[i] = True
+                depleted.append(i)
+
+        self.ticks += 1
+        return depleted
+
     def __step_simulation(self):
         if not all(self.done):
-            for i in range(len(self.states)):
-                if not self.done[i]:  # controlla se il drone ha già terminato
-                    action = self.env.choose_action(self.states[i])  # azione basata sullo stato del drone i-esimo
-                    next_state, reward, done = self.env.step(i, action)  # esegue uno step per il drone i-esimo
-                    self.states[i] = next_state
-                    self.done[i] = done
-
-                    if self.states[i][2] == 0:  # se la batteria è esaurita
-                        print(f"Battery depleted for Drone {i+1}. Ending simulation for this drone. State: {self.states[i]}")
-                        self.done[i] = True
-
-            # aggiorna la GUI e richiama il prossimo step
+            for i in self.__step_drones():
+                print(f"Battery depleted for Drone {i+1}. Ending simulation for this drone. State: {self.states[i]}")
+
+            # aggiorna la GUI e richiama il prossimo step; il renderer (e matplotlib) viene importato solo dalla
+            # simulazione grafica, così i processi headless non ne pagano il costo
+            from DroneDeliveryRenderer import DroneDeliveryRenderer
             DroneDeliveryRenderer.render(self.env)
             self.root.after(300, self.__step_simulation)
         else:
@@ -37,8 +76,109 @@ class DroneDeliverySimulation:
     def run(self):
         self.root.after(0, self.__step_simulation)
 
-def main():
-    grid_size = (7, 7)
+    def run_headless(self, max_ticks=None, exporter=None):
+        # stessa logica della simulazione grafica, senza attese tra uno step e l'altro; i frame vengono
+        # disegnati solo se è presente un exporter fuori schermo
+        while not all(self.done) and (max_ticks is None or self.ticks < max_ticks):
+            self.__step_drones()
+            if exporter is not None:
+                exporter.capture()
+
+        return self.results()
+
+    def results(self):
+        return {
+            'ticks': self.ticks,
+            'finished': all(self.done),
+            'deliveries': list(self.env.deliveries_completed),
+            'steps': list(self.steps),
+            'battery_failures': list(self.battery_failures),
+            'charging_steps': list(self.charging_steps),
+        }
+
+    @staticmethod
+    def make_environment(q_table, grid_size=(7, 7), fleet=None, state_encoder=None, **kwargs):
+        # ambiente di inferenza con la q-table indicata, nella sua precisione; i record di una q-table sparsa
+        # restano sparsi, così anche le codifiche con molti stati vengono simulate senza espanderle
+        sparse = q_table.dtype.names is not None
+        env = DroneDeliveryEnvironment(grid_size, training_mode=False, fleet=fleet, state_encoder=state_encoder,
+                                       q_table_storage='sparse' if sparse else 'dense',
+                                       q_table_dtype=q_table.dtype['q_values'].base if sparse else q_table.dtype,
+                                       **kwargs)
+        env.set_q_table(q_table)
+        return env
+
+    @staticmethod
+    def evaluate(q_table, grid_size=(7, 7), num_runs=1, seed=0, max_ticks=10000, fleet=None, state_encoder=None,
+                 synchronous=False):
+        # esegue più simulazioni headless con la stessa q-table, ognuna con un proprio seed
+        results = []
+        for run in range(num_runs):
+            random.seed(seed + run)
+            np.random.seed(seed + run)
+
+            env = DroneDeliverySimulation.make_environment(q_table, grid_size, fleet, state_encoder)
+            simulation = DroneDeliverySimulation(env, synchronous=synchronous)
+
+            result = simulation.run_headless(max_ticks)
+            result['seed'] = seed + run
+            results.append(result)
+
+        return results
+
+def main_headless(num_runs=10, grid_size=(7, 7), q_table_path="q_table.npy", fleet=None, export=None, record=None,
+                  seed=0, max_ticks=10000, state_encoder=None, synchronous=False, stride=1):
+    # simulazione senza interfaccia grafica, utilizzabile in CI e nei job batch
+    try:
+        q_table = np.load(q_table_path)
+    except FileNotFoundError:
+        print("Error: q-table not found.")
+        return
+
+    # con export (un percorso) registra la prima simulazione in un file o in una cartella di immagini, un frame
+    # ogni stride step; con record (un percorso) registra ogni step della prima simulazione in un file .npy.
+    # Se sono indicati entrambi, exporter e recorder seguono la stessa simulazione
+    if export is not None or record is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+        env = DroneDeliverySimulation.make_environment(q_table, grid_size, fleet, state_encoder)
+
+        recorder = None
+        if record is not None:
+            from DroneDeliveryRecorder import DroneDeliveryRecorder
+            recorder = DroneDeliveryRecorder(env, record)
+
+        exporter = None
+        if export is not None:
+            from DroneDeliveryExporter import DroneDeliveryExporter
+            exporter = DroneDeliveryExporter(env, export, stride)
+
+        try:
+            result = DroneDeliverySimulation(env, recorder=recorder, synchronous=synchronous).run_headless(max_ticks,
+                                                                                                           exporter)
+        finally:
+            if exporter is not None:
+                exporter.close()
+
+        if exporter is not None:
+            print(f"Exported {exporter.frames} frames to '{exporter.path}'. {result}")
+        if recorder is not None:
+            print(f"Recorded {len(recorder.close())} records to '{recorder.path}'. {result}")
+        return
+
+    results = DroneDeliverySimulation.evaluate(q_table, grid_size, num_runs, seed, max_ticks, fleet, state_encoder,
+                                               synchronous)
+    for result in results:
+        print(result)
+
+    print(f"Average deliveries: {np.mean([sum(r['deliveries']) for r in results])}, "
+          f"battery failures: {sum(sum(r['battery_failures']) for r in results)}")
+
+def main(grid_size=(7, 7), q_table_path="q_table.npy", fleet=None, state_encoder=None, synchronous=False):
+    # l'interfaccia grafica viene importata solo quando serve
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    import tkinter as tk
 
     root = tk.Tk()
     root.title("Drone Delivery Simulation")
@@ -47,19 +187,20 @@ def main():
     canvas = FigureCanvasTkAgg(fig, master=root)
     canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
 
-    # crea l'istanza dell'ambiente
-    env = DroneDeliveryEnvironment(grid_size, root=root, canvas=canvas, ax=ax, training_mode=False)
-
     # carica la q-table
     try:
-        env.Q_table = np.load("q_table.npy")
+        q_table = np.load(q_table_path)
         print("Q-table loaded successfully.")
     except FileNotFoundError:
         print("Error: q-table not found.")
         return
 
+    # crea l'istanza dell'ambiente
+    env = DroneDeliverySimulation.make_environment(q_table, grid_size, fleet, state_encoder, root=root, canvas=canvas,
+                                                   ax=ax)
+
     # inizializza la simulazione con l'ambiente
-    simulation = DroneDeliverySimulation(env, root)
+    simulation = DroneDeliverySimulation(env, root, synchronous=synchronous)
 
     print("Starting simulation...")
     # avvia la simulazione
@@ -70,4 +211,14 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    # con --synchronous tutti i droni si muovono insieme ad ogni tick
+    synchronous = "--synchronous" in sys.argv
+    if "--headless" in sys.argv:
+        # con --export <percorso> esporta i frame (uno ogni --stride <n> step), con --record <percorso> registra
+        # gli step della simulazione
+        export = sys.argv[sys.argv.index("--export") + 1] if "--export" in sys.argv else None
+        record = sys.argv[sys.argv.index("--record") + 1] if "--record" in sys.argv else None
+        stride = int(sys.argv[sys.argv.index("--stride") + 1]) if "--stride" in sys.argv else 1
+        main_headless(export=export, record=record, synchronous=synchronous, stride=stride)
+    else:
+        main(synchronous=synchronous)
@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class DroneDeliverySparseQTable:
+    def __init__(self, num_states, num_actions, dtype=np.float64, capacity=256):
+        # memorizza solo le righe degli stati incontrati: una tabella hash associa l'indice dello stato alla sua
+        # riga in un blocco contiguo di q-values, che raddoppia quando si riempie
+        self.num_states = num_states
+        self.num_actions = num_actions
+        self.dtype = np.dtype(dtype)
+        self.rows = {}
+        self.states = np.zeros(capacity, dtype=np.int64)  # indice dello stato di ogni riga
+        self.values = np.zeros((capacity, num_actions), dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, state_index):
+        # riga dello stato, creata (a zero) la prima volta che viene richiesta; la vista resta valida fino alla
+        # creazione di una nuova riga, che può riallocare il blocco
+        row = self.row_index(state_index)
+        return self.values[row]
+
+    def row_index(self, state_index):
+        row = self.rows.get(state_index)
+        if row is None:
+            if not 0 <= state_index < self.num_states:
+                raise IndexError(f"state index {state_index} out of range for {self.num_states} states")
+            row = len(self.rows)
+            if row == len(self.values):
+                self.__grow()
+            self.rows[state_index] = row
+            self.states[row] = state_index
+        return row
+
+    def row_indices(self, state_indices):
+        return np.fromiter((self.row_index(int(state_index)) for state_index in state_indices), dtype=np.int64,
+                           count=len(state_indices))
+
+    def greedy_policy(self):
+        # azione migliore per ogni riga memorizzata, nell'ordine delle righe, -1 se i q-values sono tutti nulli;
+        # gli stati senza riga non sono mai stati aggiornati (int8 per contenere la memoria)
+        values = self.values[:len(self.rows)]
+        return np.where(values.sum(axis=1) == 0, -1, np.argmax(values, axis=1)).astype(np.int8)
+
+    def greedy_action(self, policy, state_index):
+        # azione di greedy_policy() per lo stato; le righe create dopo il calcolo della politica sono ancora nulle
+        row = self.rows.get(state_index)
+        if row is None or row >= len(policy):
+            return -1
+        return policy.item(row)
+
+    def snapshot(self):
+        # copia degli stati memorizzati e dei loro q-values, confrontabile anche con la tabella ricaricata da un
+        # checkpoint, in cui le righe sono in un altro ordine
+        size = len(self.rows)
+        return self.states[:size].copy(), self.values[:size].copy()
+
+    def abs_diff(self, snapshot):
+        # variazione assoluta massima e media rispetto a snapshot(), calcolata solo sulle righe memorizzate: quelle
+        # create dopo lo snapshot partivano da zero e gli stati senza riga non sono cambiati
+        states, values = snapshot
+        rows, created = self.__match_rows(states)
+        previous = np.abs(self.values[rows] - values)
+        created = np.abs(self.values[:len(self.rows)][created])
+        delta_max = max(previous.max(initial=0.0), created.max(initial=0.0))
+        delta_sum = previous.sum(dtype=np.float64) + created.sum(dtype=np.float64)
+        return float(delta_max), float(delta_sum / (self.num_states * self.num_actions))
+
+    def policy_changes(self, policy, states, actions):
+        # stati in cui l'azione di greedy_policy() è cambiata rispetto alle azioni precedenti degli stati indicati;
+        # gli stati memorizzati in seguito avevano azione -1
+        rows, created = self.__match_rows(states)
+        return int(np.count_nonzero(policy[rows] != actions) + np.count_nonzero(policy[created[:len(policy)]] != -1))
+
+    def __match_rows(self, states):
+        # righe attuali degli stati indicati e maschera delle righe memorizzate dopo di loro
+        rows = self.row_indices(states)
+        created = np.ones(len(self.rows), dtype=bool)
+        created[rows] = False
+        return rows, created
+
+    def to_records(self):
+        # righe memorizzate in ordine di stato, come array strutturato salvabile con np.save
+        size = len(self.rows)
+        order = np.argsort(self.states[:size], kind='stable')
+        records = np.zeros(size, dtype=[('state', np.int64), ('q_values', self.dtype, (self.num_actions,))])
+        records['state'] = self.states[:size][order]
+        records['q_values'] = self.values[:size][order]
+        return records
+
+    def to_dense(self):
+        dense = np.zeros((self.num_states, self.num_actions), dtype=self.dtype)
+        size = len(self.rows)
+        dense[self.states[:size]] = self.values[:size]
+        return dense
+
+    def __grow(self):
+        capacity = 2 * len(self.values)
+        states = np.zeros(capacity, dtype=np.int64)
+        states[:len(self.states)] = self.states
+        values = np.zeros((capacity, self.num_actions), dtype=self.dtype)
+        values[:len(self.values)] = self.values
+        self.states, self.values = states, values
+
+    @staticmethod
+    def from_records(records, num_states, num_actions, dtype=np.float64):
+        table = DroneDeliverySparseQTable(num_states, num_actions, dtype, capacity=max(len(records), 1))
+        for state_index, q_values in zip(records['state'].tolist(), records['q_values']):
+            table[state_index][:] = q_values
+        return table
+
+    @staticmethod
+    def from_dense(q_table, dtype=np.float64):
+        # converte una q-table densa mantenendo solo gli stati con almeno un q-value non nullo
+        q_table = q_table.reshape(-1, q_table.shape[-1])
+        visited = np.flatnonzero(np.any(q_table != 0, axis=1))
+        table = DroneDeliverySparseQTable(len(q_table), q_table.shape[-1], dtype, capacity=max(len(visited), 1))
+        for state_index in visited.tolist():
+            table[state_index][:] = q_table[state_index]
+        return table
@@ -0,0 +1,94 @@
+from bisect import bisect_right
+import numpy as np
+
+
+class DroneDeliveryStateEncoder:
+    # assi della codifica originale: ostacoli (su, giù, sinistra, destra), posizione relativa del target e
+    # circumnavigazione
+    LEGACY_SHAPE = (2, 2, 2, 2, 5, 2)
+
+    def __init__(self, battery_buckets=1, has_package=False, distance_edges=(), grid_size=None, battery_levels=40):
+        # le caratteristiche aggiuntive vengono accodate agli assi originali, così con i valori di default la
+        # codifica coincide con quella della q-table originale
+        if battery_buckets < 1:
+            raise ValueError("battery_buckets must be at least 1")
+        if list(distance_edges) != sorted(distance_edges):
+            raise ValueError("distance_edges must be sorted")
+
+        self.battery_buckets = battery_buckets  # intervalli uguali del livello di batteria (1 = non usato)
+        self.battery_levels = battery_levels
+        self.has_package = has_package  # pacco a bordo
+        self.distance_edges = tuple(distance_edges)  # soglie della distanza (Manhattan) dal target
+        self.grid_size = tuple(grid_size) if grid_size is not None else None  # posizione assoluta del drone
+
+        shape = list(self.LEGACY_SHAPE)
+        if battery_buckets > 1:
+            shape.append(battery_buckets)
+        if has_package:
+            shape.append(2)
+        if self.distance_edges:
+            shape.append(len(self.distance_edges) + 1)
+        if self.grid_size is not None:
+            shape.extend(self.grid_size)
+
+        self.shape = tuple(shape)
+        self.num_states = 1
+        for size in self.shape:
+            self.num_states *= size
+        self.extended = self.shape != self.LEGACY_SHAPE
+
+    def encode(self, state):
+        # indice piatto dello stato, nello stesso ordine degli assi di shape
+        index = ((((state[3] * 2 + state[4]) * 2 + state[5]) * 2 + state[6]) * 5 + state[9]) * 2 + \
+            (1 if state[10] else 0)
+        if not self.extended:
+            return index
+
+        if self.battery_buckets > 1:
+            bucket = max(state[2], 0) * self.battery_buckets // self.battery_levels
+            index = index * self.battery_buckets + min(bucket, self.battery_buckets - 1)
+        if self.has_package:
+            index = index * 2 + (1 if state[7] else 0)
+        if self.distance_edges:
+            index = index * (len(self.distance_edges) + 1) + bisect_right(self.distance_edges, state.target_distance)
+        if self.grid_size is not None:
+            index = (index * self.grid_size[0] + state[0]) * self.grid_size[1] + state[1]
+        return index
+
+    def encode_batch(self, y, x, battery_level, obstacles, has_package, relative_target, circumnavigate,
+                     target_distance):
+        # versione vettoriale di encode() per array numpy con un elemento per stato (obstacles con le quattro
+        # direzioni su, giù, sinistra, destra sull'ultimo asse)
+        index = ((((obstacles[..., 0] * 2 + obstacles[..., 1]) * 2 + obstacles[..., 2]) * 2 + obstacles[..., 3]) * 5 +
+                 relative_target) * 2 + circumnavigate.astype(np.int64)
+        if not self.extended:
+            return index
+
+        if self.battery_buckets > 1:
+            bucket = np.maximum(battery_level, 0) * self.battery_buckets // self.battery_levels
+            index = index * self.battery_buckets + np.minimum(bucket, self.battery_buckets - 1)
+        if self.has_package:
+            index = index * 2 + has_package.astype(np.int64)
+        if self.distance_edges:
+            index = index * (len(self.distance_edges) + 1) + np.searchsorted(self.distance_edges, target_distance,
+                                                                             side='right')
+        if self.grid_size is not None:
+            index = (index * self.grid_size[0] + y) * self.grid_size[1] + x
+        return index
+
+    def config(self):
+        # parametri del costruttore, ad esempio per salvarli in un file di configurazione
+        return {'battery_buckets': self.battery_buckets, 'has_package': self.has_package,
+                'distance_edges': list(self.distance_edges),
+                'grid_size': list(self.grid_size) if self.grid_size is not None else None,
+                'battery_levels': self.battery_levels}
+
+    def __eq__(self, other):
+        return isinstance(other, DroneDeliveryStateEncoder) and self.config() == other.config()
+
+    def __repr__(self):
+        return f"DroneDeliveryStateEncoder(shape={self.shape})"
+
+    @staticmethod
+    def legacy():
+        return DroneDeliveryStateEncoder()
@@ -0,0 +1,170 @@
+import itertools
+import json
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from DroneDeliveryConvergence import DroneDeliveryConvergence
+from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+from DroneDeliveryFleet import DroneDeliveryFleet
+from DroneDeliveryReplayMemory import DroneDeliveryReplayMemory
+from DroneDeliveryStateEncoder import DroneDeliveryStateEncoder
+from DroneDeliveryTrainer import DroneDeliveryTrainer
+
+
+def run_training(config):
+    # esegue un addestramento completo in un processo separato: ogni run ha il proprio seed, così i risultati
+    # non dipendono dal processo che lo esegue né dall'ordine in cui i run vengono completati
+    random.seed(config['seed'])
+    np.random.seed(config['seed'])
+
+    # state_encoder (un dizionario di parametri di DroneDeliveryStateEncoder) estende la codifica degli stati
+    state_encoder = None
+    if config['state_encoder']:
+        state_encoder = DroneDeliveryStateEncoder(**config['state_encoder'])
+
+    env = DroneDeliveryEnvironment(tuple(config['grid_size']), config['epsilon'], training_mode=True,
+                                   fleet=DroneDeliverySweep.make_fleet(config), state_encoder=state_encoder, q_table_storage=config['q_table_storage'],
+                                   q_table_dtype=config['q_table_dtype'])
+
+    # replay_size pari a 0 mantiene l'aggiornamento ad ogni step
+    replay_memory = None
+    if config['replay_size'] > 0:
+        replay_memory = DroneDeliveryReplayMemory(int(config['replay_size']), seed=config['seed'])
+
+    trainer = DroneDeliveryTrainer(env, num_episodes=config['num_episodes'], alpha=config['alpha'],
+                                   gamma=config['gamma'], epsilon=config['epsilon'],
+                                   epsilon_decay=config['epsilon_decay'], replay_memory=replay_memory,
+                                   batch_size=int(config['batch_size']), update_every=int(config['update_every']),
+                                   multi_agent=config['multi_agent'], keep_rewards=True)
+
+    # con convergence (un dizionario di parametri di DroneDeliveryConvergence) il run si ferma appena converge
+    convergence = None
+    if config['convergence']:
+        convergence = DroneDeliveryConvergence(**config['convergence'])
+
+    # niente grafico né salvataggio: la q-table viene restituita al processo principale
+    rewards = trainer.train(q_table_path=None, plot=False, verbose=False, convergence=convergence)
+
+    config = dict(config, episodes=len(rewards), stop_reason=trainer.stop_reason)
+    return config, np.array(rewards, dtype=np.float64), env.q_table_array()
+
+
+class DroneDeliverySweep:
+    # valori di default degli iperparametri che non vengono esplorati
+    DEFAULTS = {'alpha': 0.1, 'gamma': 0.9, 'epsilon': 0.5, 'epsilon_decay': 0.997, 'replay_size': 0,
+                'batch_size': 32, 'update_every': 4, 'convergence': None,
+                'multi_agent': False, 'num_drones': None, 'state_encoder': None, 'q_table_storage': 'dense', 'q_table_dtype': 'float64'}
+
+    def __init__(self, grid_size=(5, 5), num_episodes=4000, seeds=(0,), output_dir="sweep", max_workers=None,
+                 score_window=100):
+        self.grid_size = grid_size
+        self.num_episodes = num_episodes
+        self.seeds = list(seeds)
+        self.output_dir = output_dir
+        self.max_workers = max_workers or os.cpu_count()
+        self.score_window = score_window  # numero di episodi finali su cui viene calcolato il punteggio
+
+    def grid_search(self, param_grid):
+        # tutte le combinazioni dei valori indicati, ripetute per ogni seed
+        names = list(param_grid)
+        combinations = [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+        return self.__make_configs(combinations)
+
+    def random_search(self, param_ranges, num_samples, seed=0):
+        # campiona uniformemente ogni iperparametro nel suo intervallo (min, max), oppure da una lista di valori
+        rng = random.Random(seed)
+        combinations = []
+        for _ in range(num_samples):
+            combination = {}
+            for name, values in param_ranges.items():
+                if isinstance(values, tuple):
+                    combination[name] = rng.uniform(*values)
+                else:
+                    combination[name] = rng.choice(values)
+            combinations.append(combination)
+        return self.__make_configs(combinations)
+
+    def __make_configs(self, combinations):
+        configs = []
+        for combination in combinations:
+            for seed in self.seeds:
+                config = dict(self.DEFAULTS)
+                config.update(combination)
+                config.update({'seed': seed, 'grid_size': list(self.grid_size), 'num_episodes': self.num_episodes})
+                configs.append(config)
+        return configs
+
+    @staticmethod
+    def make_fleet(config):
+        # num_drones a None usa la flotta originale con le tre stazioni di ricarica
+        if config['num_drones'] is None:
+            return None
+        return DroneDeliveryFleet(int(config['num_drones']))
+
+    @staticmethod
+    def check_config(config):
+        # con multi_agent tutti i droni si muovono: le loro stazioni di ricarica devono essere nella griglia. Il
+        # controllo avviene prima di avviare i processi, invece di fallire dentro un worker
+        if config['multi_agent']:
+            fleet = DroneDeliverySweep.make_fleet(config) or DroneDeliveryFleet.legacy()
+            fleet.check_grid(config['grid_size'])
+
+    def run(self, configs):
+        for run, config in enumerate(configs):
+            try:
+                DroneDeliverySweep.check_config(config)
+            except ValueError as e:
+                raise ValueError(f"invalid configuration for run {run}: {e}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        results = []
+
+        # distribuisce gli addestramenti su tutti i core disponibili; i run sono numerati qui, così restano distinti
+        # anche unendo le configurazioni di più ricerche
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(run_training, dict(config, run=run)) for run, config in enumerate(configs)]
+            for future in as_completed(futures):
+                config, rewards, q_table = future.result()
+
+                # salva curva delle ricompense e q-table finale di ogni run
+                name = f"run_{config['run']:04d}"
+                np.save(os.path.join(self.output_dir, f"{name}_rewards.npy"), rewards)
+                np.save(os.path.join(self.output_dir, f"{name}_q_table.npy"), q_table)
+
+                result = dict(config)
+                result['score'] = float(np.mean(rewards[-self.score_window:]))
+                result['rewards'] = f"{name}_rewards.npy"
+                result['q_table'] = f"{name}_q_table.npy"
+                results.append(result)
+
+                print(f"Run {config['run'] + 1}/{len(configs)} complete, Score: {result['score']}")
+
+        # ordina i run dal punteggio migliore al peggiore e scrive il riepilogo
+        results.sort(key=lambda r: (-r['score'], r['run']))
+        with open(os.path.join(self.output_dir, "summary.json"), "w") as summary_file:
+            json.dump(results, summary_file, indent=2)
+
+        return results
+
+
+def main():
+    sweep = DroneDeliverySweep(grid_size=(5, 5), num_episodes=4000, seeds=(0, 1, 2))
+    configs = sweep.grid_search({
+        'alpha': [0.05, 0.1, 0.2],
+        'gamma': [0.8, 0.9, 0.95],
+        'epsilon': [0.5, 1.0],
+        'epsilon_decay': [0.995, 0.997, 0.999],
+    })
+
+    print(f"Starting sweep with {len(configs)} runs...")
+    results = sweep.run(configs)
+
+    print("Best configurations:")
+    for result in results[:5]:
+        print(f"alpha={result['alpha']} gamma={result['gamma']} epsilon={result['epsilon']} "
+              f"decay={result['epsilon_decay']} seed={result['seed']} score={result['score']}")
+
+
+if __name__ == "__main__":
+    main()
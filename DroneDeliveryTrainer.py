@@ -1,73 +1,248 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
+import time
+from DroneDeliveryCheckpoint import DroneDeliveryCheckpoint
+from DroneDeliveryConvergence import DroneDeliveryConvergence
 from DroneDeliveryEnvironment import DroneDeliveryEnvironment
+from DroneDeliveryMetrics import DroneDeliveryMetrics
 
 class DroneDeliveryTrainer:
-    def __init__(self, env, num_episodes=4000, alpha=0.1, gamma=0.9, epsilon=0.5):
+    def __init__(self, env, num_episodes=4000, alpha=0.1, gamma=0.9, epsilon=0.5, epsilon_decay=0.997,
+                 replay_memory=None, batch_size=32, update_every=4, metrics=None, keep_rewards=False,
+                 multi_agent=False, transition_sink=None):
         self.env = env
         self.num_episodes = num_episodes
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        self.epsilon_decay = epsilon_decay
+
+        # con una replay memory le transizioni vengono memorizzate e la q-table è aggiornata ogni update_every
+        # step con un minibatch di batch_size transizioni, invece che ad ogni step
+        self.replay_memory = replay_memory
+        self.batch_size = batch_size
+        self.update_every = update_every
+        self.total_steps = 0
+        self.episode = 0  # episodi completati, ripristinato da resume()
+        self.rewards_per_episode = []
+        self.stop_reason = None
+
+        # criterio di convergenza dell'addestramento in corso e, dopo resume(), lo stato salvato nel checkpoint
+        self.convergence = None
+        self.convergence_state = None
+
+        # le statistiche degli episodi confluiscono in metrics, che può scriverle su file, e la memoria resta
+        # costante; solo con keep_rewards train() mantiene e ritorna anche la lista delle ricompense
+        self.metrics = metrics if metrics is not None else DroneDeliveryMetrics()
+        self.keep_rewards = keep_rewards
+
+        # in modalità multi-agente tutti i droni si muovono ad ogni tick, come nella simulazione, e aggiornano la
+        # stessa q-table, quindi tutte le stazioni devono essere nella griglia; altrimenti viene addestrato solo
+        # il drone 0
+        if multi_agent:
+            env.fleet.check_grid(env.grid_size)
+        self.multi_agent = multi_agent
+
+        # se indicato, ogni transizione viene passata a transition_sink (ad esempio per inviarla a un processo
+        # learner) invece di aggiornare la q-table
+        self.transition_sink = transition_sink
         self.env.epsilon = epsilon  # sincronizza l'epsilon dell'ambiente
-
-    def train(self):
-        rewards_per_episode = []
-
-        for episode in range(self.num_episodes):
-            state = self.env.reset()[0]  # reset del drone al suo stato iniziale
-            done = False  # stato di completamento del drone
-            total_reward = 0
-
-            while not done:
-                action = self.env.choose_action(state)  # sceglie l'azione
-                next_state, reward, done = self.env.step(0, action)  # esegue uno step
-
-                # Aggiorna la q-table
-                self.env.update_q_table(state, action, reward, next_state)
-
-                state = next_state
-                total_reward += reward
-
-                # batteria scarica
-                if next_state[2] == 0:
-                    done = True
-                    #print(
-                    #    f"Battery depleted for Drone in episode {episode}. State: {next_state}")
-
-            rewards_per_episode.append(total_reward)
+        self.env.alpha = alpha  # sincronizza i parametri di apprendimento usati dall'ambiente
+        self.env.gamma = gamma
+
+    def resume(self, checkpoint):
+        # riprende dall'ultimo checkpoint salvato; ritorna False se non ce n'è uno
+        if not checkpoint.restore(self):
+            return False
+        # con keep_rewards la storia delle ricompense viene riletta dal file delle metriche
+        self.rewards_per_episode = self.metrics.rewards() if self.keep_rewards else []
+        return True
+
+    def train(self, q_table_path="q_table.npy", plot=None, verbose=True, checkpoint=None, convergence=None):
+        rewards_per_episode = self.rewards_per_episode
+        if checkpoint is not None:
+            checkpoint.attach(self.env)
+        if convergence is not None:
+            convergence.start(self)
+        self.convergence = convergence
+        self.convergence_state = None
+        self.stop_reason = None
+
+        for episode in range(self.episode, self.num_episodes):
+            episode_start = time.perf_counter()
+            total_reward, steps, deliveries, battery_failure = self.run_episode()
+
+            if self.keep_rewards:
+                rewards_per_episode.append(total_reward)
+            self.metrics.record(episode, total_reward, steps, deliveries, self.epsilon, battery_failure,
+                                time.perf_counter() - episode_start)
 
             # riduce il valore di epsilon gradualmente, per favorire l'addestramento
-            self.epsilon = max(0.01, self.epsilon * 0.997)
+            self.epsilon = max(0.01, self.epsilon * self.epsilon_decay)
             # aggiorna epsilon nell'ambiente
             self.env.epsilon = self.epsilon
+            self.episode = episode + 1
+
+            # valuta la convergenza prima del checkpoint, così lo stato salvato include l'episodio appena concluso
+            converged = convergence is not None and convergence.update(self)
+
+            # salva periodicamente lo stato dell'addestramento, così un'interruzione perde al più every episodi
+            if checkpoint is not None and self.episode % checkpoint.every == 0:
+                checkpoint.save(self)
+
+            # interrompe l'addestramento se la q-table, la politica o le ricompense si sono stabilizzate
+            if converged:
+                self.stop_reason = convergence.stop_reason
+                break
 
             # print(f"Episode {episode}/{self.num_episodes} complete, total_reward Reward: {total_reward}")
-            if episode % 100 == 0:
-                avg_reward = np.mean(rewards_per_episode[-100:])
+            if verbose and episode % 100 == 0:
+                avg_reward = self.metrics.moving_average()
                 print(f"Episode {episode}/{self.num_episodes} complete, Average Reward: {avg_reward}")
 
-        # salva la q-table al termine dell'addestramento
-        np.save("q_table.npy", self.env.Q_table)
-        print("Q-table salvata come 'q_table.npy'.")
+        if self.stop_reason is None:
+            self.stop_reason = f"episode budget reached ({self.num_episodes} episodes)"
+        if verbose:
+            print(f"Training stopped: {self.stop_reason}")
+
+        # salva la q-table al termine dell'addestramento, sostituendo il file precedente solo a scrittura completata
+        if q_table_path is not None:
+            DroneDeliveryCheckpoint.atomic_save(q_table_path, self.env.q_table_array())
+            print(f"Q-table salvata come '{q_table_path}'.")
+
+        self.metrics.flush()
+
+        # rappresenta i risultati dell'addestramento graficamente: plot indica il file in cui salvare il grafico,
+        # disegnato fuori schermo, mentre True apre la finestra interattiva
+        if plot is True:
+            self.__plot_rewards(self.metrics)
+        elif plot:
+            DroneDeliveryMetrics.plot(self.metrics, plot)
+
+        return rewards_per_episode
+
+    def run_episode(self):
+        # esegue un episodio con l'epsilon corrente dell'ambiente e ritorna ricompensa totale, step, consegne e
+        # se la batteria di un drone si è esaurita
+        if self.multi_agent:
+            total_reward, steps, battery_failure = self.__run_fleet_episode()
+            return total_reward, steps, sum(self.env.deliveries_completed), battery_failure
+
+        total_reward, steps, battery_failure = self.__run_episode()
+        return total_reward, steps, self.env.deliveries_completed[0], battery_failure
+
+    def __run_episode(self):
+        state = self.env.reset()[0]  # reset del drone al suo stato iniziale
+        done = False  # stato di completamento del drone
+        total_reward = 0
+        steps = 0
+
+        while not done:
+            action = self.env.choose_action(state)  # sceglie l'azione
+            next_state, reward, done = self.env.step(0, action)  # esegue uno step
+
+            # Aggiorna la q-table
+            self.__learn(state, action, reward, next_state)
+
+            state = next_state
+            total_reward += reward
+            steps += 1
+
+            # batteria scarica
+            if next_state[2] == 0:
+                done = True
+
+        return total_reward, steps, state[2] == 0
+
+    def __run_fleet_episode(self):
+        # ad ogni tick esegue uno step per ogni drone che non ha ancora terminato, con le stesse condizioni di
+        # terminazione della simulazione: compito completato oppure batteria esaurita
+        states = self.env.reset()
+        done = [False] * len(states)
+        battery_failure = False
+        total_reward = 0
+        steps = 0
+
+        while not all(done):
+            for i in range(len(states)):
+                if done[i]:
+                    continue
+
+                state = states[i]
+                action = self.env.choose_action(state)
+                next_state, reward, done[i] = self.env.step(i, action)
+                self.__learn(state, action, reward, next_state)
+
+                states[i] = next_state
+                total_reward += reward
+                steps += 1
 
-        # rappresenta i risultati dell'addestramento graficamente
-        avg_rewards = [np.mean(rewards_per_episode[i:i + 100]) for i in range(0, len(rewards_per_episode), 100)]
-        plt.plot(range(0, len(rewards_per_episode), 100), avg_rewards)
+                if next_state[2] == 0:
+                    done[i] = True
+                    battery_failure = True
+
+        return total_reward, steps, battery_failure
+
+    def __learn(self, state, action, reward, next_state):
+        if self.transition_sink is not None:
+            self.transition_sink(state, action, reward, next_state)
+        elif self.replay_memory is None:
+            self.env.update_q_table(state, action, reward, next_state)
+        else:
+            self.__replay(state, action, reward, next_state)
+
+    def __replay(self, state, action, reward, next_state):
+        memory = self.replay_memory
+        memory.add(self.env.encode_state(state), action, reward, self.env.encode_state(next_state))
+
+        self.total_steps += 1
+        if self.total_steps % self.update_every == 0 and len(memory) >= self.batch_size:
+            self.env.update_q_table_batch(*memory.sample(self.batch_size))
+
+    @staticmethod
+    def __plot_rewards(metrics):
+        # l'interfaccia grafica viene importata solo quando serve
+        import matplotlib.pyplot as plt
+
+        avg_rewards = metrics.block_averages()
+        plt.plot(range(0, len(avg_rewards) * metrics.window, metrics.window), avg_rewards)
         plt.xlabel('Episode')
         plt.ylabel('Average Cumulative Reward')
-        plt.title('Average Cumulative Reward per 100 Episodes')
+        plt.title(f'Average Cumulative Reward per {metrics.window} Episodes')
         plt.show()
 
 def main():
-    grid_size = (5, 5)
+    # con --multi-agent tutti i droni vengono addestrati insieme sulla griglia 7x7 della simulazione, dove le
+    # stazioni di ricarica sono tutte all'interno della griglia
+    multi_agent = "--multi-agent" in sys.argv
+    grid_size = (7, 7) if multi_agent else (5, 5)
     env = DroneDeliveryEnvironment(grid_size, 1,
                                    training_mode=True)
 
+    # le statistiche di ogni episodio vengono scritte su file mentre l'addestramento procede
+    metrics = DroneDeliveryMetrics("training_metrics.jsonl", append="--resume" in sys.argv)
+    trainer = DroneDeliveryTrainer(env, metrics=metrics, multi_agent=multi_agent)
+
+    # con --checkpoint <cartella> salva un checkpoint ogni 100 episodi, con --resume <cartella> riprende
+    # dall'ultimo checkpoint della cartella e continua a salvarvi i successivi; --mmap tiene la q-table su file
+    checkpoint = None
+    for option in ("--resume", "--checkpoint"):
+        if option in sys.argv:
+            checkpoint = DroneDeliveryCheckpoint(sys.argv[sys.argv.index(option) + 1], mmap="--mmap" in sys.argv)
+    if "--resume" in sys.argv:
+        if trainer.resume(checkpoint):
+            print(f"Resuming training from episode {trainer.episode}...")
+        else:
+            print(f"No checkpoint found in '{checkpoint.directory}', starting a new training.")
+
+    # con --early-stop si ferma quando la politica greedy e la media delle ricompense restano stabili
+    convergence = None
+    if "--early-stop" in sys.argv:
+        convergence = DroneDeliveryConvergence(policy_change_threshold=0, reward_tolerance=0.05)
+
     print("Starting training...")
-    trainer = DroneDeliveryTrainer(env)
-    trainer.train()
-    print("Training complete.")
+    trainer.train(checkpoint=checkpoint, convergence=convergence, plot="training_rewards.png")
+    metrics.close()
+    print(f"Training complete. {metrics.summary()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+import numpy as np
+import random
+
+from ActionType import ActionType
+
+
+class DroneDeliveryWeather:
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+
+        # zone attive in ordine di creazione: posizione (y, x), dimensioni (width, height) e durata residua
+        self.positions = np.zeros((0, 2), dtype=np.int64)
+        self.sizes = np.zeros((0, 2), dtype=np.int64)
+        self.lifetimes = np.zeros(0, dtype=np.int64)
+
+        # raster che contano quante zone coprono ogni cella, aggiornati solo quando una zona nasce o scade:
+        # - intensity: il rettangolo della zona, usato dalla ricerca del percorso
+        # - detection: il rettangolo con i bordi inclusi, usato per rilevare il maltempo lungo la traiettoria
+        # - drain: il rettangolo con y e x scambiate, usato per il consumo di batteria
+        # il lato copre anche le zone che escono dalla griglia e le griglie non quadrate
+        side = max(grid_size) + 3
+        self.intensity = np.zeros((side, side), dtype=np.int16)
+        self.detection = np.zeros((side, side), dtype=np.int16)
+        self.drain = np.zeros((side, side), dtype=np.int16)
+
+        # ultima zona creata da update(), come (y, x, width, height), oppure None
+        self.last_zone = None
+
+        # cambia ogni volta che l'insieme delle zone cambia
+        self.version = 0
+        self.__fingerprint = ()
+        self.__fingerprint_version = 0
+        self.__cells = None
+        self.__cells_version = -1
+
+    def __len__(self):
+        return len(self.lifetimes)
+
+    def zones(self):
+        # lista di (posizione, dimensioni, durata residua) nell'ordine di creazione
+        return list(zip(map(tuple, self.positions.tolist()), map(tuple, self.sizes.tolist()),
+                        self.lifetimes.tolist()))
+
+    def update(self, frequency, lifetime):
+        # decide casualmente se creare una nuova zona di maltempo; l'ultima zona creata resta disponibile
+        # per chi registra la simulazione
+        self.last_zone = None
+        if random.randint(0, frequency) == 0:
+            self.last_zone = self.__generate_zone()
+
+        self.advance(self.last_zone, lifetime)
+
+    def __generate_zone(self):
+        # genera una posizione casuale all'interno della griglia
+        y = random.randint(0, self.grid_size[0] - 1)
+        x = random.randint(0, self.grid_size[1] - 1)
+
+        # genera dimensioni casuali per la zona
+        width = random.randint(1, 3)  # larghezza casuale (da 1 a 3 celle)
+        height = random.randint(1, 3)  # altezza casuale (da 1 a 3 celle)
+
+        return y, x, width, height
+
+    def advance(self, zone, lifetime):
+        # aggiunge la zona (y, x, width, height) se presente, senza estrazioni casuali
+        if zone is not None:
+            self.__add_zone(zone, lifetime)
+
+        # rimuove le zone scadute e aggiorna la durata di tutte le altre con un'unica operazione
+        expired = self.lifetimes <= 0
+        if expired.any():
+            for (y, x), (width, height) in zip(self.positions[expired].tolist(), self.sizes[expired].tolist()):
+                self.__paint(y, x, width, height, -1)
+            self.positions = self.positions[~expired]
+            self.sizes = self.sizes[~expired]
+            self.lifetimes = self.lifetimes[~expired]
+            self.version += 1
+
+        self.lifetimes -= 1
+
+    def set_zones(self, zones):
+        # sostituisce le zone attive con quelle indicate come (y, x, width, height, durata residua)
+        for (y, x), (width, height) in zip(self.positions.tolist(), self.sizes.tolist()):
+            self.__paint(y, x, width, height, -1)
+        self.positions = np.zeros((0, 2), dtype=np.int64)
+        self.sizes = np.zeros((0, 2), dtype=np.int64)
+        self.lifetimes = np.zeros(0, dtype=np.int64)
+        for y, x, width, height, lifetime in zones:
+            self.__add_zone((y, x, width, height), lifetime)
+        self.version += 1
+
+    def __add_zone(self, zone, lifetime):
+        y, x, width, height = zone
+        self.positions = np.append(self.positions, [[y, x]], axis=0)
+        self.sizes = np.append(self.sizes, [[width, height]], axis=0)
+        self.lifetimes = np.append(self.lifetimes, lifetime)
+        self.__paint(y, x, width, height, 1)
+        self.version += 1
+
+    def __paint(self, y, x, width, height, delta):
+        self.intensity[y:y + height, x:x + width] += delta
+        self.detection[y:y + height + 1, x:x + width + 1] += delta
+        self.drain[x:x + height, y:y + width] += delta
+
+    def fingerprint(self):
+        # la durata residua non cambia le celle coperte, quindi non fa parte dell'impronta
+        if self.__fingerprint_version != self.version:
+            self.__fingerprint = tuple(zip(map(tuple, self.positions.tolist()), map(tuple, self.sizes.tolist())))
+            self.__fingerprint_version = self.version
+        return self.__fingerprint
+
+    def cells(self):
+        # griglia (liste di liste) di booleani con le celle di maltempo, ritagliata sulla griglia di gioco
+        if self.__cells_version != self.version:
+            self.__cells = (self.intensity[:self.grid_size[0], :self.grid_size[1]] > 0).tolist()
+            self.__cells_version = self.version
+        return self.__cells
+
+    def drains_battery(self, y, x):
+        # verifica se la posizione del drone è all'interno di una zona di maltempo
+        side = self.drain.shape[0]
+        return 0 <= y < side and 0 <= x < side and self.drain.item(y, x) > 0
+
+    def crosses(self, position, target_position, relative_direction):
+        y, x = position
+        tgt_y, tgt_x = target_position
+
+        # prima cella lungo la direzione del drone: il movimento è 1 se sta muovendo in alto o verso dx,
+        # -1 se muove verso il basso o sx
+        if relative_direction == ActionType.UP.value:
+            distance, next_y, next_x = abs(tgt_y - y), y + 1, x
+        elif relative_direction == ActionType.DOWN.value:
+            distance, next_y, next_x = abs(tgt_y - y), y - 1, x
+        elif relative_direction == ActionType.LEFT.value:
+            distance, next_y, next_x = abs(tgt_x - x), y, x - 1
+        elif relative_direction == ActionType.RIGHT.value:
+            distance, next_y, next_x = abs(tgt_x - x), y, x + 1
+        else:
+            return False
+
+        # serve almeno una cella da attraversare e questa deve trovarsi in una zona di maltempo
+        side = self.detection.shape[0]
+        if distance == 0 or not (0 <= next_y < side and 0 <= next_x < side) or \
+                self.detection.item(next_y, next_x) == 0:
+            return False
+
+        zone_y, zone_x = self.positions[:, 0], self.positions[:, 1]
+        width, height = self.sizes[:, 0], self.sizes[:, 1]
+
+        # zone di maltempo che il drone rileva davanti a sé
+        if relative_direction == ActionType.UP.value:
+            ahead = (zone_y <= y) & (zone_x <= x) & (x <= zone_x + width)
+        elif relative_direction == ActionType.DOWN.value:
+            ahead = (zone_y + height >= y) & (zone_x <= x) & (x <= zone_x + width)
+        elif relative_direction == ActionType.LEFT.value:
+            ahead = (zone_x <= x) & (zone_y <= y) & (y <= zone_y + height)
+        else:
+            ahead = (zone_x + width >= x) & (zone_y <= y) & (y <= zone_y + height)
+
+        if not ahead.any():
+            return False
+
+        # le zone vengono esaminate in ordine di creazione a partire dalla prima rilevata: attraversa almeno
+        # due celle di maltempo se una di queste zone contiene anche la prossima cella della traiettoria
+        inside = (zone_x <= next_x) & (next_x <= zone_x + width) & (zone_y <= next_y) & (next_y <= zone_y + height)
+        return bool(np.argmax(ahead) <= len(inside) - 1 - np.argmax(inside[::-1]))
@@ -0,0 +1,88 @@
+class DroneState:
+    # campi della rappresentazione a tupla, nell'ordine usato da step(), choose_action() e update_q_table()
+    FIELDS = ('y', 'x', 'battery_level', 'obstacle_up', 'obstacle_down', 'obstacle_left', 'obstacle_right',
+              'has_package', 'charging_timer', 'relative_target', 'circumnavigate', 'circumnavigation_path')
+
+    __slots__ = ('y', 'x', 'battery_level', 'obstacle_up', 'obstacle_down', 'obstacle_left', 'obstacle_right',
+                 'has_package', 'charging_timer', 'relative_target', 'circumnavigate', 'path', 'path_index',
+                 'target_distance')
+
+    def __init__(self, y, x, battery_level, obstacle_up=0, obstacle_down=0, obstacle_left=0, obstacle_right=0,
+                 has_package=False, charging_timer=0, relative_target=0, circumnavigate=0, path=(), target_distance=0):
+        self.y = y
+        self.x = x
+        self.battery_level = battery_level
+        self.obstacle_up = obstacle_up
+        self.obstacle_down = obstacle_down
+        self.obstacle_left = obstacle_left
+        self.obstacle_right = obstacle_right
+        self.has_package = has_package
+        self.charging_timer = charging_timer
+        self.relative_target = relative_target
+        self.circumnavigate = circumnavigate
+
+        # il percorso di circumnavigazione non viene mai modificato: un cursore indica la prossima cella
+        self.path = path
+        self.path_index = 0
+
+        # distanza (Manhattan) dal target calcolata nell'ultimo step, usata dalle codifiche di stato estese
+        self.target_distance = target_distance
+
+    def set_path(self, path):
+        self.path = path
+        self.path_index = 0
+
+    def clear_path(self):
+        self.path = ()
+        self.path_index = 0
+
+    def has_path(self):
+        return self.path_index < len(self.path)
+
+    def next_cell(self):
+        # ritorna la prossima cella del percorso e avanza il cursore
+        cell = self.path[self.path_index]
+        self.path_index += 1
+        return cell
+
+    def remaining_path(self):
+        return list(self.path[self.path_index:])
+
+    def as_tuple(self):
+        # vista a tupla con i 12 campi della rappresentazione precedente dello stato; la distanza dal target
+        # resta un attributo, letto dalle codifiche di stato estese
+        return DroneStateTuple((self.y, self.x, self.battery_level, self.obstacle_up, self.obstacle_down,
+                                self.obstacle_left, self.obstacle_right, self.has_package, self.charging_timer,
+                                self.relative_target, self.circumnavigate, self.remaining_path()),
+                               self.target_distance)
+
+    def __iter__(self):
+        return iter(self.as_tuple())
+
+    def __len__(self):
+        return len(DroneState.FIELDS)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.as_tuple()[index]
+        if index < 0:
+            index += len(DroneState.FIELDS)
+        if index == 11:
+            return self.remaining_path()
+        return getattr(self, DroneState.FIELDS[index])
+
+    def __eq__(self, other):
+        if isinstance(other, (DroneState, tuple)):
+            return self.as_tuple() == tuple(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"DroneState{self.as_tuple()}"
+
+
+class DroneStateTuple(tuple):
+    # tupla dei campi di DroneState.FIELDS con in più l'attributo target_distance
+    def __new__(cls, values, target_distance=0):
+        view = tuple.__new__(cls, values)
+        view.target_distance = target_distance
+        return view